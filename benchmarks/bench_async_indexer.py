@@ -0,0 +1,64 @@
+"""
+AsyncFileIndexer负载测试：并发查询吞吐随读线程数的变化，以及group commit合并写入的效果
+
+    python -m benchmarks.bench_async_indexer --rows 200000 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.fixtures import make_file_info
+from services.file_manager.async_file_indexer import AsyncFileIndexer
+from services.file_manager.file_indexer import FileIndexer
+
+
+async def read_throughput(indexer: FileIndexer, reader_threads: int, concurrency: int, rounds: int) -> float:
+    """每秒完成的查询数；查询为未提升键的元数据过滤，SQLite执行期间释放GIL"""
+    async_indexer = AsyncFileIndexer(indexer, reader_threads=reader_threads)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*[async_indexer.search_by_metadata({'k': index})
+                               for index in range(concurrency)])
+    seconds = time.perf_counter() - start
+    await async_indexer.close()
+    return concurrency * rounds / seconds
+
+
+async def write_group_commit(indexer: FileIndexer, writes: int) -> dict:
+    async_indexer = AsyncFileIndexer(indexer)
+    start = time.perf_counter()
+    await asyncio.gather(*[async_indexer.create_indexes([make_file_info(index, root=os.sep + 'async')])
+                           for index in range(writes)])
+    seconds = time.perf_counter() - start
+    await async_indexer.close()
+    return {'writes_per_second': writes / seconds, 'commits': async_indexer.commit_count}
+
+
+async def run(rows: int, concurrency: int, rounds: int, writes: int):
+    indexer = FileIndexer(os.path.join(tempfile.mkdtemp(), 'index.db'))
+    indexer.bulk_create_indexes((make_file_info(index) for index in range(rows)), defer_indexes=True)
+    results = {'reads_per_second': {}}
+    for reader_threads in (1, 2, 4, 8):
+        results['reads_per_second'][reader_threads] = await read_throughput(indexer, reader_threads,
+                                                                            concurrency, rounds)
+    results['group_commit'] = await write_group_commit(indexer, writes)
+    results['cpu_count'] = os.cpu_count()
+    indexer.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--rounds', type=int, default=2)
+    parser.add_argument('--writes', type=int, default=1000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.rows, args.concurrency, args.rounds, args.writes)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+每次调用新建连接与连接池的对比：get_id_by_path与create_indexes各执行N次
+
+    python -m benchmarks.bench_connection_pool --calls 100000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.fixtures import make_file_info
+from services.file_manager.file_indexer import FileIndexer
+
+
+class PerCallIndexer:
+    """连接池引入之前的访问方式：每次调用新建连接（默认rollback journal），用完即关闭"""
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+
+    def get_id_by_path(self, path: str):
+        conn = sqlite3.connect(self.db_file)
+        try:
+            result = conn.execute('SELECT id FROM file_index WHERE path = ?', (path,)).fetchone()
+            return result[0] if result else None
+        finally:
+            conn.close()
+
+    def create_indexes(self, files):
+        conn = sqlite3.connect(self.db_file)
+        try:
+            conn.executemany('''
+                INSERT OR REPLACE INTO file_index
+                (id, path, name, is_directory, file_type, size, created_at, modified_at, metadata, document_ids,
+                 fingerprint)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [FileIndexer._file_index_row(file) for file in files])
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def run(calls: int):
+    work_dir = tempfile.mkdtemp()
+    files = [make_file_info(index) for index in range(calls)]
+
+    # 基准库使用迁移后的相同表结构，再切换回rollback journal
+    per_call_db = os.path.join(work_dir, 'per_call.db')
+    FileIndexer(per_call_db).close()
+    with sqlite3.connect(per_call_db) as conn:
+        conn.execute('PRAGMA journal_mode=DELETE')
+    per_call = PerCallIndexer(per_call_db)
+    # 禁用路径缓存，只比较连接开销
+    pooled = FileIndexer(os.path.join(work_dir, 'pooled.db'), path_cache_size=0)
+
+    results = {}
+    for name, indexer in (('per_call', per_call), ('pooled', pooled)):
+        start = time.perf_counter()
+        for file in files:
+            indexer.create_indexes([file])
+        create_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        for file in files:
+            indexer.get_id_by_path(file.path)
+        get_seconds = time.perf_counter() - start
+        results[name] = {'create_indexes_per_second': calls / create_seconds,
+                         'get_id_by_path_per_second': calls / get_seconds}
+    pooled.close()
+    results['speedup'] = {key: results['pooled'][key] / results['per_call'][key] for key in results['pooled']}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=100000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.calls), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+索引结果行解码为FileInfo的耗时与内存：逐行立即解码的普通dataclass与slots+延迟解码的FileInfo对比
+
+    python -m benchmarks.bench_file_info_decode --rows 1000000
+"""
+import argparse
+import gc
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List
+
+from benchmarks.fixtures import make_file_info
+from services.file_manager.file_indexer import FileIndexer
+from services.file_manager.file_info import FileInfo, FileType
+
+
+@dataclass
+class EagerFileInfo:
+    """改为slots与延迟解码之前的表示：每个实例带__dict__，日期与JSON在构造时解码"""
+    path: str
+    id: str = ""
+    name: str = ""
+    is_directory: bool = False
+    file_type: FileType = FileType.OTHER
+    size: int = 0
+    created_at: datetime = None
+    modified_at: datetime = None
+    metadata: Dict = field(default_factory=dict)
+    document_ids: List[str] = field(default_factory=list)
+
+
+def eager_rows_to_file_infos(rows) -> List[EagerFileInfo]:
+    infos = []
+    for row in rows:
+        try:
+            infos.append(EagerFileInfo(
+                path=row[1], id=row[0], name=row[2], is_directory=bool(row[3]), file_type=FileType(row[4]),
+                size=row[5],
+                created_at=datetime.fromisoformat(row[6]) if row[6] else None,
+                modified_at=datetime.fromisoformat(row[7]) if row[7] else None,
+                metadata=json.loads(row[8]) if row[8] else {},
+                document_ids=json.loads(row[9]) if row[9] else []))
+        except Exception as e:
+            print(f"Error converting row to FileInfo: {e}")
+    return infos
+
+
+def measure(decode, rows) -> Dict[str, float]:
+    """解码耗时（不开启tracemalloc）与解码结果占用的内存"""
+    gc.collect()
+    start = time.perf_counter()
+    infos = decode(rows)
+    seconds = time.perf_counter() - start
+    del infos
+    gc.collect()
+    tracemalloc.start()
+    infos = decode(rows)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del infos
+    return {'seconds': seconds, 'retained_mb': retained / 1e6, 'peak_mb': peak / 1e6}
+
+
+def run(rows_count: int):
+    indexer = FileIndexer(os.path.join(tempfile.mkdtemp(), 'index.db'), path_cache_size=0)
+    indexer.bulk_create_indexes((make_file_info(index) for index in range(rows_count)), defer_indexes=True)
+    with indexer._pool.read() as conn:
+        columns = ', '.join(FileIndexer.FILE_INDEX_COLUMNS)
+        rows = conn.execute(f'SELECT {columns} FROM file_index').fetchall()
+
+    results = {
+        'eager': measure(eager_rows_to_file_infos, rows),
+        'lazy': measure(FileInfo.from_index_rows, rows),
+    }
+    results['ratio'] = {key: results['eager'][key] / results['lazy'][key] for key in results['lazy']}
+    del rows
+    start = time.perf_counter()
+    indexer.get_all_files()
+    results['get_all_files_seconds'] = time.perf_counter() - start
+    indexer.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows), indent=2))
+
+
+if __name__ == '__main__':
+    main()
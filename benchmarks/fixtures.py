@@ -0,0 +1,16 @@
+import os
+from datetime import datetime
+from typing import Dict, Optional
+
+from services.file_manager.file_info import FileInfo, FileType
+
+
+def make_file_info(index: int, root: str = os.sep + 'bench', dirs: int = 1000,
+                   metadata: Optional[Dict] = None) -> FileInfo:
+    """构造不依赖真实文件的FileInfo，路径分布在dirs个目录中"""
+    path = os.path.join(root, f'dir{index % dirs}', f'file{index}.txt')
+    now = datetime.now()
+    return FileInfo(path=path, id=FileInfo.generate_id(path), name=os.path.basename(path),
+                    file_type=FileType.TEXT, size=index, created_at=now, modified_at=now,
+                    metadata=metadata if metadata is not None else {'k': index},
+                    document_ids=[f'doc{index}'], _skip_existence_check=True)
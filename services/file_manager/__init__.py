@@ -1,6 +1,7 @@
 from .file_info import FileInfo
 from .file_parser import FileParser
 from .file_indexer import FileIndexer
+from .async_file_indexer import AsyncFileIndexer
 # from .file_visualizer import FileVisualizer
 from .vector_store import VectorStore
 from .file_scanner import FileScanner
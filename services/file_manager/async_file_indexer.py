@@ -0,0 +1,189 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+
+from services.file_manager.file_indexer import FileIndexer
+from services.file_manager.file_info import FileInfo
+
+
+class AsyncFileIndexer:
+    """
+    FileIndexer的asyncio接口
+
+    读操作分发到专用的读线程池，每个线程持有自己的SQLite读连接，并发查询可以重叠执行；
+    写操作经队列交给唯一的写任务串行执行，同一时刻排队的写请求合并为一次事务提交（group commit），
+    每个请求使用独立的SAVEPOINT，单个请求失败不影响同组的其他请求
+    """
+
+    # 在读线程池中执行的方法
+    READ_METHODS = frozenset({
+        'get_schema_version', 'get_promoted_metadata_keys', 'get_path_cache_stats',
+        'get_file_ids_by_document_ids', 'get_document_ids_by_file_id', 'get_id_by_path', 'get_fingerprints',
+        'get_file_states', 'get_file_states_by_paths', 'list_subtree',
+        'search_by_document_ids', 'search_by_file_ids', 'search_by_filename', 'search_by_type',
+        'search_by_date_range', 'search_by_size_range', 'search_by_path', 'search_by_metadata',
+        'advanced_search', 'count', 'exists', 'aggregate', 'get_all_files', 'get_files_page',
+        'get_table_stats', 'print_table_stats', 'print_all_tables', 'explain_query_plan', 'verify_query_plans',
+        'get_pending_changes', 'get_change_checkpoint', 'get_orphaned_document_ids',
+    })
+    # 可以合并到同一事务提交的写方法
+    WRITE_METHODS = frozenset({
+        'create_indexes', 'update_indexes', 'update_file_paths', 'update_file_path',
+        'move_directory', 'delete_indexes', 'delete_index', 'reset', 'record_changes', 'acknowledge_changes',
+        'clear_orphaned_documents',
+    })
+    # 自行管理事务或修改表结构的写方法，在写线程上单独执行
+    EXCLUSIVE_WRITE_METHODS = frozenset({
+        'bulk_create_indexes', 'promote_metadata_key', 'demote_metadata_key', 'check_stats_consistency',
+    })
+    # 不访问数据库的静态方法，直接同步调用
+    STATIC_METHODS = frozenset({'encode_cursor', 'decode_cursor'})
+    # 只能在写线程的事务中使用，通过transaction(fn)在fn内调用
+    WRITER_THREAD_METHODS = frozenset({'savepoint'})
+
+    def __init__(self, indexer: FileIndexer, reader_threads: int = 4,
+                 max_group_size: int = 256, group_commit_delay: float = 0.0):
+        """
+        初始化异步文件索引
+
+        Args:
+            indexer: 同步文件索引
+            reader_threads: 读线程数
+            max_group_size: 单次合并提交的最大写请求数
+            group_commit_delay: 写任务取到第一个请求后等待更多请求的时间(秒)，0表示只合并已排队的请求
+        """
+        self.indexer = indexer
+        self.max_group_size = max_group_size
+        self.group_commit_delay = group_commit_delay
+        self._reader_pool = ThreadPoolExecutor(max_workers=reader_threads, thread_name_prefix='indexer-reader')
+        self._writer_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='indexer-writer')
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self.commit_count = 0
+        self.write_count = 0
+
+    def __getattr__(self, name: str):
+        if name in self.READ_METHODS:
+            return functools.partial(self._read, name)
+        if name in self.WRITE_METHODS:
+            return functools.partial(self._write, name)
+        if name in self.EXCLUSIVE_WRITE_METHODS:
+            return functools.partial(self._exclusive_write, name)
+        if name in self.STATIC_METHODS:
+            return getattr(FileIndexer, name)
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    async def _read(self, method_name: str, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        method = getattr(self.indexer, method_name)
+        return await loop.run_in_executor(self._reader_pool, functools.partial(method, *args, **kwargs))
+
+    async def _exclusive_write(self, method_name: str, *args, **kwargs) -> Any:
+        # 与合并写共用单线程写池，天然与写任务串行
+        loop = asyncio.get_running_loop()
+        method = getattr(self.indexer, method_name)
+        return await loop.run_in_executor(self._writer_pool, functools.partial(method, *args, **kwargs))
+
+    async def transaction(self, fn: Callable[[FileIndexer], Any]) -> Any:
+        """
+        在写线程上以一个事务执行fn(indexer)并返回其结果，fn抛出异常时整体回滚
+
+        FileIndexer.transaction()是绑定线程的上下文管理器，不能跨越await使用，
+        需要多个写操作原子提交时把它们放在fn中
+        """
+        def run():
+            with self.indexer.transaction():
+                return fn(self.indexer)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer_pool, run)
+
+    async def _write(self, method_name: str, *args, **kwargs) -> Any:
+        if self._writer_task is None or self._writer_task.done():
+            self._write_queue = asyncio.Queue()
+            self._writer_task = asyncio.create_task(self._writer_loop())
+        future = asyncio.get_running_loop().create_future()
+        await self._write_queue.put((method_name, args, kwargs, future))
+        return await future
+
+    async def _writer_loop(self):
+        """唯一的写任务：取出当前排队的写请求，合并为一次事务提交"""
+        loop = asyncio.get_running_loop()
+        while True:
+            request = await self._write_queue.get()
+            if request is None:
+                return
+            group = [request]
+            if self.group_commit_delay:
+                await asyncio.sleep(self.group_commit_delay)
+            stop = False
+            while len(group) < self.max_group_size and not self._write_queue.empty():
+                request = self._write_queue.get_nowait()
+                if request is None:
+                    stop = True
+                    break
+                group.append(request)
+
+            try:
+                results = await loop.run_in_executor(
+                    self._writer_pool, self._run_group, [(name, args, kwargs) for name, args, kwargs, _ in group])
+            except Exception as e:
+                # 提交失败，整组回滚
+                for *_, future in group:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (*_, future), (succeeded, result) in zip(group, results):
+                    if future.done():
+                        continue
+                    if succeeded:
+                        future.set_result(result)
+                    else:
+                        future.set_exception(result)
+            if stop:
+                return
+
+    def _run_group(self, group: List[Tuple[str, tuple, dict]]) -> List[Tuple[bool, Any]]:
+        """在写线程上以一个事务执行一组写请求"""
+        results = []
+        with self.indexer.transaction():
+            for method_name, args, kwargs in group:
+                try:
+                    # 失败的请求连同其登记的缓存更新一起回滚到保存点
+                    with self.indexer.savepoint('async_write'):
+                        result = getattr(self.indexer, method_name)(*args, **kwargs)
+                    results.append((True, result))
+                except Exception as e:
+                    results.append((False, e))
+        self.commit_count += 1
+        self.write_count += len(group)
+        return results
+
+    async def iter_files(self, batch_size: int = 1000, order_by: str = 'path',
+                         columns: Optional[Tuple[str, ...]] = None,
+                         cursor_token: Optional[str] = None,
+                         **filters) -> AsyncIterator[Union[FileInfo, Dict[str, Any]]]:
+        """异步流式遍历，每页在读线程池中读取"""
+        while True:
+            items, cursor_token = await self._read('get_files_page', batch_size, cursor_token,
+                                                   order_by, columns, **filters)
+            for item in items:
+                yield item
+            if cursor_token is None:
+                return
+
+    async def close(self, close_indexer: bool = False):
+        """
+        等待已排队的写请求完成后关闭线程池
+
+        Args:
+            close_indexer: 是否同时关闭底层FileIndexer的数据库连接
+        """
+        if self._writer_task is not None and not self._writer_task.done():
+            await self._write_queue.put(None)
+            await self._writer_task
+        self._reader_pool.shutdown(wait=True)
+        self._writer_pool.shutdown(wait=True)
+        if close_indexer:
+            self.indexer.close()
@@ -0,0 +1,68 @@
+import sqlite3
+import time
+from typing import Dict, List, Tuple
+
+
+class ChangeJournal:
+    """
+    持久化的变化日志：记录已检测到、尚未入库的文件及其优先级，与索引存放在同一个数据库中
+
+    每条记录有全局递增的序号。文件入库时在提交索引的同一事务中删除对应序号的记录，
+    因此剩余的记录就是尚未完成的工作，重启后只需重新排队这些记录。
+    同一目录下的同一路径只保留最新的一条：入库期间路径再次变化时记录获得新序号，旧任务的确认不会删除它
+    """
+
+    @staticmethod
+    def create(cursor: sqlite3.Cursor):
+        """版本7：创建变化日志表"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS change_journal (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                root TEXT NOT NULL,
+                path TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                recorded_at REAL NOT NULL,
+                UNIQUE (root, path)
+            )
+        ''')
+
+    @staticmethod
+    def record(cursor: sqlite3.Cursor, root: str, changes: List[Tuple[str, int]]) -> Dict[str, int]:
+        """
+        追加记录，已有记录的路径获得新序号并保留两者中较高的优先级（数值较小）
+
+        Returns:
+            Dict[str, int] - 路径 -> 序号
+        """
+        now = time.time()
+        seqs = {}
+        for path, priority in changes:
+            cursor.execute('''
+                INSERT OR REPLACE INTO change_journal (root, path, priority, recorded_at)
+                VALUES (?, ?, MIN(?, COALESCE(
+                    (SELECT priority FROM change_journal WHERE root = ? AND path = ?), ?)), ?)
+            ''', (root, path, priority, root, path, priority, now))
+            seqs[path] = cursor.lastrowid
+        return seqs
+
+    @staticmethod
+    def acknowledge(cursor: sqlite3.Cursor, seqs: List[int]):
+        """确认已处理的记录（按序号删除，路径之后的新记录不受影响）"""
+        cursor.executemany('DELETE FROM change_journal WHERE seq = ?', [(seq,) for seq in seqs])
+
+    @staticmethod
+    def pending(cursor: sqlite3.Cursor, root: str) -> List[Tuple[int, str, int]]:
+        """目录下尚未确认的记录 (序号, 路径, 优先级)，按序号排列"""
+        cursor.execute('SELECT seq, path, priority FROM change_journal WHERE root = ? ORDER BY seq', (root,))
+        return cursor.fetchall()
+
+    @staticmethod
+    def checkpoint(cursor: sqlite3.Cursor, root: str) -> int:
+        """检查点：目录下序号不超过该值的记录都已处理完毕"""
+        cursor.execute('SELECT MIN(seq) FROM change_journal WHERE root = ?', (root,))
+        oldest = cursor.fetchone()[0]
+        if oldest is not None:
+            return oldest - 1
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_journal'")
+        row = cursor.fetchone()
+        return row[0] if row else 0
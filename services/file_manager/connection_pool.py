@@ -0,0 +1,171 @@
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Callable, List, Dict, Optional, Set
+
+
+class _ReaderHolder:
+    """线程本地的读连接持有者，线程退出时随线程本地数据回收并触发连接关闭"""
+
+    __slots__ = ('conn', '__weakref__')
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+
+class ConnectionPool:
+    """SQLite连接池：一个长连接写者 + 线程本地的长连接读者（WAL模式）"""
+
+    DEFAULT_PRAGMAS = {
+        'journal_mode': 'WAL',  # 读者不会被写事务阻塞
+        'synchronous': 'NORMAL',  # WAL下只在checkpoint时fsync
+        'cache_size': -64000,  # 约64MB页缓存（负数单位为KiB）
+        'mmap_size': 268435456,  # 256MB内存映射读
+        'temp_store': 'MEMORY',
+        'recursive_triggers': 'ON',  # INSERT OR REPLACE删除旧行时也触发DELETE触发器
+        'busy_timeout': 5000,
+    }
+
+    def __init__(self, db_file: str, pragmas: Optional[Dict] = None, cached_statements: int = 256):
+        """
+        初始化连接池
+
+        Args:
+            db_file: 数据库文件路径
+            pragmas: 覆盖默认PRAGMA设置
+            cached_statements: 每个连接缓存的预编译语句数量
+        """
+        self.db_file = db_file
+        self.cached_statements = cached_statements
+        self.pragmas = dict(self.DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+
+        self._writer: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.RLock()
+        # 当前写事务提交后才执行的回调（如同步内存缓存），回滚时丢弃
+        self._after_commit: List[Callable[[], None]] = []
+        self._local = threading.local()
+        # 存活线程的读连接，线程退出后由_release_reader关闭并移除
+        self._readers: Set[sqlite3.Connection] = set()
+        self._readers_lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """创建一个已应用PRAGMA的新连接，使用autocommit模式由调用方显式控制事务"""
+        conn = sqlite3.connect(self.db_file, isolation_level=None, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        for key, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {key}={value}')
+        return conn
+
+    def _get_writer(self) -> sqlite3.Connection:
+        if self._closed:
+            raise sqlite3.ProgrammingError("ConnectionPool is closed")
+        if self._writer is None:
+            self._writer = self._connect()
+        return self._writer
+
+    @contextmanager
+    def write(self):
+        """
+        获取写连接并开启事务，正常退出时提交，异常时回滚
+
+        写连接全局唯一，由锁串行化；同一线程内可重入（嵌套时不再开启新事务）
+        """
+        with self._write_lock:
+            conn = self._get_writer()
+            if getattr(self._local, 'writing', False):
+                yield conn
+                return
+            self._local.writing = True
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    yield conn
+                    conn.execute('COMMIT')
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+                callbacks = list(self._after_commit)
+            finally:
+                self._after_commit.clear()
+                self._local.writing = False
+            for callback in callbacks:
+                callback()
+
+    @contextmanager
+    def savepoint(self, name: str = 'pool_savepoint'):
+        """
+        在写事务中开启保存点（没有外层事务时开启新事务），异常时只回滚保存点之后的修改
+
+        保存点之后登记的提交回调随保存点一起丢弃
+        """
+        with self.write() as conn:
+            mark = len(self._after_commit)
+            conn.execute(f'SAVEPOINT {name}')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute(f'ROLLBACK TO {name}')
+                conn.execute(f'RELEASE {name}')
+                del self._after_commit[mark:]
+                raise
+            conn.execute(f'RELEASE {name}')
+
+    def in_transaction(self) -> bool:
+        """当前线程是否正持有写事务"""
+        return getattr(self._local, 'writing', False)
+
+    def after_commit(self, callback: Callable[[], None]):
+        """
+        登记在当前线程的写事务（含外层事务）成功提交后执行的回调，回滚时丢弃；
+        不在写事务中时立即执行
+        """
+        if not self.in_transaction():
+            callback()
+            return
+        self._after_commit.append(callback)
+
+    @contextmanager
+    def read(self):
+        """
+        获取当前线程的读连接
+
+        若当前线程正持有写事务，则复用写连接，以便读到未提交的修改
+        """
+        if getattr(self._local, 'writing', False):
+            yield self._writer
+            return
+        holder = getattr(self._local, 'reader', None)
+        if holder is None:
+            if self._closed:
+                raise sqlite3.ProgrammingError("ConnectionPool is closed")
+            conn = self._connect()
+            holder = self._local.reader = _ReaderHolder(conn)
+            # 不引用self，线程退出后连接池本身可以被回收
+            weakref.finalize(holder, self._release_reader, conn, self._readers, self._readers_lock)
+            with self._readers_lock:
+                self._readers.add(conn)
+        yield holder.conn
+
+    @staticmethod
+    def _release_reader(conn: sqlite3.Connection, readers: Set[sqlite3.Connection], readers_lock: threading.Lock):
+        """关闭已退出线程的读连接"""
+        with readers_lock:
+            readers.discard(conn)
+        conn.close()
+
+    def close(self):
+        """关闭所有连接"""
+        self._closed = True
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+        self._local = threading.local()
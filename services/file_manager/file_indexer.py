@@ -1,245 +1,702 @@
+import base64
+import hashlib
 import json
 import os
+import itertools
+import re
 import sqlite3
+import time
 from datetime import datetime
-from enum import Enum
-from typing import List, Tuple, Optional, Dict
+from typing import List, Tuple, Optional, Dict, Callable, Iterator, Union, Any, Iterable
 
 from services.file_manager import FileInfo
+from services.file_manager.change_journal import ChangeJournal
+from services.file_manager.connection_pool import ConnectionPool
 from services.file_manager.file_info import FileType
-
-
-class SearchType(Enum):
-    """搜索类型枚举"""
-    FILENAME = "filename"  # 按文件名搜索
-    CONTENT_TYPE = "content_type"  # 按文件类型搜索
-    DATE_RANGE = "date_range"  # 按日期范围搜索
-    SIZE_RANGE = "size_range"  # 按文件大小范围搜索
-    DOCUMENT_ID = "document_id"  # 按文档ID搜索
-    FILE_ID = "file_id"  # 按文件ID搜索
-    PATH = "path"  # 按路径搜索
-    METADATA = "metadata"  # 按元数据搜索
+from services.file_manager.file_query_builder import SearchType, FileQueryBuilder
+from services.file_manager.index_stats import IndexStats, StatsTables
+from services.file_manager.path_cache import PathCache
 
 
 class FileIndexer:
     """文件索引管理"""
 
-    def __init__(self, db_file: str):
+    # file_index的列顺序，与_row_to_file_info的下标一一对应
+    FILE_INDEX_COLUMNS = ('id', 'path', 'name', 'is_directory', 'file_type', 'size',
+                          'created_at', 'modified_at', 'metadata', 'document_ids')
+    # 可用于键集分页的唯一键
+    KEYSET_COLUMNS = ('path', 'id')
+
+    # 批量导入时可以推迟维护的二级索引（idx_file_path为唯一约束，始终保留）
+    DEFERRABLE_INDEXES = {
+        'idx_file_name': 'CREATE INDEX IF NOT EXISTS idx_file_name ON file_index(name)',
+        'idx_file_type': 'CREATE INDEX IF NOT EXISTS idx_file_type ON file_index(file_type)',
+        'idx_file_modified_at': 'CREATE INDEX IF NOT EXISTS idx_file_modified_at ON file_index(modified_at)',
+        'idx_file_size': 'CREATE INDEX IF NOT EXISTS idx_file_size ON file_index(size)',
+    }
+
+    # 保持file_name_fts与file_index同步的触发器
+    FILENAME_FTS_TRIGGERS = {
+        'file_name_fts_insert': '''
+            CREATE TRIGGER IF NOT EXISTS file_name_fts_insert AFTER INSERT ON file_index BEGIN
+                INSERT INTO file_name_fts(rowid, name, path) VALUES (new.rowid, new.name, new.path);
+            END
+        ''',
+        'file_name_fts_delete': '''
+            CREATE TRIGGER IF NOT EXISTS file_name_fts_delete AFTER DELETE ON file_index BEGIN
+                INSERT INTO file_name_fts(file_name_fts, rowid, name, path)
+                VALUES ('delete', old.rowid, old.name, old.path);
+            END
+        ''',
+        'file_name_fts_update': '''
+            CREATE TRIGGER IF NOT EXISTS file_name_fts_update AFTER UPDATE OF name, path ON file_index BEGIN
+                INSERT INTO file_name_fts(file_name_fts, rowid, name, path)
+                VALUES ('delete', old.rowid, old.name, old.path);
+                INSERT INTO file_name_fts(rowid, name, path) VALUES (new.rowid, new.name, new.path);
+            END
+        ''',
+    }
+
+    # 可提升为生成列的元数据键名
+    METADATA_KEY_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+    def __init__(self, db_file: str, pragmas: Optional[Dict] = None,
+                 promoted_metadata_keys: Optional[List[str]] = None,
+                 path_cache_size: Optional[int] = None):
+        """
+        初始化文件索引
+
+        Args:
+            db_file: 数据库文件路径
+            pragmas: 覆盖连接池默认的PRAGMA设置
+            promoted_metadata_keys: 需要提升为带索引生成列的元数据键（如 author、page_count），
+                                    尚未提升的键会在初始化时在线迁移
+            path_cache_size: 路径→ID内存缓存大小；None为完整缓存（启动时全量载入，
+                             超过PathCache.DEFAULT_COMPLETE_LIMIT条后转为同样上限的LRU缓存），
+                             正数为LRU缓存的条目上限，0为禁用
+        """
         self.db_file = db_file
+        self._pool = ConnectionPool(db_file, pragmas)
         self._initialize_db()
+        self._filename_fts_available = self._table_exists('file_name_fts')
+        self._promoted_columns = self._load_promoted_columns()
+        for key in promoted_metadata_keys or []:
+            self.promote_metadata_key(key)
+        self.query_builder = FileQueryBuilder(self)
+        self.path_cache = self._load_path_cache(path_cache_size)
+
+    def close(self):
+        """关闭所有数据库连接"""
+        self._pool.close()
+
+    def transaction(self):
+        """
+        在写连接上开启事务，用于将多个写操作合并为一次提交
+
+        事务内调用的写方法不再单独提交，由最外层统一提交或回滚；路径缓存在最外层提交后才更新
+        """
+        return self._pool.write()
+
+    def savepoint(self, name: str = 'indexer_savepoint'):
+        """在事务中开启保存点，异常时只回滚保存点之后的写操作及其缓存更新"""
+        return self._pool.savepoint(name)
+
+    def _readable_path_cache(self) -> Optional[PathCache]:
+        """可用于读取的路径缓存：当前线程的写事务尚未提交时缓存不含其修改，改为读数据库"""
+        if self.path_cache and not self._pool.in_transaction():
+            return self.path_cache
+        return None
+
+    def _load_path_cache(self, path_cache_size: Optional[int]) -> Optional[PathCache]:
+        """创建路径缓存，完整模式下从数据库全量载入"""
+        if path_cache_size == 0:
+            return None
+        path_cache = PathCache(path_cache_size)
+        if not path_cache.bounded:
+            with self._pool.read() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT path, id FROM file_index')
+                path_cache.load(cursor)
+        return path_cache
+
+    def get_path_cache_stats(self) -> Optional[Dict[str, int]]:
+        """获取路径缓存的条目数与命中统计，未启用缓存时返回None"""
+        return self.path_cache.stats() if self.path_cache else None
 
     def _initialize_db(self):
-        """初始化数据库"""
-        if not os.path.exists(self.db_file):
-            # 数据库文件不存在，创建新表
-            self._create_table()
-        else:
-            # 检查数据库的合法性
-            try:
-                with sqlite3.connect(self.db_file) as conn:
-                    cursor = conn.cursor()
-                    cursor.execute('SELECT 1 FROM file_index LIMIT 1')
-            except sqlite3.Error:
-                # 如果有任何错误，重新创建表
-                self._create_table()
-
-    def _create_table(self):
-        """创建表结构"""
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            # 创建文件索引表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS file_index (
-                    id TEXT PRIMARY KEY,
-                    path TEXT,
-                    name TEXT,
-                    is_directory INTEGER,
-                    file_type TEXT,
-                    size INTEGER,
-                    created_at TEXT,
-                    modified_at TEXT,
-                    metadata TEXT,
-                    document_ids TEXT
+        """初始化数据库，按版本顺序执行尚未应用的结构迁移"""
+        with self._pool.write() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT,
+                    applied_at TEXT
                 )
             ''')
 
-            # 创建文档ID与文件ID的关联表
+        current_version = self.get_schema_version()
+        for version, description, migrate in self._schema_migrations():
+            if version <= current_version:
+                continue
+            # 每个迁移在独立事务中执行，失败时回滚且不记录版本
+            with self._pool.write() as conn:
+                cursor = conn.cursor()
+                migrate(cursor)
+                cursor.execute('''
+                    INSERT INTO schema_version (version, description, applied_at)
+                    VALUES (?, ?, ?)
+                ''', (version, description, datetime.now().isoformat()))
+
+    def _schema_migrations(self) -> List[Tuple[int, str, Callable[[sqlite3.Cursor], None]]]:
+        """
+        结构迁移列表，按版本号递增排列
+
+        新的结构变更只能追加新版本，不能修改已发布的迁移
+        """
+        return [
+            (1, "创建file_index与doc_file_mapping表", self._migrate_create_tables),
+            (2, "为file_index与doc_file_mapping添加二级索引", self._migrate_secondary_indexes),
+            (3, "创建文件名trigram全文索引", self._migrate_filename_fts),
+            (4, "创建元数据生成列登记表", self._migrate_promoted_metadata),
+            (5, "创建由触发器维护的统计表", StatsTables.create),
+            (6, "为file_index添加内容指纹列", self._migrate_fingerprint),
+            (7, "创建变化日志表", ChangeJournal.create),
+        ]
+
+    def get_schema_version(self) -> int:
+        """获取数据库当前的结构版本，未执行过迁移时返回0"""
+        with self._pool.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT MAX(version) FROM schema_version')
+            result = cursor.fetchone()
+            return result[0] if result and result[0] is not None else 0
+
+    @staticmethod
+    def _migrate_create_tables(cursor: sqlite3.Cursor):
+        """版本1：创建表结构（兼容迁移机制引入之前创建的数据库）"""
+        # 创建文件索引表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS file_index (
+                id TEXT PRIMARY KEY,
+                path TEXT,
+                name TEXT,
+                is_directory INTEGER,
+                file_type TEXT,
+                size INTEGER,
+                created_at TEXT,
+                modified_at TEXT,
+                metadata TEXT,
+                document_ids TEXT
+            )
+        ''')
+
+        # 创建文档ID与文件ID的关联表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS doc_file_mapping (
+                document_id TEXT,
+                file_id TEXT,
+                FOREIGN KEY(file_id) REFERENCES file_index(id),
+                PRIMARY KEY(document_id, file_id)
+            )
+        ''')
+
+        # 为document_id创建索引以提高查询效率
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_document_id 
+            ON doc_file_mapping(document_id)
+        ''')
+
+    @staticmethod
+    def _migrate_secondary_indexes(cursor: sqlite3.Cursor):
+        """版本2：为常用查询列添加二级索引，避免全表扫描"""
+        # 清理重复路径时失去引用的文档ID，由持有向量库的一方删除对应向量后清除
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS orphaned_documents (
+                document_id TEXT PRIMARY KEY,
+                file_id TEXT,
+                path TEXT,
+                removed_at TEXT
+            )
+        ''')
+        # path需唯一，先清理旧数据中可能存在的重复路径（保留最后写入的记录）
+        duplicate_rows = 'SELECT rowid FROM file_index WHERE rowid NOT IN (SELECT MAX(rowid) FROM file_index GROUP BY path)'
+        cursor.execute(f'SELECT id, path, document_ids FROM file_index WHERE rowid IN ({duplicate_rows})')
+        removed = cursor.fetchall()
+        if removed:
+            removed_at = datetime.now().isoformat()
+            orphans = [(document_id, file_id, path, removed_at)
+                       for file_id, path, document_ids in removed
+                       for document_id in json.loads(document_ids or '[]')]
+            cursor.execute(f'''
+                SELECT m.document_id, f.id, f.path FROM doc_file_mapping m JOIN file_index f ON f.id = m.file_id
+                WHERE f.rowid IN ({duplicate_rows})
+            ''')
+            orphans.extend((document_id, file_id, path, removed_at) for document_id, file_id, path in cursor)
+            cursor.executemany('''
+                INSERT OR IGNORE INTO orphaned_documents (document_id, file_id, path, removed_at)
+                VALUES (?, ?, ?, ?)
+            ''', orphans)
+            print(f"Schema upgrade removed {len(removed)} duplicate path rows (ids: {[row[0] for row in removed]}); "
+                  f"their document ids are listed in orphaned_documents")
+            cursor.execute(f'DELETE FROM file_index WHERE rowid IN ({duplicate_rows})')
+        cursor.execute('''
+            DELETE FROM doc_file_mapping 
+            WHERE file_id NOT IN (SELECT id FROM file_index)
+        ''')
+        # 仍被保留的记录引用的文档不是孤儿
+        cursor.execute('''
+            DELETE FROM orphaned_documents 
+            WHERE document_id IN (SELECT document_id FROM doc_file_mapping)
+        ''')
+
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_file_path ON file_index(path)')
+        for create_sql in FileIndexer.DEFERRABLE_INDEXES.values():
+            cursor.execute(create_sql)
+        # delete_index等按file_id查询映射，主键(document_id, file_id)无法覆盖
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_mapping_file_id ON doc_file_mapping(file_id)')
+
+    @staticmethod
+    def _migrate_filename_fts(cursor: sqlite3.Cursor):
+        """版本3：创建name/path的FTS5 trigram外部内容索引，并由触发器与file_index保持同步"""
+        try:
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS doc_file_mapping (
-                    document_id TEXT,
-                    file_id TEXT,
-                    FOREIGN KEY(file_id) REFERENCES file_index(id),
-                    PRIMARY KEY(document_id, file_id)
+                CREATE VIRTUAL TABLE IF NOT EXISTS file_name_fts USING fts5(
+                    name, path,
+                    content='file_index', content_rowid='rowid',
+                    tokenize='trigram'
                 )
             ''')
+        except sqlite3.OperationalError:
+            # SQLite未编译FTS5或版本低于3.34（无trigram分词器），文件名搜索回退为LIKE
+            return
+
+        for create_sql in FileIndexer.FILENAME_FTS_TRIGGERS.values():
+            cursor.execute(create_sql)
+        # 为已有数据建立全文索引
+        cursor.execute("INSERT INTO file_name_fts(file_name_fts) VALUES ('rebuild')")
+
+    @staticmethod
+    def _migrate_promoted_metadata(cursor: sqlite3.Cursor):
+        """版本4：记录已提升为生成列的元数据键"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS promoted_metadata (
+                key TEXT PRIMARY KEY,
+                column_name TEXT,
+                index_name TEXT,
+                promoted_at TEXT
+            )
+        ''')
 
-            # 为document_id创建索引以提高查询效率
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_document_id 
-                ON doc_file_mapping(document_id)
+    @staticmethod
+    def _migrate_fingerprint(cursor: sqlite3.Cursor):
+        """版本6：记录文件内容指纹，内容未变化的修改事件可跳过重新解析与向量化"""
+        cursor.execute('ALTER TABLE file_index ADD COLUMN fingerprint TEXT')
+
+    def _load_promoted_columns(self) -> Dict[str, str]:
+        """读取已提升的元数据键及其生成列名"""
+        with self._pool.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT key, column_name FROM promoted_metadata')
+            return dict(cursor.fetchall())
+
+    def promote_metadata_key(self, key: str) -> str:
+        """
+        将元数据键提升为带索引的VIRTUAL生成列，之后对该键的查询自动走索引
+
+        添加VIRTUAL列不会重写表，只需构建一次索引，迁移期间读者不受影响
+        Args:
+            key: str - 元数据键名
+        Returns:
+            str - 生成列名
+        """
+        if key in self._promoted_columns:
+            return self._promoted_columns[key]
+        if not self.METADATA_KEY_PATTERN.match(key):
+            raise ValueError(f"Metadata key cannot be promoted: {key}")
+
+        column_name = self._metadata_column_name(key)
+        index_name = f'idx_{column_name}'
+        with self._pool.write() as conn:
+            cursor = conn.cursor()
+            # SQLite的列名不区分大小写，与已有列（包括其他键的生成列）重名时拒绝提升
+            cursor.execute('PRAGMA table_xinfo(file_index)')
+            existing_columns = {row[1].lower() for row in cursor.fetchall()}
+            if column_name.lower() in existing_columns:
+                raise ValueError(f"Metadata column name collides with an existing column: {key} -> {column_name}")
+            cursor.execute(f'''
+                ALTER TABLE file_index 
+                ADD COLUMN {column_name} GENERATED ALWAYS AS (json_extract(metadata, '$.{key}')) VIRTUAL
             ''')
-            conn.commit()
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON file_index({column_name})')
+            cursor.execute('''
+                INSERT INTO promoted_metadata (key, column_name, index_name, promoted_at)
+                VALUES (?, ?, ?, ?)
+            ''', (key, column_name, index_name, datetime.now().isoformat()))
+        self._promoted_columns[key] = column_name
+        return column_name
+
+    @staticmethod
+    def _metadata_column_name(key: str) -> str:
+        """
+        生成列名：保留键名原样，并附加完整键名的短哈希
+
+        SQLite的标识符不区分大小写，仅大小写不同的键（如 Author 与 author）需要由哈希区分
+        """
+        digest = hashlib.sha1(key.encode()).hexdigest()[:8]
+        return f'meta_{key}_{digest}'
+
+    def demote_metadata_key(self, key: str):
+        """取消元数据键的提升，删除对应的索引与生成列"""
+        column_name = self._promoted_columns.get(key)
+        if column_name is None:
+            return
+        with self._pool.write() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'DROP INDEX IF EXISTS idx_{column_name}')
+            cursor.execute(f'ALTER TABLE file_index DROP COLUMN {column_name}')
+            cursor.execute('DELETE FROM promoted_metadata WHERE key = ?', (key,))
+        del self._promoted_columns[key]
+
+    def get_promoted_metadata_keys(self) -> Dict[str, str]:
+        """获取已提升的元数据键及其生成列名"""
+        return dict(self._promoted_columns)
+
+    def _metadata_clause(self, key: str) -> str:
+        """元数据等值条件：已提升的键使用带索引的生成列，其余回退为json_extract"""
+        column_name = self._promoted_columns.get(key)
+        if column_name:
+            return f'{column_name} = ?'
+        return f"json_extract(metadata, '$.{key}') = ?"
 
     def reset(self):
         """清除所有数据,保留表结构"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self._pool.write() as conn:
                 cursor = conn.cursor()
                 # 先删除doc_file_mapping表中的数据
                 cursor.execute('DELETE FROM doc_file_mapping')
                 # 然后删除file_index表中的数据
                 cursor.execute('DELETE FROM file_index')
-                conn.commit()
-                return True
+                cursor.execute('DELETE FROM change_journal')
+                cursor.execute('DELETE FROM orphaned_documents')
+                if self.path_cache:
+                    self._pool.after_commit(self.path_cache.clear)
+            return True
         except sqlite3.Error as e:
             print(f"FileIndexer reset failed: {str(e)}")
             return False
 
+    @staticmethod
+    def _file_index_row(file: FileInfo) -> Tuple:
+        """将FileInfo转换为file_index的插入参数，顺序与FILE_INDEX_COLUMNS一致，末尾为fingerprint"""
+        return (file.id, file.path, file.name, int(file.is_directory), file.file_type.value,
+                file.size, file.created_at.isoformat(), file.modified_at.isoformat(),
+                json.dumps(file.metadata), json.dumps(file.document_ids), file.fingerprint)
+
+    @staticmethod
+    def _write_file_rows(cursor: sqlite3.Cursor, files: List[FileInfo]):
+        """以executemany批量写入文件信息及文档ID映射"""
+        # 插入文件信息
+        cursor.executemany('''
+            INSERT OR REPLACE INTO file_index 
+            (id, path, name, is_directory, file_type, size, created_at, modified_at, metadata, document_ids,
+             fingerprint)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [FileIndexer._file_index_row(file) for file in files])
+
+        # 删除旧的映射关系；文件ID由路径生成，修改后解析为空的文件也必须清除旧映射
+        cursor.executemany('DELETE FROM doc_file_mapping WHERE file_id = ?', [(file.id,) for file in files])
+        # 插入新的映射关系
+        cursor.executemany('''
+            INSERT OR REPLACE INTO doc_file_mapping (document_id, file_id)
+            VALUES (?, ?)
+        ''', [(doc_id, file.id) for file in files for doc_id in file.document_ids])
+
     def create_indexes(self, files: List[FileInfo]):
         """创建文件索引"""
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            # 开始事务
-            conn.execute('BEGIN')
-            try:
-                for file in files:
-                    # 插入文件信息
-                    cursor.execute('''
-                        INSERT OR REPLACE INTO file_index 
-                        (id, path, name, is_directory, file_type, size, created_at, modified_at, metadata, document_ids)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (file.id, file.path, file.name, int(file.is_directory), file.file_type.value,
-                          file.size, file.created_at.isoformat(), file.modified_at.isoformat(),
-                          json.dumps(file.metadata), json.dumps(file.document_ids)))
-
-                    # 更新文档ID映射
-                    if file.document_ids:
-                        # 删除旧的映射关系
-                        cursor.execute('DELETE FROM doc_file_mapping WHERE file_id = ?', (file.id,))
-                        # 插入新的映射关系
-                        for doc_id in file.document_ids:
-                            cursor.execute('''
-                                INSERT OR REPLACE INTO doc_file_mapping (document_id, file_id)
-                                VALUES (?, ?)
-                            ''', (doc_id, file.id))
-                conn.commit()
-            except Exception as e:
-                conn.rollback()
-                raise e
+        with self._pool.write() as conn:
+            self._write_file_rows(conn.cursor(), files)
+            self._cache_paths(files)
+
+    def _cache_paths(self, files: List[FileInfo], removed_paths: Iterable[str] = ()):
+        """登记事务提交后的路径缓存同步（先移除removed_paths，再写入files的路径），回滚时丢弃"""
+        if not self.path_cache:
+            return
+        entries = [(file.path, file.id) for file in files]
+        removed_paths = list(removed_paths)
+
+        def apply():
+            self.path_cache.remove_many(removed_paths)
+            self.path_cache.put_many(entries)
+
+        self._pool.after_commit(apply)
+
+    def bulk_create_indexes(self, files: Iterable[FileInfo],
+                            chunk_size: int = 10000,
+                            defer_indexes: bool = False,
+                            progress_callback: Optional[Callable[[int, float], None]] = None) -> Dict[str, float]:
+        """
+        批量导入文件索引，用于大目录的首次建立索引
+
+        与create_indexes不同，数据按chunk_size分块提交，每块结束后释放写锁，
+        其他写入（如监控事件）可以穿插执行
+
+        Args:
+            files: 文件信息，可以是生成器
+            chunk_size: 每个事务写入的文件数
+            defer_indexes: 是否在导入期间暂停二级索引与全文索引的维护，导入完成后统一重建
+            progress_callback: 每提交一块后调用，参数为 (已写入行数, 当前每秒行数)
+        Returns:
+            Dict[str, float] - 包含 rows、seconds、rows_per_second
+        """
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+
+        start_time = time.perf_counter()
+        total_rows = 0
+        if defer_indexes:
+            self._drop_deferred_structures()
+        try:
+            for chunk in self._chunked(files, chunk_size):
+                with self._pool.write() as conn:
+                    self._write_file_rows(conn.cursor(), chunk)
+                    self._cache_paths(chunk)
+                total_rows += len(chunk)
+                if progress_callback:
+                    elapsed = time.perf_counter() - start_time
+                    progress_callback(total_rows, total_rows / elapsed if elapsed else 0.0)
+        finally:
+            if defer_indexes:
+                self._rebuild_deferred_structures()
+
+        seconds = time.perf_counter() - start_time
+        return {
+            'rows': total_rows,
+            'seconds': seconds,
+            'rows_per_second': total_rows / seconds if seconds else 0.0,
+        }
+
+    @staticmethod
+    def _chunked(items: Iterable, chunk_size: int) -> Iterator[List]:
+        """将可迭代对象按固定大小分块"""
+        iterator = iter(items)
+        while True:
+            chunk = list(itertools.islice(iterator, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def _drop_deferred_structures(self):
+        """删除可推迟维护的索引与触发器"""
+        with self._pool.write() as conn:
+            cursor = conn.cursor()
+            for index_name in self.DEFERRABLE_INDEXES:
+                cursor.execute(f'DROP INDEX IF EXISTS {index_name}')
+            for column_name in self._promoted_columns.values():
+                cursor.execute(f'DROP INDEX IF EXISTS idx_{column_name}')
+            if self._filename_fts_available:
+                for trigger_name in self.FILENAME_FTS_TRIGGERS:
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {trigger_name}')
+            for trigger_name in StatsTables.TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {trigger_name}')
+
+    def _rebuild_deferred_structures(self):
+        """重建批量导入期间删除的索引与触发器，并一次性重建全文索引与统计表"""
+        with self._pool.write() as conn:
+            cursor = conn.cursor()
+            for create_sql in self.DEFERRABLE_INDEXES.values():
+                cursor.execute(create_sql)
+            for column_name in self._promoted_columns.values():
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{column_name} ON file_index({column_name})')
+            if self._filename_fts_available:
+                for create_sql in self.FILENAME_FTS_TRIGGERS.values():
+                    cursor.execute(create_sql)
+                cursor.execute("INSERT INTO file_name_fts(file_name_fts) VALUES ('rebuild')")
+            for create_sql in StatsTables.TRIGGERS.values():
+                cursor.execute(create_sql)
+            StatsTables.recompute(cursor)
+            cursor.execute('ANALYZE file_index')
 
     def update_indexes(self, files: List[FileInfo]):
         """批量更新文件索引"""
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            conn.execute('BEGIN')
-            try:
-                for file in files:
-                    # 更新文件信息
-                    cursor.execute('''
-                        UPDATE file_index 
-                        SET path=?, name=?, is_directory=?, file_type=?, 
-                            size=?, created_at=?, modified_at=?, 
-                            metadata=?, document_ids=?
-                        WHERE id=?
-                    ''', (file.path, file.name, int(file.is_directory),
-                          file.file_type.value, file.size,
-                          file.created_at.isoformat(),
-                          file.modified_at.isoformat(),
-                          json.dumps(file.metadata),
-                          json.dumps(file.document_ids),
-                          file.id))
-
-                    # 更新文档ID映射
-                    if file.document_ids:
-                        cursor.execute('DELETE FROM doc_file_mapping WHERE file_id = ?',
-                                       (file.id,))
-                        cursor.executemany('''
-                            INSERT INTO doc_file_mapping (document_id, file_id)
-                            VALUES (?, ?)
-                        ''', [(doc_id, file.id) for doc_id in file.document_ids])
-                conn.commit()
-            except Exception as e:
-                conn.rollback()
-                raise e
+        with self._pool.write() as conn:
+            cursor = conn.cursor()
+            old_paths = self._paths_by_ids(cursor, [file.id for file in files])
+            for file in files:
+                # 更新文件信息
+                cursor.execute('''
+                    UPDATE file_index 
+                    SET path=?, name=?, is_directory=?, file_type=?, 
+                        size=?, created_at=?, modified_at=?, 
+                        metadata=?, document_ids=?, fingerprint=COALESCE(?, fingerprint)
+                    WHERE id=?
+                ''', (file.path, file.name, int(file.is_directory),
+                      file.file_type.value, file.size,
+                      file.created_at.isoformat(),
+                      file.modified_at.isoformat(),
+                      json.dumps(file.metadata),
+                      json.dumps(file.document_ids),
+                      file.fingerprint,
+                      file.id))
+
+                # 更新文档ID映射
+                if file.document_ids:
+                    cursor.execute('DELETE FROM doc_file_mapping WHERE file_id = ?',
+                                   (file.id,))
+                    cursor.executemany('''
+                        INSERT INTO doc_file_mapping (document_id, file_id)
+                        VALUES (?, ?)
+                    ''', [(doc_id, file.id) for doc_id in file.document_ids])
+            self._cache_paths([file for file in files if file.id in old_paths], old_paths.values())
+
+    @staticmethod
+    def _paths_by_ids(cursor: sqlite3.Cursor, file_ids: List[str]) -> Dict[str, str]:
+        """在当前事务中查询文件ID对应的路径"""
+        paths = {}
+        # 分批查询，避免超出SQLite的参数数量上限
+        for start in range(0, len(file_ids), 500):
+            batch = file_ids[start:start + 500]
+            cursor.execute(f"SELECT id, path FROM file_index WHERE id IN ({','.join('?' * len(batch))})", batch)
+            paths.update(cursor.fetchall())
+        return paths
 
     def update_file_paths(self, path_updates: List[Tuple[str, str]]):
         """
-        仅更新文件的路径
+        仅更新文件的路径，文件ID随新路径重新生成，文档ID映射同步更新
         Args:
             path_updates: List[Tuple[str, str]] - 列表of (file_id, new_path) 元组
         """
-        with sqlite3.connect(self.db_file) as conn:
+        updates = [(FileInfo.generate_id(new_path), new_path, file_id) for file_id, new_path in path_updates]
+        with self._pool.write() as conn:
             cursor = conn.cursor()
-            conn.execute('BEGIN')
-            try:
-                # 批量更新路径和文件名
-                cursor.executemany('''
-                    UPDATE file_index 
-                    SET path = ?,
-                        name = ?
-                    WHERE id = ?
-                ''', [(new_path, os.path.basename(new_path), file_id)
-                      for file_id, new_path in path_updates])
-
-                conn.commit()
-            except Exception as e:
-                conn.rollback()
-                raise e
+            old_paths = self._paths_by_ids(cursor, [file_id for _, _, file_id in updates])
+            # 同步文档ID映射中的文件ID
+            cursor.executemany('''
+                UPDATE doc_file_mapping 
+                SET file_id = ?
+                WHERE file_id = ?
+            ''', [(new_id, file_id) for new_id, _, file_id in updates])
+            # 批量更新路径、文件名与文件ID
+            cursor.executemany('''
+                UPDATE file_index 
+                SET id = ?,
+                    path = ?,
+                    name = ?
+                WHERE id = ?
+            ''', [(new_id, new_path, os.path.basename(new_path), file_id)
+                  for new_id, new_path, file_id in updates])
+            if self.path_cache:
+                entries = [(new_path, new_id) for new_id, new_path, file_id in updates if file_id in old_paths]
+
+                def apply():
+                    self.path_cache.remove_many(old_paths.values())
+                    self.path_cache.put_many(entries)
+
+                self._pool.after_commit(apply)
 
     def update_file_path(self, file_id: str, new_path: str):
         """
-        更新单个文件的路径
+        更新单个文件的路径，文件ID随新路径重新生成
         Args:
             file_id: str - 文件ID
             new_path: str - 新的文件路径
         """
-        with sqlite3.connect(self.db_file) as conn:
+        new_id = FileInfo.generate_id(new_path)
+        with self._pool.write() as conn:
             cursor = conn.cursor()
-            conn.execute('BEGIN')
-            try:
-                # 更新路径和文件名
-                cursor.execute('''
-                    UPDATE file_index 
-                    SET path = ?,
-                        name = ?
-                    WHERE id = ?
-                ''', (new_path, os.path.basename(new_path), file_id))
+            old_paths = self._paths_by_ids(cursor, [file_id])
+            # 更新路径、文件名与文件ID
+            cursor.execute('''
+                UPDATE file_index 
+                SET id = ?,
+                    path = ?,
+                    name = ?
+                WHERE id = ?
+            ''', (new_id, new_path, os.path.basename(new_path), file_id))
 
-                if cursor.rowcount == 0:
-                    raise ValueError(f"File ID {file_id} not found")
+            if cursor.rowcount == 0:
+                raise ValueError(f"File ID {file_id} not found")
 
-                conn.commit()
-            except Exception as e:
-                conn.rollback()
-                raise e
+            cursor.execute('UPDATE doc_file_mapping SET file_id = ? WHERE file_id = ?', (new_id, file_id))
+            if self.path_cache:
+                def apply():
+                    self.path_cache.remove_many(old_paths.values())
+                    self.path_cache.put(new_path, new_id)
+
+                self._pool.after_commit(apply)
+
+    def move_directory(self, src_dir: str, dest_dir: str) -> int:
+        """
+        目录移动：以集合操作改写src_dir下所有后代的路径前缀，文件ID与文档ID映射同步更新
+
+        整个子树在一个事务内用固定数量的语句完成，与子树大小无关
+        Args:
+            src_dir: str - 原目录路径（已标准化）
+            dest_dir: str - 新目录路径（已标准化）
+        Returns:
+            int - 更新的索引行数
+        """
+        src_prefix = src_dir.rstrip(os.sep) + os.sep
+        dest_prefix = dest_dir.rstrip(os.sep) + os.sep
+        params = {
+            'src_dir': src_dir,
+            'dest_dir': dest_dir,
+            'src_prefix': src_prefix,
+            'src_upper': self._prefix_upper_bound(src_prefix),
+            'dest_prefix': dest_prefix,
+            'offset': len(src_prefix) + 1,
+            'dest_name': os.path.basename(dest_dir),
+        }
+        # 子树范围：目录自身（若被索引）及所有以"src_dir/"开头的路径，均可命中idx_file_path
+        in_subtree = '(path = :src_dir OR (path >= :src_prefix AND path < :src_upper))'
+        new_path = 'CASE WHEN path = :src_dir THEN :dest_dir ELSE :dest_prefix || substr(path, :offset) END'
+
+        with self._pool.write() as conn:
+            conn.create_function('file_id_for_path', 1, FileInfo.generate_id, deterministic=True)
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                UPDATE doc_file_mapping 
+                SET file_id = (
+                    SELECT file_id_for_path({new_path}) FROM file_index WHERE id = doc_file_mapping.file_id
+                )
+                WHERE file_id IN (SELECT id FROM file_index WHERE {in_subtree})
+            ''', params)
+            cursor.execute(f'''
+                UPDATE file_index 
+                SET id = file_id_for_path({new_path}),
+                    name = CASE WHEN path = :src_dir THEN :dest_name ELSE name END,
+                    path = {new_path}
+                WHERE {in_subtree}
+            ''', params)
+            count = cursor.rowcount
+            if self.path_cache:
+                self._pool.after_commit(
+                    lambda: self.path_cache.move_prefix(src_dir, dest_dir, os.sep, FileInfo.generate_id))
+        return count
 
     def delete_indexes(self, files: List[FileInfo]):
         """批量删除文件索引"""
-        with sqlite3.connect(self.db_file) as conn:
+        with self._pool.write() as conn:
             cursor = conn.cursor()
-            conn.execute('BEGIN')
-            try:
-                # 批量删除文件索引
-                file_ids = [file.id for file in files]
-                # 使用参数化查询构建IN子句
-                placeholders = ','.join('?' * len(file_ids))
-
-                # 删除文档ID映射
-                cursor.execute(f'''
-                    DELETE FROM doc_file_mapping 
-                    WHERE file_id IN ({placeholders})
-                ''', file_ids)
+            # 批量删除文件索引
+            file_ids = [file.id for file in files]
+            # 使用参数化查询构建IN子句
+            placeholders = ','.join('?' * len(file_ids))
 
-                # 删除文件索引
-                cursor.execute(f'''
-                    DELETE FROM file_index 
-                    WHERE id IN ({placeholders})
-                ''', file_ids)
+            # 删除文档ID映射
+            cursor.execute(f'''
+                DELETE FROM doc_file_mapping 
+                WHERE file_id IN ({placeholders})
+            ''', file_ids)
 
-                conn.commit()
-            except Exception as e:
-                conn.rollback()
-                raise e
+            # 删除文件索引
+            cursor.execute(f'''
+                DELETE FROM file_index 
+                WHERE id IN ({placeholders})
+            ''', file_ids)
+            if self.path_cache:
+                removed_paths = [file.path for file in files]
+                self._pool.after_commit(lambda: self.path_cache.remove_many(removed_paths))
 
     def delete_index(self, file_id: str) -> List[str]:
         """
@@ -249,74 +706,53 @@ class FileIndexer:
         Returns:
             List[str] - 被删除的文档ID列表
         """
-        with sqlite3.connect(self.db_file) as conn:
+        with self._pool.write() as conn:
             cursor = conn.cursor()
-            conn.execute('BEGIN')
-            try:
-                # 首先获取关联的文档ID
-                cursor.execute('''
-                    SELECT document_id 
-                    FROM doc_file_mapping 
-                    WHERE file_id = ?
-                ''', (file_id,))
-                document_ids = [row[0] for row in cursor.fetchall()]
+            # 首先获取关联的文档ID
+            cursor.execute('''
+                SELECT document_id 
+                FROM doc_file_mapping 
+                WHERE file_id = ?
+            ''', (file_id,))
+            document_ids = [row[0] for row in cursor.fetchall()]
+            old_paths = self._paths_by_ids(cursor, [file_id])
 
-                # 删除文档ID映射
-                cursor.execute('''
-                    DELETE FROM doc_file_mapping 
-                    WHERE file_id = ?
-                ''', (file_id,))
+            # 删除文档ID映射
+            cursor.execute('''
+                DELETE FROM doc_file_mapping 
+                WHERE file_id = ?
+            ''', (file_id,))
 
-                # 删除文件索引
-                cursor.execute('''
-                    DELETE FROM file_index 
-                    WHERE id = ?
-                ''', (file_id,))
+            # 删除文件索引
+            cursor.execute('''
+                DELETE FROM file_index 
+                WHERE id = ?
+            ''', (file_id,))
 
-                if cursor.rowcount == 0:
-                    raise ValueError(f"File ID {file_id} not found")
+            if cursor.rowcount == 0:
+                raise ValueError(f"File ID {file_id} not found")
 
-                conn.commit()
-                return document_ids
-            except Exception as e:
-                conn.rollback()
-                raise e
+            if self.path_cache:
+                self._pool.after_commit(lambda: self.path_cache.remove_many(old_paths.values()))
+        return document_ids
 
     def _rows_to_file_infos(self, rows: List[Tuple]) -> List[FileInfo]:
-        """将数据库结果行转换为FileInfo对象列表"""
-        file_infos = []
-        for row in rows:
-            file_info = self._row_to_file_info(row)
-            if file_info:
-                file_infos.append(file_info)
-        return file_infos
+        """将数据库结果行按列批量转换为FileInfo对象列表"""
+        return FileInfo.from_index_rows(rows)
 
     def _row_to_file_info(self, row: Tuple) -> Optional[FileInfo]:
         """将数据库结果行转换为FileInfo对象"""
         if not row:
             return None
         try:
-            file_info = FileInfo(
-                path=row[1],
-                id=row[0],
-                name=row[2],
-                is_directory=bool(row[3]),
-                file_type=FileType(row[4]),
-                size=row[5],
-                created_at=datetime.fromisoformat(row[6]) if row[6] else None,
-                modified_at=datetime.fromisoformat(row[7]) if row[7] else None,
-                metadata=json.loads(row[8]) if row[8] else {},
-                document_ids=json.loads(row[9]) if row[9] else [],
-                _skip_existence_check=True
-            )
-            return file_info
+            return FileInfo.from_index_row(row)
         except Exception as e:
             print(f"Error converting row to FileInfo: {e}")
             return None
 
     def get_file_ids_by_document_ids(self, document_ids: List[str]) -> List[str]:
         """快速获取与文档ID关联的文件ID列表"""
-        with sqlite3.connect(self.db_file) as conn:
+        with self._pool.read() as conn:
             cursor = conn.cursor()
             placeholders = ','.join('?' * len(document_ids))
             cursor.execute(f'''
@@ -328,7 +764,7 @@ class FileIndexer:
 
     def get_document_ids_by_file_id(self, file_id: str) -> List[str]:
         """获取指定文件ID关联的所有文档ID"""
-        with sqlite3.connect(self.db_file) as conn:
+        with self._pool.read() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT document_id 
@@ -338,12 +774,118 @@ class FileIndexer:
             return [row[0] for row in cursor.fetchall()]
 
     def get_id_by_path(self, path: str) -> str:
-        """根据文件路径返回对应的文件ID"""
-        with sqlite3.connect(self.db_file) as conn:
+        """根据文件路径返回对应的文件ID，优先从路径缓存读取"""
+        path_cache = self._readable_path_cache()
+        if path_cache:
+            # 先取得代数再读数据库：读取期间提交的写入会使回填被丢弃
+            generation = path_cache.generation
+            trusted, file_id = path_cache.lookup(path)
+            if trusted:
+                return file_id
+        with self._pool.read() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT id FROM file_index WHERE path = ?', (path,))
             result = cursor.fetchone()
-            return result[0] if result else None
+        if result and path_cache:
+            path_cache.fill(path, result[0], generation)
+        return result[0] if result else None
+
+    def get_fingerprints(self, file_ids: List[str]) -> Dict[str, Optional[str]]:
+        """批量获取文件内容指纹，未记录指纹的文件值为None"""
+        if not file_ids:
+            return {}
+        with self._pool.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT id, fingerprint FROM file_index WHERE id IN ({','.join('?' * len(file_ids))})",
+                           list(file_ids))
+            return dict(cursor.fetchall())
+
+    def get_file_states(self, path_prefix: str) -> Dict[str, Tuple[int, str, Optional[str]]]:
+        """获取前缀下所有文件（不含目录）的 path -> (size, modified_at, fingerprint)，用于与文件系统对账"""
+        with self._pool.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT path, size, modified_at, fingerprint FROM file_index
+                WHERE path >= ? AND path < ? AND is_directory = 0
+            ''', (path_prefix, self._prefix_upper_bound(path_prefix)))
+            return {path: (size, modified_at, fingerprint) for path, size, modified_at, fingerprint in cursor}
+
+    def get_file_states_by_paths(self, paths: List[str]) -> Dict[str, Tuple[int, str, Optional[str]]]:
+        """按路径批量获取文件（不含目录）的 path -> (size, modified_at, fingerprint)，不在索引中的路径不返回"""
+        states = {}
+        with self._pool.read() as conn:
+            cursor = conn.cursor()
+            # 分批查询，避免超出SQLite的参数数量上限
+            for start in range(0, len(paths), 500):
+                batch = paths[start:start + 500]
+                cursor.execute(f'''
+                    SELECT path, size, modified_at, fingerprint FROM file_index
+                    WHERE path IN ({','.join('?' * len(batch))}) AND is_directory = 0
+                ''', batch)
+                states.update((path, (size, modified_at, fingerprint))
+                              for path, size, modified_at, fingerprint in cursor)
+        return states
+
+    def record_changes(self, root: str, changes: List[Tuple[str, int]]) -> Dict[str, int]:
+        """
+        在变化日志中记录待入库的文件
+
+        Args:
+            root: 监控目录
+            changes: (文件路径, 优先级) 列表
+        Returns:
+            Dict[str, int] - 路径 -> 日志序号，入库提交时用于确认
+        """
+        if not changes:
+            return {}
+        with self._pool.write() as conn:
+            return ChangeJournal.record(conn.cursor(), root, changes)
+
+    def acknowledge_changes(self, seqs: List[int]):
+        """确认变化日志中已处理的记录；在transaction()中调用时与索引的修改一起提交"""
+        if not seqs:
+            return
+        with self._pool.write() as conn:
+            ChangeJournal.acknowledge(conn.cursor(), seqs)
+
+    def get_pending_changes(self, root: str) -> List[Tuple[int, str, int]]:
+        """获取监控目录在变化日志中尚未处理的记录 (序号, 路径, 优先级)，按记录顺序排列"""
+        with self._pool.read() as conn:
+            return ChangeJournal.pending(conn.cursor(), root)
+
+    def get_change_checkpoint(self, root: str) -> int:
+        """获取监控目录的变化日志检查点：序号不超过该值的记录都已入库"""
+        with self._pool.read() as conn:
+            return ChangeJournal.checkpoint(conn.cursor(), root)
+
+    def get_orphaned_document_ids(self) -> List[str]:
+        """获取结构升级清理重复路径时失去引用的文档ID，其向量需由调用方删除"""
+        with self._pool.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT document_id FROM orphaned_documents')
+            return [row[0] for row in cursor.fetchall()]
+
+    def clear_orphaned_documents(self, document_ids: List[str]):
+        """向量删除后清除孤儿文档记录"""
+        with self._pool.write() as conn:
+            conn.cursor().executemany('DELETE FROM orphaned_documents WHERE document_id = ?',
+                                      [(document_id,) for document_id in document_ids])
+
+    def list_subtree(self, path_prefix: str) -> List[Tuple[str, str]]:
+        """按路径前缀枚举 (path, id)，按路径排序；完整缓存模式下直接由内存提供"""
+        path_cache = self._readable_path_cache()
+        if path_cache:
+            entries = path_cache.subtree(path_prefix)
+            if entries is not None:
+                return entries
+        with self._pool.read() as conn:
+            cursor = conn.cursor()
+            if path_prefix:
+                cursor.execute('SELECT path, id FROM file_index WHERE path >= ? AND path < ? ORDER BY path',
+                               (path_prefix, self._prefix_upper_bound(path_prefix)))
+            else:
+                cursor.execute('SELECT path, id FROM file_index ORDER BY path')
+            return cursor.fetchall()
 
     def search_by_document_ids(self, document_ids: List[str]) -> List[FileInfo]:
         """按文档ID搜索文件信息"""
@@ -352,7 +894,7 @@ class FileIndexer:
 
     def search_by_file_ids(self, file_ids: List[str]) -> List[FileInfo]:
         """按文件ID搜索文件信息"""
-        with sqlite3.connect(self.db_file) as conn:
+        with self._pool.read() as conn:
             cursor = conn.cursor()
             placeholders = ','.join('?' * len(file_ids))
             cursor.execute(f'''
@@ -361,24 +903,106 @@ class FileIndexer:
             ''', file_ids)
             return self._rows_to_file_infos(cursor.fetchall())
 
-    def search_by_filename(self, pattern: str, exact_match: bool = False) -> List[FileInfo]:
+    # trigram分词器的最小可索引长度，更短的片段只能回退为LIKE过滤
+    FTS_MIN_TOKEN_LENGTH = 3
+    FILENAME_MATCH_MODES = ('substring', 'prefix', 'tokens')
+
+    def _table_exists(self, table_name: str) -> bool:
+        """检查表（含虚拟表）是否存在"""
+        with self._pool.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,))
+            return cursor.fetchone() is not None
+
+    @staticmethod
+    def _escape_like(value: str) -> str:
+        """转义LIKE中的通配符，配合 ESCAPE '\\' 使用"""
+        return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+    def _build_filename_match(self, pattern: str, match_mode: str = 'substring',
+                              search_path: bool = False) -> Tuple[Optional[str], List[str], List[str]]:
+        """
+        将文件名查询编译为FTS5 MATCH表达式及补充的LIKE过滤条件
+
+        Args:
+            pattern: 查询字符串
+            match_mode: 'substring' 子串匹配 / 'prefix' 前缀匹配 / 'tokens' 按空白拆分后全部命中
+            search_path: 是否同时匹配完整路径
+        Returns:
+            Tuple[Optional[str], List[str], List[str]] - (MATCH表达式, LIKE条件SQL片段, LIKE参数)，
+            MATCH表达式为None表示无法使用全文索引
+        """
+        if match_mode not in self.FILENAME_MATCH_MODES:
+            raise ValueError(f"match_mode must be one of {self.FILENAME_MATCH_MODES}")
+
+        if match_mode == 'tokens':
+            terms = pattern.split()
+        else:
+            terms = [pattern]
+
+        columns = '{name path}' if search_path else 'name'
+        use_fts = self._filename_fts_available
+        phrases, like_clauses, like_params = [], [], []
+        for term in terms:
+            if match_mode == 'prefix':
+                like_value = f'{self._escape_like(term)}%'
+            else:
+                like_value = f'%{self._escape_like(term)}%'
+
+            if use_fts and len(term) >= self.FTS_MIN_TOKEN_LENGTH:
+                phrase = '"' + term.replace('"', '""') + '"'
+                phrases.append(f'^ {phrase}' if match_mode == 'prefix' else phrase)
+            elif search_path:
+                like_clauses.append("(f.name LIKE ? ESCAPE '\\' OR f.path LIKE ? ESCAPE '\\')")
+                like_params.extend([like_value, like_value])
+            else:
+                like_clauses.append("f.name LIKE ? ESCAPE '\\'")
+                like_params.append(like_value)
+
+        match_expr = f"{columns} : ({' AND '.join(phrases)})" if phrases else None
+        return match_expr, like_clauses, like_params
+
+    def search_by_filename(self, pattern: str, exact_match: bool = False,
+                           match_mode: str = 'substring', search_path: bool = False,
+                           limit: Optional[int] = None) -> List[FileInfo]:
         """按文件名搜索
 
+        非精确匹配时优先使用trigram全文索引，结果按相关度排序
+
         Args:
             pattern: 搜索模式
             exact_match: 是否精确匹配
+            match_mode: 'substring' 子串匹配 / 'prefix' 前缀匹配 / 'tokens' 按空白拆分后全部命中
+            search_path: 是否同时匹配完整路径
+            limit: 返回结果数量上限
         """
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            if exact_match:
-                cursor.execute('SELECT * FROM file_index WHERE name = ?', (pattern,))
+        if exact_match:
+            query, params = 'SELECT * FROM file_index f WHERE name = ?', [pattern]
+        else:
+            match_expr, like_clauses, params = self._build_filename_match(pattern, match_mode, search_path)
+            if match_expr:
+                query = ('SELECT f.* FROM file_name_fts '
+                         'JOIN file_index f ON f.rowid = file_name_fts.rowid '
+                         'WHERE file_name_fts MATCH ?')
+                params = [match_expr] + params
             else:
-                cursor.execute('SELECT * FROM file_index WHERE name LIKE ?', (f'%{pattern}%',))
+                query = 'SELECT * FROM file_index f WHERE 1=1'
+            for clause in like_clauses:
+                query += f' AND {clause}'
+            if match_expr:
+                query += ' ORDER BY file_name_fts.rank'
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+
+        with self._pool.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
             return self._rows_to_file_infos(cursor.fetchall())
 
     def search_by_type(self, file_type: str) -> List[FileInfo]:
         """按文件类型搜索"""
-        with sqlite3.connect(self.db_file) as conn:
+        with self._pool.read() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM file_index WHERE file_type = ?', (file_type,))
             return self._rows_to_file_infos(cursor.fetchall())
@@ -407,7 +1031,7 @@ class FileIndexer:
             query += f' AND {date_field} <= ?'
             params.append(end_date.isoformat())
 
-        with sqlite3.connect(self.db_file) as conn:
+        with self._pool.read() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
             return self._rows_to_file_infos(cursor.fetchall())
@@ -426,11 +1050,14 @@ class FileIndexer:
             query += ' AND size <= ?'
             params.append(max_size)
 
-        with sqlite3.connect(self.db_file) as conn:
+        with self._pool.read() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
             return self._rows_to_file_infos(cursor.fetchall())
 
+    # 子树条目不超过该数量时，改为按主键逐个读取
+    PATH_CACHE_ID_LOOKUP_LIMIT = 500
+
     def search_by_path(self, path_pattern: str, recursive: bool = True) -> List[FileInfo]:
         """按路径搜索
 
@@ -438,78 +1065,292 @@ class FileIndexer:
             path_pattern: 路径模式
             recursive: 是否递归搜索子目录
         """
-        with sqlite3.connect(self.db_file) as conn:
+        path_cache = self._readable_path_cache()
+        if path_cache:
+            if recursive:
+                entries = path_cache.subtree(path_pattern)
+                if entries is not None and len(entries) <= self.PATH_CACHE_ID_LOOKUP_LIMIT:
+                    return self.search_by_file_ids([file_id for _, file_id in entries]) if entries else []
+            else:
+                trusted, file_id = path_cache.lookup(path_pattern)
+                if trusted:
+                    return self.search_by_file_ids([file_id]) if file_id else []
+
+        with self._pool.read() as conn:
             cursor = conn.cursor()
             if recursive:
-                cursor.execute('SELECT * FROM file_index WHERE path LIKE ?', (f'{path_pattern}%',))
+                # 前缀匹配改写为范围查询，使其可以命中idx_file_path（LIKE无法使用该索引）
+                if path_pattern:
+                    cursor.execute('SELECT * FROM file_index WHERE path >= ? AND path < ?',
+                                   (path_pattern, self._prefix_upper_bound(path_pattern)))
+                else:
+                    cursor.execute('SELECT * FROM file_index')
             else:
                 cursor.execute('SELECT * FROM file_index WHERE path = ?', (path_pattern,))
             return self._rows_to_file_infos(cursor.fetchall())
 
+    @staticmethod
+    def _prefix_upper_bound(prefix: str) -> str:
+        """返回大于所有以prefix开头的字符串的最小上界，用于前缀范围查询"""
+        return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
     def search_by_metadata(self, metadata_filters: Dict) -> List[FileInfo]:
         """按元数据搜索"""
         query = 'SELECT * FROM file_index WHERE 1=1'
         params = []
 
         for key, value in metadata_filters.items():
-            query += f" AND json_extract(metadata, '$.{key}') = ?"
+            query += f' AND {self._metadata_clause(key)}'
             params.append(str(value))
 
-        with sqlite3.connect(self.db_file) as conn:
+        with self._pool.read() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
             return self._rows_to_file_infos(cursor.fetchall())
 
     def advanced_search(self,
-                        search_criteria: Dict[SearchType, any],
+                        search_criteria: Dict[SearchType, Any],
                         sort_by: Optional[str] = None,
                         sort_order: str = 'ASC',
                         limit: Optional[int] = None) -> List[FileInfo]:
-        """高级搜索，支持多条件组合"""
-        query = 'SELECT * FROM file_index WHERE 1=1'
-        params = []
+        """高级搜索，支持多条件组合
 
-        for search_type, value in search_criteria.items():
-            if search_type == SearchType.FILENAME:
-                query += ' AND name LIKE ?'
-                params.append(f'%{value}%')
-            elif search_type == SearchType.CONTENT_TYPE:
-                query += ' AND type = ?'
-                params.append(value)
-            elif search_type == SearchType.DATE_RANGE:
-                start_date, end_date = value
-                if start_date:
-                    query += ' AND modified_at >= ?'
-                    params.append(start_date.isoformat())
-                if end_date:
-                    query += ' AND modified_at <= ?'
-                    params.append(end_date.isoformat())
-            # ... 其他条件的处理
-
-        if sort_by:
-            query += f' ORDER BY {sort_by} {sort_order}'
-        if limit:
-            query += ' LIMIT ?'
-            params.append(limit)
-
-        with sqlite3.connect(self.db_file) as conn:
+        Args:
+            search_criteria: 搜索条件，各SearchType的取值格式：
+                FILENAME: str 文件名子串
+                CONTENT_TYPE: str / FileType 或其列表
+                DATE_RANGE: (start, end) 或 (start, end, 'created_at' | 'modified_at')
+                SIZE_RANGE: (min_size, max_size)
+                PATH: str 路径前缀，或 (path, recursive)
+                METADATA: Dict 元数据键值
+                DOCUMENT_ID / FILE_ID: str 或其列表
+            sort_by: 排序列，见FileQueryBuilder.SORT_COLUMNS
+            sort_order: 'ASC' 或 'DESC'
+            limit: 返回数量上限
+        """
+        query, params = self.query_builder.compile(search_criteria, 'rows', sort_by, sort_order, limit)
+        with self._pool.read() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
             return self._rows_to_file_infos(cursor.fetchall())
 
+    def count(self, search_criteria: Optional[Dict[SearchType, Any]] = None) -> int:
+        """统计满足条件的文件数，在SQL中完成计数而不构造FileInfo"""
+        query, params = self.query_builder.compile(search_criteria, 'count')
+        with self._pool.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return cursor.fetchone()[0]
+
+    def exists(self, search_criteria: Dict[SearchType, Any]) -> bool:
+        """判断是否存在满足条件的文件，命中第一行即返回"""
+        query, params = self.query_builder.compile(search_criteria, 'exists')
+        with self._pool.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return bool(cursor.fetchone()[0])
+
+    def aggregate(self,
+                  search_criteria: Optional[Dict[SearchType, Any]] = None,
+                  group_by: str = 'file_type') -> List[Dict[str, Any]]:
+        """
+        按列分组聚合满足条件的文件
+
+        Args:
+            search_criteria: 搜索条件
+            group_by: 分组列，'file_type'、'is_directory' 或已提升的元数据键
+        Returns:
+            List[Dict[str, Any]] - 每组的 key、count、total_size、min_size、max_size、latest_modified_at，按数量降序
+        """
+        query, params = self.query_builder.compile(search_criteria, 'aggregate', group_by=group_by)
+        with self._pool.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return [{
+                'key': row[0],
+                'count': row[1],
+                'total_size': row[2],
+                'min_size': row[3],
+                'max_size': row[4],
+                'latest_modified_at': row[5],
+            } for row in cursor.fetchall()]
+
     def get_all_files(self) -> List[FileInfo]:
         """获取所有文件信息"""
-        with sqlite3.connect(self.db_file) as conn:
+        with self._pool.read() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM file_index')
             return self._rows_to_file_infos(cursor.fetchall())
 
+    def _file_filters(self,
+                      file_type: Optional[str] = None,
+                      start_date: Optional[datetime] = None,
+                      end_date: Optional[datetime] = None,
+                      date_field: str = 'modified_at',
+                      min_size: Optional[int] = None,
+                      max_size: Optional[int] = None,
+                      path_prefix: Optional[str] = None,
+                      metadata_filters: Optional[Dict] = None) -> Tuple[str, List]:
+        """将过滤条件编译为WHERE子句（不含WHERE关键字）及参数"""
+        if date_field not in ['created_at', 'modified_at']:
+            raise ValueError("date_field must be either 'created_at' or 'modified_at'")
+
+        clauses, params = ['1=1'], []
+        if file_type is not None:
+            clauses.append('file_type = ?')
+            params.append(file_type)
+        if start_date:
+            clauses.append(f'{date_field} >= ?')
+            params.append(start_date.isoformat())
+        if end_date:
+            clauses.append(f'{date_field} <= ?')
+            params.append(end_date.isoformat())
+        if min_size is not None:
+            clauses.append('size >= ?')
+            params.append(min_size)
+        if max_size is not None:
+            clauses.append('size <= ?')
+            params.append(max_size)
+        if path_prefix:
+            clauses.append('path >= ? AND path < ?')
+            params.extend([path_prefix, self._prefix_upper_bound(path_prefix)])
+        for key, value in (metadata_filters or {}).items():
+            clauses.append(self._metadata_clause(key))
+            params.append(str(value))
+        return ' AND '.join(clauses), params
+
+    @staticmethod
+    def encode_cursor(order_by: str, last_value: str) -> str:
+        """生成分页游标，UI可原样回传以获取下一页"""
+        payload = json.dumps({'k': order_by, 'v': last_value}, ensure_ascii=False)
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor_token: str, order_by: str) -> str:
+        """解析分页游标，返回上一页最后一行的键值"""
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor_token.encode()).decode())
+            key, value = payload['k'], payload['v']
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError(f"Invalid cursor token: {cursor_token}") from e
+        if key != order_by:
+            raise ValueError(f"Cursor token was created for order_by='{key}', not '{order_by}'")
+        return value
+
+    def _decode_projected_row(self, columns: Tuple[str, ...], row: Tuple) -> Dict[str, Any]:
+        """将投影查询的结果行转换为字典，仅解码被选中的列"""
+        record = dict(zip(columns, row))
+        if record.get('is_directory') is not None:
+            record['is_directory'] = bool(record['is_directory'])
+        for column in ('created_at', 'modified_at'):
+            if record.get(column):
+                record[column] = datetime.fromisoformat(record[column])
+        if 'metadata' in record:
+            record['metadata'] = json.loads(record['metadata']) if record['metadata'] else {}
+        if 'document_ids' in record:
+            record['document_ids'] = json.loads(record['document_ids']) if record['document_ids'] else []
+        return record
+
+    def _iter_pages(self, where: str, params: List,
+                    order_by: str = 'path',
+                    batch_size: int = 1000,
+                    columns: Optional[Tuple[str, ...]] = None,
+                    cursor_token: Optional[str] = None
+                    ) -> Iterator[Tuple[List[Union[FileInfo, Dict[str, Any]]], Optional[str]]]:
+        """
+        按键集分页逐批读取，每批为一个独立的短查询，不长期占用读事务
+
+        Yields:
+            Tuple[List, Optional[str]] - (当前批次结果, 下一页游标)，最后一批的游标为None
+        """
+        if order_by not in self.KEYSET_COLUMNS:
+            raise ValueError(f"order_by must be one of {self.KEYSET_COLUMNS}")
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        if columns is not None:
+            unknown = set(columns) - set(self.FILE_INDEX_COLUMNS)
+            if unknown:
+                raise ValueError(f"Unknown columns: {sorted(unknown)}")
+            columns = tuple(columns)
+            select_columns = columns if order_by in columns else columns + (order_by,)
+        else:
+            select_columns = self.FILE_INDEX_COLUMNS
+        key_index = select_columns.index(order_by)
+
+        last_value = self.decode_cursor(cursor_token, order_by) if cursor_token else None
+        query = f'SELECT {", ".join(select_columns)} FROM file_index WHERE {where}'
+        while True:
+            page_query, page_params = query, list(params)
+            if last_value is not None:
+                page_query += f' AND {order_by} > ?'
+                page_params.append(last_value)
+            page_query += f' ORDER BY {order_by} LIMIT ?'
+            page_params.append(batch_size)
+
+            with self._pool.read() as conn:
+                cursor = conn.cursor()
+                cursor.execute(page_query, page_params)
+                rows = cursor.fetchall()
+            if not rows:
+                return
+
+            last_value = rows[-1][key_index]
+            if columns is None:
+                items = self._rows_to_file_infos(rows)
+            else:
+                items = [self._decode_projected_row(select_columns, row) for row in rows]
+                if order_by not in columns:
+                    for item in items:
+                        del item[order_by]
+            next_token = self.encode_cursor(order_by, last_value) if len(rows) == batch_size else None
+            yield items, next_token
+            if next_token is None:
+                return
+
+    def iter_files(self,
+                   batch_size: int = 1000,
+                   order_by: str = 'path',
+                   columns: Optional[Tuple[str, ...]] = None,
+                   cursor_token: Optional[str] = None,
+                   **filters) -> Iterator[Union[FileInfo, Dict[str, Any]]]:
+        """
+        流式遍历文件索引，是get_all_files与各search_by_*的生成器版本
+
+        Args:
+            batch_size: 每批读取的行数
+            order_by: 键集分页使用的唯一键 ('path' 或 'id')
+            columns: 投影列，指定时逐行返回只含这些列的字典，避免构造FileInfo及解码未选中的JSON列
+            cursor_token: 从该游标之后继续遍历
+            **filters: 过滤条件，支持 file_type / start_date / end_date / date_field /
+                       min_size / max_size / path_prefix / metadata_filters
+        """
+        where, params = self._file_filters(**filters)
+        for items, _ in self._iter_pages(where, params, order_by, batch_size, columns, cursor_token):
+            yield from items
+
+    def get_files_page(self,
+                       page_size: int = 100,
+                       cursor_token: Optional[str] = None,
+                       order_by: str = 'path',
+                       columns: Optional[Tuple[str, ...]] = None,
+                       **filters) -> Tuple[List[Union[FileInfo, Dict[str, Any]]], Optional[str]]:
+        """
+        获取一页结果，供UI分页使用
+
+        Returns:
+            Tuple[List, Optional[str]] - (当前页结果, 下一页游标)，没有下一页时游标为None
+        """
+        where, params = self._file_filters(**filters)
+        for page in self._iter_pages(where, params, order_by, page_size, columns, cursor_token):
+            return page
+        return [], None
+
     def print_all_tables(self):
         """打印所有表的内容"""
-        with sqlite3.connect(self.db_file) as conn:
-            # 设置行工厂以返回字典格式的结果
-            conn.row_factory = sqlite3.Row
+        with self._pool.read() as conn:
             cursor = conn.cursor()
+            # 设置行工厂以返回字典格式的结果（仅作用于该游标，不影响池中的连接）
+            cursor.row_factory = sqlite3.Row
 
             # 打印 file_index 表内容
             print("\n=== File Index Table ===")
@@ -545,24 +1386,75 @@ class FileIndexer:
                     for row in rows:
                         print(f"\nMapping: document_id={row['document_id']}, file_id={row['file_id']}")
 
-    def get_table_stats(self):
-        """获取表的统计信息"""
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-
-            # 获取 file_index 表的记录数
-            cursor.execute("SELECT COUNT(*) FROM file_index")
-            file_count = cursor.fetchone()[0]
+    def get_table_stats(self) -> IndexStats:
+        """获取表的统计信息，直接读取由触发器维护的统计表，不扫描数据表"""
+        with self._pool.read() as conn:
+            return StatsTables.read(conn.cursor())
+
+    def print_table_stats(self):
+        """打印表的统计信息"""
+        stats = self.get_table_stats()
+        print("\n=== Database Statistics ===")
+        print(f"Total files indexed: {stats.total_files}")
+        print(f"Total document-file mappings: {stats.mapping_count}")
+        print(f"Unique document IDs: {stats.unique_documents}")
+        print(f"Total size: {stats.total_bytes} bytes ({stats.total_directories} directories)")
+        for file_type, item in sorted(stats.by_file_type.items()):
+            print(f"  {file_type}: {item['count']} files, {item['bytes']} bytes")
+        for label, count in stats.size_histogram.items():
+            print(f"  {label}: {count} files")
+
+    def check_stats_consistency(self, repair: bool = False) -> Dict[str, Tuple]:
+        """
+        从头重新计算统计信息并与触发器维护的结果比较
 
-            # 获取 doc_file_mapping 表的记录数
-            cursor.execute("SELECT COUNT(*) FROM doc_file_mapping")
-            mapping_count = cursor.fetchone()[0]
+        Args:
+            repair: 发现不一致时是否用重新计算的结果覆盖统计表
+        Returns:
+            Dict[str, Tuple] - 不一致的字段及其 (统计表中的值, 实际值)，为空表示一致
+        """
+        with self._pool.write() as conn:
+            cursor = conn.cursor()
+            mismatches = StatsTables.check(cursor)
+            if mismatches and repair:
+                StatsTables.recompute(cursor)
+        return mismatches
+
+    # 热点查询及其示例参数，用于校验执行计划是否命中索引
+    HOT_QUERIES = {
+        'get_id_by_path': ('SELECT id FROM file_index WHERE path = ?', ('',)),
+        'search_by_path': ('SELECT * FROM file_index WHERE path >= ? AND path < ?', ('', '')),
+        'search_by_filename_exact': ('SELECT * FROM file_index WHERE name = ?', ('',)),
+        'search_by_type': ('SELECT * FROM file_index WHERE file_type = ?', ('',)),
+        'search_by_date_range': ('SELECT * FROM file_index WHERE modified_at >= ? AND modified_at <= ?', ('', '')),
+        'search_by_size_range': ('SELECT * FROM file_index WHERE size >= ? AND size <= ?', (0, 0)),
+        'get_document_ids_by_file_id': ('SELECT document_id FROM doc_file_mapping WHERE file_id = ?', ('',)),
+        'get_file_ids_by_document_ids': ('SELECT DISTINCT file_id FROM doc_file_mapping WHERE document_id IN (?)',
+                                         ('',)),
+    }
+
+    def explain_query_plan(self, query: str, params: Tuple = ()) -> List[str]:
+        """返回查询的EXPLAIN QUERY PLAN明细"""
+        # EXPLAIN不校验表结构是否变化，池中的长连接及其语句缓存会给出过期的执行计划，使用独立的短连接
+        conn = sqlite3.connect(self.db_file)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'EXPLAIN QUERY PLAN {query}', params)
+            return [row[3] for row in cursor.fetchall()]
+        finally:
+            conn.close()
 
-            # 获取唯一文档ID的数量
-            cursor.execute("SELECT COUNT(DISTINCT document_id) FROM doc_file_mapping")
-            unique_docs = cursor.fetchone()[0]
+    def verify_query_plans(self) -> Dict[str, List[str]]:
+        """
+        校验所有热点查询均未退化为全表扫描
 
-            print("\n=== Database Statistics ===")
-            print(f"Total files indexed: {file_count}")
-            print(f"Total document-file mappings: {mapping_count}")
-            print(f"Unique document IDs: {unique_docs}")
+        Returns:
+            Dict[str, List[str]] - 存在全表扫描的查询名称及其执行计划，为空表示全部命中索引
+        """
+        full_scans = {}
+        for name, (query, params) in self.HOT_QUERIES.items():
+            plan = self.explain_query_plan(query, params)
+            # 全表扫描在执行计划中表现为 "SCAN <table>"，索引扫描为 "SCAN ... USING INDEX"
+            if any(detail.startswith('SCAN') and 'USING' not in detail for detail in plan):
+                full_scans[name] = plan
+        return full_scans
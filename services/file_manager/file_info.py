@@ -1,9 +1,11 @@
 from dataclasses import dataclass, asdict, field
 from datetime import datetime
 import hashlib
+import mmap
 import os
+import json
 from enum import Enum
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple, Sequence
 
 
 class FileType(Enum):
@@ -18,9 +20,40 @@ class FileType(Enum):
     OTHER = "other"
 
 
-@dataclass
+# 按值查找FileType，比FileType(value)的枚举构造快
+_FILE_TYPES_BY_VALUE = {file_type.value: file_type for file_type in FileType}
+
+# 扩展名到文件类型的映射
+_FILE_TYPES_BY_EXTENSION = {
+    **dict.fromkeys(('.txt', '.md', '.json', '.csv'), FileType.TEXT),
+    '.pdf': FileType.PDF,
+    **dict.fromkeys(('.doc', '.docx'), FileType.WORD),
+    **dict.fromkeys(('.jpg', '.jpeg', '.png', '.gif'), FileType.IMAGE),
+    **dict.fromkeys(('.mp4', '.avi', '.mov'), FileType.VIDEO),
+    **dict.fromkeys(('.mp3', '.wav'), FileType.AUDIO),
+}
+
+
+def _decode_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+# 延迟解码的字段：(在原始数据中的下标, 解码函数)
+_LAZY_FIELDS = {
+    'created_at': (0, _decode_datetime),
+    'modified_at': (1, _decode_datetime),
+    'metadata': (2, lambda value: json.loads(value) if value else {}),
+    'document_ids': (3, lambda value: json.loads(value) if value else []),
+}
+
+
+@dataclass(slots=True)
 class FileInfo:
-    """文件信息数据类"""
+    """文件信息数据类
+
+    使用__slots__存储以减少内存占用。从索引数据库读取的实例中，
+    日期与JSON字段保持原始字符串，直到第一次访问时才解码
+    """
     path: str
     id: str = ""
     name: str = ""
@@ -32,6 +65,10 @@ class FileInfo:
     metadata: Dict = field(default_factory=dict)
     document_ids: List[str] = field(default_factory=list)
     _skip_existence_check: bool = field(default=False, repr=False)
+    # 文件内容指纹，由compute_fingerprint计算；从索引读取的实例不加载，需通过FileIndexer.get_fingerprints查询
+    fingerprint: Optional[str] = None
+    # 尚未解码的 (created_at, modified_at, metadata, document_ids) 原始值
+    _raw: Optional[Tuple] = field(default=None, init=False, repr=False, compare=False)
 
     def __post_init__(self):
         # 跳过文件存在性检查
@@ -52,6 +89,96 @@ class FileInfo:
         self.metadata = {}
         self.document_ids = []
 
+    def __getattr__(self, name: str):
+        # 仅在slot未赋值时调用：按需解码延迟字段并缓存到slot中
+        if name not in _LAZY_FIELDS:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        index, decode = _LAZY_FIELDS[name]
+        value = decode(self._raw[index])
+        setattr(self, name, value)
+        return value
+
+    @classmethod
+    def from_stat(cls, path: str, stat_result: os.stat_result, is_directory: bool = False) -> 'FileInfo':
+        """
+        由一次stat的结果构造实例，避免__post_init__中的多次文件系统调用
+
+        Args:
+            path: 绝对且已规范化的路径（如扫描根目录规范化后拼接的DirEntry.path）
+            stat_result: 该路径的stat结果
+            is_directory: 是否为目录
+        """
+        if os.name == 'nt':
+            path = path.lower()
+        info = object.__new__(cls)
+        info.path = path
+        info.id = cls.generate_id(path)
+        info.name = os.path.basename(path)
+        info.is_directory = is_directory
+        if is_directory:
+            info.file_type = FileType.DIRECTORY
+            info.size = 0
+        else:
+            info.file_type = _FILE_TYPES_BY_EXTENSION.get(os.path.splitext(path)[1].lower(), FileType.OTHER)
+            info.size = stat_result.st_size
+        info.created_at = datetime.fromtimestamp(stat_result.st_ctime)
+        info.modified_at = datetime.fromtimestamp(stat_result.st_mtime)
+        info.metadata = {}
+        info.document_ids = []
+        info._skip_existence_check = True
+        info.fingerprint = None
+        info._raw = None
+        return info
+
+    @classmethod
+    def from_index_row(cls, row: Sequence) -> 'FileInfo':
+        """由file_index的结果行构造实例，日期与JSON字段延迟解码"""
+        info = object.__new__(cls)
+        info.id = row[0]
+        info.path = row[1]
+        info.name = row[2]
+        info.is_directory = bool(row[3])
+        info.file_type = _FILE_TYPES_BY_VALUE[row[4]]
+        info.size = row[5]
+        info._skip_existence_check = True
+        info.fingerprint = None
+        info._raw = (row[6], row[7], row[8], row[9])
+        return info
+
+    @classmethod
+    def from_index_rows(cls, rows: Sequence[Sequence]) -> List['FileInfo']:
+        """
+        按列批量构造实例
+
+        先将结果行转置为列，逐列完成类型转换后再组装对象，
+        file_type非法的行会被跳过
+        """
+        if not rows:
+            return []
+        columns = list(zip(*rows))
+        file_types = [_FILE_TYPES_BY_VALUE.get(value) for value in columns[4]]
+        raws = zip(columns[6], columns[7], columns[8], columns[9])
+
+        infos = []
+        new = object.__new__
+        for file_id, path, name, is_directory, file_type, size, raw in zip(
+                columns[0], columns[1], columns[2], columns[3], file_types, columns[5], raws):
+            if file_type is None:
+                print(f"Error converting row to FileInfo: invalid file_type for {path}")
+                continue
+            info = new(cls)
+            info.id = file_id
+            info.path = path
+            info.name = name
+            info.is_directory = bool(is_directory)
+            info.file_type = file_type
+            info.size = size
+            info._skip_existence_check = True
+            info.fingerprint = None
+            info._raw = raw
+            infos.append(info)
+        return infos
+
     @staticmethod
     def normalize_path(path: str) -> str:
         """标准化文件路径"""
@@ -69,6 +196,28 @@ class FileInfo:
         """生成文件唯一标识"""
         return hashlib.md5(path.encode()).hexdigest()
 
+    @staticmethod
+    def compute_fingerprint(path: str, chunk_size: int = 1024 * 1024) -> str:
+        """
+        计算文件内容指纹（BLAKE2b-128）
+
+        通过mmap映射文件并分块送入哈希，避免把整个文件读入内存；
+        无法映射的文件回退为分块读取
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                try:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        with memoryview(mapped) as view:
+                            for offset in range(0, len(view), chunk_size):
+                                digest.update(view[offset:offset + chunk_size])
+                except (ValueError, OSError):
+                    f.seek(0)
+                    for chunk in iter(lambda: f.read(chunk_size), b''):
+                        digest.update(chunk)
+        return digest.hexdigest()
+
     @staticmethod
     def generate_file_id(path: str) -> str:
         """公共接口：生成文件唯一标识"""
@@ -81,23 +230,12 @@ class FileInfo:
             return FileType.DIRECTORY
 
         ext = os.path.splitext(self.path)[1].lower()
-        type_mapping = {
-            ('.txt', '.md', '.json', '.csv'): FileType.TEXT,
-            ('.pdf',): FileType.PDF,
-            ('.doc', '.docx'): FileType.WORD,
-            ('.jpg', '.jpeg', '.png', '.gif'): FileType.IMAGE,
-            ('.mp4', '.avi', '.mov'): FileType.VIDEO,
-            ('.mp3', '.wav'): FileType.AUDIO
-        }
-
-        for extensions, file_type in type_mapping.items():
-            if ext in extensions:
-                return file_type
-        return FileType.OTHER
+        return _FILE_TYPES_BY_EXTENSION.get(ext, FileType.OTHER)
 
     def to_dict(self) -> Dict:
         """转换为字典格式"""
         data = asdict(self)
+        data.pop('_raw', None)
         data['file_type'] = self.file_type.value
         data['created_at'] = self.created_at.isoformat() if self.created_at else None
         data['modified_at'] = self.modified_at.isoformat() if self.modified_at else None
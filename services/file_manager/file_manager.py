@@ -17,11 +17,25 @@ class FileManager:
         print("VectorStore初始化完成！")
         self.indexer = FileIndexer(store_path + "\\file_index.db")
         print("FileIndexer初始化完成！")
+        self._delete_orphaned_documents()
 
-    def load_directory(self, path: str):
-        """加载目录并检查一致性"""
+    def _delete_orphaned_documents(self):
+        """删除索引结构升级时失去引用的文档向量"""
+        document_ids = self.indexer.get_orphaned_document_ids()
+        if document_ids and self.vector_store.delete_documents(document_ids):
+            self.indexer.clear_orphaned_documents(document_ids)
+            print(f"已删除{len(document_ids)}个失去引用的文档向量")
+
+    def load_directory(self, path: str, polling: bool = False):
+        """
+        加载目录并检查一致性
+
+        Args:
+            path: 目录路径
+            polling: 是否以轮询方式监控（用于网络共享、FUSE等文件系统通知不可靠的挂载）
+        """
         print("开始加载目录...")
-        self.scanner.initialize_handler(path, self.indexer, self.parser, self.vector_store)
+        self.scanner.initialize_handler(path, self.indexer, self.parser, self.vector_store, polling=polling).result()
         self.scanner.start_watching(path)
 
         print(f"目录加载完成: {path}")
@@ -29,14 +43,23 @@ class FileManager:
         print("所有文件索引如下：")
         print(self.indexer.print_all_tables())
 
+    def load_directories(self, paths: List[str]):
+        """加载多个目录，各目录的一致性检查并行执行"""
+        print("开始加载目录...")
+        self.scanner.initialize_handlers(paths, self.indexer, self.parser, self.vector_store)
+        self.scanner.start_watching()
+        print(f"目录加载完成: {', '.join(paths)}")
+
     def release_directory(self):
         self.scanner.stop_watching()
+        self.parser.close()
 
     def reset(self):
         """重置"""
+        # 先取消未完成的入库任务，避免它们在清空后写回索引与向量
+        self.scanner.reset()
         self.indexer.reset()
         self.vector_store.reset()
-        self.scanner.reset()
 
     def search(self, query: str) -> List[Document]:
         """搜索接口"""
@@ -1,41 +1,36 @@
-from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
 from langchain_core.documents import Document
 
 from config.config import Config
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 from services.file_manager import FileInfo
+from services.file_manager.parse_service import ProcessParseService, create_splitter, load_documents
 
 
 class FileParser:
     """文件解析器"""
 
-    def __init__(self):
-        self.splitter = RecursiveCharacterTextSplitter(
-            chunk_size=Config.CHUNK_SIZE,
-            chunk_overlap=Config.CHUNK_OVERLAP,
-            length_function=len,
-            add_start_index=True
-        )
+    def __init__(self, max_workers: Optional[int] = None, task_timeout: Optional[float] = None,
+                 max_tasks_per_child: Optional[int] = None):
+        """
+        初始化解析器
+
+        Args:
+            max_workers: 解析pdf、docx的工作进程数，默认CPU核数
+            task_timeout: 单个pdf、docx文件的解析时间上限(秒)
+            max_tasks_per_child: 每个工作进程执行多少个任务后被替换
+        """
+        self.splitter = create_splitter(Config.CHUNK_SIZE, Config.CHUNK_OVERLAP)
+        # CPU密集格式在进程池中解析，纯文本的解析开销小于进程间传输，仍在调用线程中执行
+        self.parse_service = ProcessParseService(Config.CHUNK_SIZE, Config.CHUNK_OVERLAP, max_workers=max_workers,
+                                                 task_timeout=task_timeout, max_tasks_per_child=max_tasks_per_child)
 
     def parse_file(self, file_path: str) -> List[Document]:
         """解析文件内容并分割成documents"""
-        documents = []
-        path_suffix = Path(file_path).suffix
-        if path_suffix.endswith(".pdf"):
-            loader = PyPDFLoader(file_path)  # 存在跨页信息丢失的问题，考虑自定义pdf加载器。
-            documents.extend(loader.load())
-        elif path_suffix.endswith(".docx"):
-            loader = Docx2txtLoader(file_path)
-            documents.extend(loader.load())
-        else:
-            loader = TextLoader(file_path, autodetect_encoding=True)
-            documents.extend(loader.load())
-        chunked_documents = self.splitter.split_documents(documents)
-        return chunked_documents
+        if self.parse_service.handles(file_path):
+            return self.parse_service.parse(file_path)
+        return self.splitter.split_documents(load_documents(file_path))
 
     def parse_file_with_info(self, info: FileInfo) -> List[Document]:
         documents = self.parse_file(info.path)
@@ -47,3 +42,7 @@ class FileParser:
         """提取文件元数据"""
         # 实现文件元数据提取逻辑
         pass
+
+    def close(self):
+        """关闭解析进程池"""
+        self.parse_service.close()
@@ -0,0 +1,208 @@
+from collections import OrderedDict
+from datetime import datetime
+from enum import Enum
+from typing import Dict, List, Tuple, Optional, Any, TYPE_CHECKING
+
+from services.file_manager.file_info import FileType
+
+if TYPE_CHECKING:
+    from services.file_manager import FileIndexer
+
+
+class SearchType(Enum):
+    """搜索类型枚举"""
+    FILENAME = "filename"  # 按文件名搜索
+    CONTENT_TYPE = "content_type"  # 按文件类型搜索
+    DATE_RANGE = "date_range"  # 按日期范围搜索
+    SIZE_RANGE = "size_range"  # 按文件大小范围搜索
+    DOCUMENT_ID = "document_id"  # 按文档ID搜索
+    FILE_ID = "file_id"  # 按文件ID搜索
+    PATH = "path"  # 按路径搜索
+    METADATA = "metadata"  # 按元数据搜索
+
+
+class FileQueryBuilder:
+    """
+    将SearchType组合条件编译为参数化SQL
+
+    SQL文本只取决于条件的"形状"（包含哪些条件、范围是否有上下界、列表长度等），
+    不包含任何取值，因此同一形状的查询复用同一条SQL及sqlite3的预编译语句缓存
+    """
+
+    SORT_COLUMNS = ('name', 'path', 'size', 'file_type', 'created_at', 'modified_at')
+    GROUP_COLUMNS = ('file_type', 'is_directory')
+    DATE_FIELDS = ('created_at', 'modified_at')
+
+    def __init__(self, indexer: 'FileIndexer', cache_size: int = 256):
+        """
+        初始化查询构建器
+
+        Args:
+            indexer: 文件索引，用于获取文件名全文索引与元数据生成列信息
+            cache_size: 缓存的SQL数量上限
+        """
+        self.indexer = indexer
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[Tuple, str]' = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def compile(self,
+                search_criteria: Optional[Dict[SearchType, Any]] = None,
+                mode: str = 'rows',
+                sort_by: Optional[str] = None,
+                sort_order: str = 'ASC',
+                limit: Optional[int] = None,
+                group_by: Optional[str] = None) -> Tuple[str, List]:
+        """
+        编译查询
+
+        Args:
+            search_criteria: 搜索条件
+            mode: 'rows' 返回记录 / 'count' 计数 / 'exists' 是否存在 / 'aggregate' 分组聚合
+            sort_by: 排序列，仅限SORT_COLUMNS
+            sort_order: 'ASC' 或 'DESC'
+            limit: 返回数量上限（仅rows模式）
+            group_by: 分组列（仅aggregate模式），GROUP_COLUMNS或已提升的元数据键
+        Returns:
+            Tuple[str, List] - (SQL, 参数)
+        """
+        if mode not in ('rows', 'count', 'exists', 'aggregate'):
+            raise ValueError(f"Unsupported query mode: {mode}")
+        sort_order = sort_order.upper()
+        if sort_order not in ('ASC', 'DESC'):
+            raise ValueError("sort_order must be either 'ASC' or 'DESC'")
+        if sort_by is not None and sort_by not in self.SORT_COLUMNS:
+            raise ValueError(f"sort_by must be one of {self.SORT_COLUMNS}")
+
+        fragments, params = [], []
+        for search_type, value in (search_criteria or {}).items():
+            fragment, fragment_params = self._compile_criterion(SearchType(search_type), value)
+            fragments.append(fragment)
+            params.extend(fragment_params)
+
+        group_column = self._group_column(group_by) if mode == 'aggregate' else None
+        key = (tuple(fragments), mode, sort_by if mode == 'rows' else None, sort_order,
+               bool(limit) and mode == 'rows', group_column)
+        query = self._cache.get(key)
+        if query is not None:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+            query = self._render(*key)
+            self._cache[key] = query
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        if limit and mode == 'rows':
+            params.append(limit)
+        return query, params
+
+    @staticmethod
+    def _render(fragments: Tuple[str, ...], mode: str, sort_by: Optional[str], sort_order: str,
+                has_limit: bool, group_column: Optional[str]) -> str:
+        """根据条件形状生成SQL文本"""
+        where = ' AND '.join(fragments) if fragments else '1=1'
+        if mode == 'count':
+            return f'SELECT COUNT(*) FROM file_index f WHERE {where}'
+        if mode == 'exists':
+            return f'SELECT EXISTS(SELECT 1 FROM file_index f WHERE {where})'
+        if mode == 'aggregate':
+            return (f'SELECT {group_column}, COUNT(*), COALESCE(SUM(size), 0), MIN(size), MAX(size), '
+                    f'MAX(modified_at) FROM file_index f WHERE {where} '
+                    f'GROUP BY {group_column} ORDER BY COUNT(*) DESC')
+
+        query = f'SELECT f.* FROM file_index f WHERE {where}'
+        if sort_by:
+            query += f' ORDER BY {sort_by} {sort_order}'
+        if has_limit:
+            query += ' LIMIT ?'
+        return query
+
+    def _group_column(self, group_by: Optional[str]) -> str:
+        if group_by in self.GROUP_COLUMNS:
+            return group_by
+        promoted = self.indexer.get_promoted_metadata_keys()
+        if group_by in promoted:
+            return promoted[group_by]
+        raise ValueError(f"group_by must be one of {self.GROUP_COLUMNS} or a promoted metadata key")
+
+    @staticmethod
+    def _as_list(value) -> List:
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return list(value)
+        return [value]
+
+    def _compile_criterion(self, search_type: SearchType, value) -> Tuple[str, List]:
+        """将单个条件编译为 (SQL片段, 参数)"""
+        if search_type == SearchType.FILENAME:
+            match_expr, like_clauses, like_params = self.indexer._build_filename_match(value)
+            clauses, params = [], []
+            if match_expr:
+                clauses.append('f.rowid IN (SELECT rowid FROM file_name_fts WHERE file_name_fts MATCH ?)')
+                params.append(match_expr)
+            clauses.extend(like_clauses)
+            params.extend(like_params)
+            return '(' + ' AND '.join(clauses or ['1=1']) + ')', params
+
+        if search_type == SearchType.CONTENT_TYPE:
+            file_types = [item.value if isinstance(item, FileType) else item for item in self._as_list(value)]
+            if len(file_types) == 1:
+                return 'f.file_type = ?', file_types
+            return f"f.file_type IN ({','.join('?' * len(file_types))})", file_types
+
+        if search_type == SearchType.DATE_RANGE:
+            # (start, end) 或 (start, end, date_field)
+            start_date, end_date = value[0], value[1]
+            date_field = value[2] if len(value) > 2 else 'modified_at'
+            if date_field not in self.DATE_FIELDS:
+                raise ValueError("date_field must be either 'created_at' or 'modified_at'")
+            clauses, params = [], []
+            if start_date:
+                clauses.append(f'f.{date_field} >= ?')
+                params.append(start_date.isoformat() if isinstance(start_date, datetime) else start_date)
+            if end_date:
+                clauses.append(f'f.{date_field} <= ?')
+                params.append(end_date.isoformat() if isinstance(end_date, datetime) else end_date)
+            return '(' + ' AND '.join(clauses or ['1=1']) + ')', params
+
+        if search_type == SearchType.SIZE_RANGE:
+            min_size, max_size = value
+            clauses, params = [], []
+            if min_size is not None:
+                clauses.append('f.size >= ?')
+                params.append(min_size)
+            if max_size is not None:
+                clauses.append('f.size <= ?')
+                params.append(max_size)
+            return '(' + ' AND '.join(clauses or ['1=1']) + ')', params
+
+        if search_type == SearchType.PATH:
+            # 路径前缀，或 (路径, 是否递归)
+            path, recursive = (value, True) if isinstance(value, str) else value
+            if not recursive:
+                return 'f.path = ?', [path]
+            if not path:
+                return '1=1', []
+            return '(f.path >= ? AND f.path < ?)', [path, self.indexer._prefix_upper_bound(path)]
+
+        if search_type == SearchType.METADATA:
+            clauses, params = [], []
+            for key, item in value.items():
+                clauses.append(self.indexer._metadata_clause(key))
+                params.append(str(item))
+            return '(' + ' AND '.join(clauses or ['1=1']) + ')', params
+
+        if search_type == SearchType.DOCUMENT_ID:
+            document_ids = self._as_list(value)
+            return (f"f.id IN (SELECT file_id FROM doc_file_mapping "
+                    f"WHERE document_id IN ({','.join('?' * len(document_ids))}))"), document_ids
+
+        if search_type == SearchType.FILE_ID:
+            file_ids = self._as_list(value)
+            if len(file_ids) == 1:
+                return 'f.id = ?', file_ids
+            return f"f.id IN ({','.join('?' * len(file_ids))})", file_ids
+
+        raise ValueError(f"Unsupported search type: {search_type}")
@@ -1,45 +1,234 @@
 import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import nullcontext
 from datetime import datetime
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterator, Callable
 
 from watchdog.observers import Observer
 
 from services.file_manager import FileInfo, FileIndexer, FileParser, VectorStore
+from services.file_manager.ignore_rules import IgnoreRules
+from services.file_manager.polling_observer import AdaptivePollingObserver
+from services.file_manager.worker_pool import IngestionService, SharedWorkerPool
 from utils.SnapshotManager import SnapshotManager
 
 
 class FileScanner:
-    def __init__(self):
+    # 并行扫描的默认线程数，目录遍历以IO等待为主，可超过CPU核数
+    DEFAULT_SCAN_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        初始化扫描器
+
+        Args:
+            max_workers: 所有监控目录共用的事件处理与对账线程数，默认SharedWorkerPool.DEFAULT_WORKERS
+        """
         self.event_handlers = {}
         self.observer = None
+        # inotify不可靠的目录（网络共享、FUSE等）使用的轮询观察者
+        self.polling_observer: Optional[AdaptivePollingObserver] = None
+        # 各目录的安全审计保存目录快照，用于跳过两次审计之间没有变化的目录
         self.snapshot_manager = SnapshotManager()
+        # 所有监控目录共用的线程：事件处理与对账、目录遍历、入库，线程数不随目录数量增长；
+        # 最后一个目录停止监控时关闭，再次监控时重新创建
+        self.max_workers = max_workers
+        self._worker_pool: Optional[SharedWorkerPool] = None
+        self._scan_executor: Optional[ThreadPoolExecutor] = None
+        self._shared_lock = threading.Lock()
+        # (indexer, parser, vector_store) 的id -> 入库服务，使用相同组件的目录共用一个
+        self._ingestion_services: Dict[Tuple[int, int, int], IngestionService] = {}
+
+    @property
+    def worker_pool(self) -> SharedWorkerPool:
+        """事件处理与对账共用的线程池"""
+        with self._shared_lock:
+            if self._worker_pool is None:
+                self._worker_pool = SharedWorkerPool(self.max_workers)
+            return self._worker_pool
+
+    @property
+    def scan_executor(self) -> ThreadPoolExecutor:
+        """目录遍历与指纹计算共用的线程池，多个目录同时对账时线程数不叠加"""
+        with self._shared_lock:
+            if self._scan_executor is None:
+                self._scan_executor = ThreadPoolExecutor(max_workers=self.DEFAULT_SCAN_WORKERS,
+                                                         thread_name_prefix='scan')
+            return self._scan_executor
+
+    def _get_ingestion_service(self, indexer: FileIndexer, parser: FileParser,
+                               vector_store: VectorStore) -> IngestionService:
+        key = (id(indexer), id(parser), id(vector_store))
+        if key not in self._ingestion_services:
+            self._ingestion_services[key] = IngestionService(indexer, parser, vector_store)
+        return self._ingestion_services[key]
+
+    def _close_shared(self, drain: bool = True):
+        """
+        (所有目录的处理器已关闭后) 关闭共用的入库服务与线程池
+
+        Args:
+            drain: 是否等待入库服务中已排队的文件处理完毕
+        """
+        for service in self._ingestion_services.values():
+            service.close(drain=drain)
+        self._ingestion_services.clear()
+        with self._shared_lock:
+            worker_pool, self._worker_pool = self._worker_pool, None
+            scan_executor, self._scan_executor = self._scan_executor, None
+        if worker_pool is not None:
+            worker_pool.close()
+        if scan_executor is not None:
+            scan_executor.shutdown(wait=True)
 
     def reset(self):
         """重置"""
+        for handler_info in self.event_handlers.values():
+            # 索引与向量库将被清空，未完成的入库任务直接取消
+            handler_info['handler'].close(drain=False)
         self.event_handlers.clear()
-        if self.observer and self.observer.is_alive():
-            self.observer.stop()
-            self.observer.join()
-        self.observer = None
+        self._stop_observers()
+        self._close_shared(drain=False)
         self.snapshot_manager.reset()
 
     def scan_directory(self, aim_path: str) -> List[FileInfo]:
         """扫描指定目录"""
-        aim_path = os.path.normpath(os.path.abspath(aim_path))
         files_info = []
-        for root, dirs, filenames in os.walk(aim_path):
-            for filename in filenames:
-                file_path = os.path.join(root, filename)
-                file_info = FileInfo(file_path)
-                files_info.append(file_info)
+        for batch in self.iter_scan_batches(aim_path):
+            files_info.extend(batch)
         return files_info
 
-    def initialize_handler(self, aim_path: str, indexer: FileIndexer, parser: FileParser, vector_store: VectorStore):
+    @staticmethod
+    def _scan_one_directory(dir_path: str, include_directories: bool,
+                            ignore_rules: IgnoreRules) -> Tuple[List[FileInfo], List[str]]:
+        """
+        用os.scandir扫描单个目录，每个文件只做一次stat，被忽略的文件与目录直接跳过（目录不再进入）
+
+        Returns:
+            Tuple[List[FileInfo], List[str]] - (该目录下的文件信息, 需要继续遍历的子目录)
+        """
+        files_info, subdirs = [], []
+        try:
+            for entry in ignore_rules.scandir(dir_path):
+                try:
+                    # 与os.walk一致：指向目录的符号链接视为目录但不进入
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            subdirs.append(entry.path)
+                        if include_directories:
+                            files_info.append(FileInfo.from_stat(entry.path, entry.stat(), is_directory=True))
+                    else:
+                        files_info.append(FileInfo.from_stat(entry.path, entry.stat()))
+                except OSError as e:
+                    # 扫描期间被删除的文件或失效的符号链接
+                    print(f"Skipping {entry.path}: {str(e)}")
+        except OSError as e:
+            print(f"Error scanning directory {dir_path}: {str(e)}")
+        return files_info, subdirs
+
+    def iter_scan_batches(self, aim_path: str, batch_size: int = 1000, max_workers: Optional[int] = None,
+                          include_directories: bool = False, ignore_rules: Optional[IgnoreRules] = None,
+                          executor: Optional[ThreadPoolExecutor] = None) -> Iterator[List[FileInfo]]:
+        """
+        并行扫描目录树，按批流式产出文件信息
+
+        每个目录作为一个任务提交到线程池，兄弟子树并行遍历；同时在途的目录数有上限，
+        消费者处理较慢时扫描会随之暂停，内存占用与目录树大小无关。批次内的顺序不保证
+
+        Args:
+            aim_path: 要扫描的目录
+            batch_size: 每批的文件数
+            max_workers: 扫描线程数，默认DEFAULT_SCAN_WORKERS
+            include_directories: 是否同时产出子目录本身
+            ignore_rules: 忽略规则，默认读取aim_path下的.gitignore/.ezyignore；遍历中遇到的子目录忽略文件会加入其中
+            executor: 使用已有的线程池（如scan_executor），默认为本次扫描创建；max_workers仍限制在途的目录数
+        Yields:
+            List[FileInfo] - 一批文件信息
+        """
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        max_workers = max_workers or self.DEFAULT_SCAN_WORKERS
+        aim_path = FileInfo.normalize_path(aim_path)
+        ignore_rules = ignore_rules or IgnoreRules(aim_path)
+        pending_dirs = deque([aim_path])
+        batch: List[FileInfo] = []
+
+        with nullcontext(executor) if executor else \
+                ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scan') as executor:
+            running = set()
+            try:
+                while pending_dirs or running:
+                    while pending_dirs and len(running) < max_workers * 2:
+                        running.add(executor.submit(self._scan_one_directory, pending_dirs.popleft(),
+                                                    include_directories, ignore_rules))
+                    done, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        files_info, subdirs = future.result()
+                        pending_dirs.extend(subdirs)
+                        batch.extend(files_info)
+                    if len(batch) >= batch_size:
+                        full = len(batch) - len(batch) % batch_size
+                        for start in range(0, full, batch_size):
+                            yield batch[start:start + batch_size]
+                        batch = batch[full:]
+                if batch:
+                    yield batch
+            finally:
+                # 消费者提前停止迭代时，取消尚未开始的任务
+                for future in running:
+                    future.cancel()
+
+    def scan_directory_to(self, aim_path: str, consumer: Callable[[List[FileInfo]], None],
+                          batch_size: int = 1000, max_workers: Optional[int] = None) -> int:
+        """
+        并行扫描目录并把每批文件信息交给consumer，如 FileIndexer.bulk_create_indexes
+
+        Returns:
+            int - 扫描到的文件总数
+        """
+        total = 0
+        for batch in self.iter_scan_batches(aim_path, batch_size=batch_size, max_workers=max_workers):
+            consumer(batch)
+            total += len(batch)
+        return total
+
+    def initialize_handler(self, aim_path: str, indexer: FileIndexer, parser: FileParser, vector_store: VectorStore,
+                           weight: int = 1, polling: bool = False) -> Future:
+        """
+        创建目录的处理器，启动对账在共用线程池中异步执行
+
+        Args:
+            weight: 该目录在共用入库服务中的调度权重
+            polling: 是否用基于目录mtime的轮询代替文件系统通知监控该目录（用于inotify不可靠的挂载）
+        Returns:
+            Future - 启动对账的结果（ReconcileResult）
+        """
         from services.file_manager import FileScannerHandler
+        handler = FileScannerHandler(indexer, parser, vector_store, aim_path,
+                                     scanner=self, worker_pool=self.worker_pool,
+                                     ingestion=self._get_ingestion_service(indexer, parser, vector_store),
+                                     weight=weight)
         self.event_handlers[aim_path] = {
-            'handler': FileScannerHandler(indexer, parser, vector_store, aim_path, self.snapshot_manager),
-            'watch': None  # 存储 observer.schedule 返回的 watch 对象
+            'handler': handler,
+            'watch': None,  # 存储 observer.schedule 返回的 watch 对象
+            'polling': polling
         }
+        return handler.startup
+
+    def initialize_handlers(self, aim_paths: List[str], indexer: FileIndexer, parser: FileParser,
+                            vector_store: VectorStore) -> Dict[str, object]:
+        """
+        初始化多个目录，各目录的启动对账并行执行
+
+        Returns:
+            Dict[str, ReconcileResult] - 目录 -> 启动对账的结果；所有目录结束后抛出第一个失败目录的异常
+        """
+        startups = {aim_path: self.initialize_handler(aim_path, indexer, parser, vector_store)
+                    for aim_path in aim_paths}
+        wait(startups.values())
+        return {aim_path: startup.result() for aim_path, startup in startups.items()}
 
     def start_watching(self, aim_path: str = None):
         """
@@ -51,44 +240,58 @@ class FileScanner:
         Raises:
             Exception: 当指定路径的 handler 未初始化时抛出异常
         """
+        if aim_path is None:
+            items = list(self.event_handlers.items())
+        else:
+            items = [(aim_path, self.event_handlers[aim_path])]
+        for path, handler_info in items:
+            if handler_info['watch'] is None:  # 避免重复监控
+                handler_info['watch'] = self._schedule(path, handler_info)
+
+    def _schedule(self, aim_path: str, handler_info: dict):
+        handler = handler_info['handler']
+        if handler_info.get('polling'):
+            if self.polling_observer is None or not self.polling_observer.is_alive():
+                self.polling_observer = AdaptivePollingObserver()
+                self.polling_observer.start()
+            # 轮询与处理器共用忽略规则，被忽略的目录不记录状态也不轮询
+            return self.polling_observer.schedule(handler, aim_path, listdir=handler.ignore_rules.scandir)
         if self.observer is None or not self.observer.is_alive():
             self.observer = Observer()
             self.observer.start()
+        return self.observer.schedule(handler, aim_path, recursive=True)
 
-        if aim_path is None:
-            for path, handler_info in self.event_handlers.items():
-                if handler_info['watch'] is None:
-                    handler_info['watch'] = self.observer.schedule(handler_info['handler'], path, recursive=True)
-        else:
-            handler_info = self.event_handlers[aim_path]
-            if handler_info['watch'] is None:  # 避免重复监控
-                handler_info['watch'] = self.observer.schedule(handler_info['handler'], aim_path, recursive=True)
+    def _stop_observers(self):
+        for observer in (self.observer, self.polling_observer):
+            if observer is not None and observer.is_alive():
+                observer.stop()
+                observer.join()
+        self.observer = None
+        self.polling_observer = None
 
     def stop_watching(self, aim_path: str = None):
         """
-        停止文件监控
+        停止文件监控；最后一个目录停止后同时关闭共用的入库服务与线程池
 
         Args:
             aim_path: 要停止监控的目录路径，如果为None则停止所有监控
         """
-        if self.observer is None or not self.observer.is_alive():
-            return
-
         if aim_path is not None:
-            # 停止监控指定路径
-            if aim_path in self.event_handlers:
-                handler_info = self.event_handlers[aim_path]
-                if handler_info['watch']:
-                    self.observer.unschedule(handler_info['watch'])
-                del self.event_handlers[aim_path]
-
-                # 如果没有其他活跃的监控，则停止 observer
-                if not self.event_handlers:
-                    self.observer.stop()
-                    self.observer.join()
+            # 停止监控指定路径；观察者可能已停止，处理器仍需关闭
+            handler_info = self.event_handlers.pop(aim_path, None)
+            if handler_info is not None:
+                observer = self.polling_observer if handler_info.get('polling') else self.observer
+                if handler_info['watch'] and observer is not None and observer.is_alive():
+                    observer.unschedule(handler_info['watch'])
+                handler_info['handler'].close()
         else:
             # 停止所有监控
-            self.observer.stop()
-            self.observer.join()
-            # 清理所有 watch 记录
+            self._stop_observers()
+            for handler_info in self.event_handlers.values():
+                handler_info['handler'].close()
             self.event_handlers.clear()
+
+        # 如果没有其他活跃的监控，则停止 observer 并释放共用资源
+        if not self.event_handlers:
+            self._stop_observers()
+            self._close_shared()
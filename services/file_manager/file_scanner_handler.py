@@ -1,33 +1,43 @@
 import logging
 import os
+import stat
 import threading
+import time
+from concurrent import futures
+from datetime import datetime
 
 from watchdog.events import FileSystemEventHandler
-from watchdog.utils.dirsnapshot import DirectorySnapshot, DirectorySnapshotDiff, EmptyDirectorySnapshot
 
 from services.file_manager import FileInfo
+from services.file_manager.ignore_rules import IgnoreRules
+from services.file_manager.index_reconciler import IndexReconciler, ReconcileResult
+from services.file_manager.index_scheduler import TaskPriority
+from services.file_manager.worker_pool import IngestionService, ScheduledCall, SharedWorkerPool
+from utils.CompactSnapshot import CompactSnapshot
 
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Optional, List, Tuple, Dict, Any
 
 if TYPE_CHECKING:
-    from services.file_manager import FileIndexer, FileParser, VectorStore
-    from utils.SnapshotManager import SnapshotManager
+    from services.file_manager import FileIndexer, FileParser, VectorStore, FileScanner
 
 
 class FileScannerHandler(FileSystemEventHandler):
     """文件系统变化处理器，监控特定目录下的文件变化并进行相应处理"""
 
-    IGNORED_PATTERNS = {
-        r'^~\$.*',  # Word临时文件
-        r'.*\.tmp$',  # 临时文件
-        r'.*\.temp$',
-        r'^\.',      # 隐藏文件
-        r'.*~$',     # 备份文件
-        r'.*\.swp$'  # vim临时文件
-    }
+    # 对账进度日志的间隔（文件数）
+    RECONCILE_PROGRESS_INTERVAL = 10000
+    # 需要处理的事件类型（opened、closed_no_write等不涉及内容变化）
+    HANDLED_EVENT_TYPES = frozenset({'created', 'modified', 'deleted', 'moved', 'closed'})
+    # 对账补录时按大小与修改时间分级：不超过该大小或在该时间内修改过的文件优先于其余文件
+    SMALL_FILE_BYTES = 1024 * 1024
+    RECENT_FILE_SECONDS = 7 * 24 * 3600
 
     def __init__(self, indexer: 'FileIndexer', parser: 'FileParser', vector_store: 'VectorStore',
-                 aim_path: str, snapshot_manager: 'SnapshotManager', debounce_seconds: float = 0.2):
+                 aim_path: str, debounce_seconds: float = 0.2,
+                 scanner: Optional['FileScanner'] = None, max_latency_seconds: float = 2.0,
+                 audit_interval_seconds: Optional[float] = 3600.0,
+                 worker_pool: Optional[SharedWorkerPool] = None, ingestion: Optional[IngestionService] = None,
+                 weight: int = 1):
         """
         初始化文件扫描处理器
 
@@ -36,8 +46,13 @@ class FileScannerHandler(FileSystemEventHandler):
             parser: 文件解析器
             vector_store: 向量存储
             aim_path: 监控目录路径
-            snapshot_manager: 快照管理器
             debounce_seconds: 防抖延迟时间(秒)
+            scanner: 文件扫描器，用于启动对账时并行遍历目录
+            max_latency_seconds: 事件从到达到被处理的最长延迟(秒)，持续有事件时也会按时处理
+            audit_interval_seconds: 安全审计的间隔(秒)，None表示不做周期审计
+            worker_pool: 多个目录共用的工作线程池，事件处理与对账在其中执行，默认创建独占的线程池
+            ingestion: 多个目录共用的入库服务（须使用相同的indexer、parser与vector_store），默认创建独占的服务
+            weight: 在共用的入库服务中的调度权重，同一优先级内出队次数与权重成正比
         """
         super(FileScannerHandler, self).__init__()
         self.logger = logging.getLogger(__name__)
@@ -48,92 +63,413 @@ class FileScannerHandler(FileSystemEventHandler):
         self.vector_store = vector_store
         self.aim_path = aim_path
         self.debounce_seconds = debounce_seconds
-        self.timer: Optional[threading.Timer] = None
+        self.max_latency_seconds = max_latency_seconds
+        self.audit_interval_seconds = audit_interval_seconds
+        self.timer: Optional[ScheduledCall] = None
+        self.audit_timer: Optional[ScheduledCall] = None
+        self._closed = False
 
-        self.snapshot_manager = snapshot_manager
-        # 尝试加载该路径的最新快照
-        print(f"尝试加载快照: {aim_path}")
-        self.snapshot = self.snapshot_manager.load_latest_snapshot(self.aim_path)
-        if self.snapshot is None:
-            self.logger.info("未找到快照，开始新建快照...")
-            self.snapshot = EmptyDirectorySnapshot()
+        # 待处理的事件：路径 -> 是否为目录（同一路径的多次事件合并）；移动事件按到达顺序保留
+        self._pending_paths: Dict[str, bool] = {}
+        self._pending_moves: List[Tuple[str, str, bool]] = []
+        self._first_pending_at: Optional[float] = None
+        self._event_lock = threading.Lock()
+        # 串行化事件处理与全量审计（同一目录的任务在线程池中本就串行，此锁保护直接调用reconcile的情况）
+        self._process_lock = threading.Lock()
 
-        self.check_snapshot()
+        if scanner is None:
+            from services.file_manager import FileScanner
+            scanner = FileScanner()
+        # 扫描、快照、对账与事件处理共用同一份忽略规则
+        self.ignore_rules = IgnoreRules(aim_path)
+        # 安全审计保存的目录快照（基准快照+增量链），用于判断两次审计之间目录是否变化
+        self.snapshot_manager = scanner.snapshot_manager
+        # 本进程中上一次审计的对账是否没有差异
+        self._last_audit_clean = False
+        self.reconciler = IndexReconciler(indexer, scanner, ignore_rules=self.ignore_rules)
+        self._owns_worker_pool = worker_pool is None
+        self.worker_pool = worker_pool or SharedWorkerPool(max_workers=1)
+        # 新建与修改的文件按优先级排队，由入库服务的分发线程交给流水线并发处理
+        self._owns_ingestion = ingestion is None
+        self.ingestion = ingestion or IngestionService(indexer, parser, vector_store)
+        self.ingestion.register(self.aim_path, self._ingest_file, weight)
+        self.scheduler = self.ingestion.scheduler
+        self.pipeline = self.ingestion.pipeline
+        # 已记录到变化日志、尚未分发的文件：路径 -> 日志序号
+        self._journal_seqs: Dict[str, int] = {}
+
+        # 启动对账在线程池中执行，多个目录的对账可以并行；之后到达的事件在同一分组中排在对账之后
+        self.startup: futures.Future = self.worker_pool.submit(self.aim_path, self._startup)
+
+    def _startup(self) -> ReconcileResult:
+        try:
+            self._replay_journal()
+            return self.reconcile()
+        finally:
+            self._schedule_audit()
+
+    def _replay_journal(self):
+        """
+        重新排队变化日志中上次运行未完成的文件（按原优先级），在全量对账之前恢复
+
+        日志只含已检测到的变化；停止期间发生的变化仍由之后的全量对账发现，内容未变的文件按指纹跳过
+        """
+        try:
+            pending = self.indexer.get_pending_changes(self.aim_path)
+        except Exception as e:
+            self.logger.error(f"Journal Replay Failed: {self.aim_path}, {str(e)}", exc_info=True)
+            return
+        if not pending:
+            return
+        self.logger.info(f"恢复变化日志中未完成的文件: {len(pending)}个")
+        for seq, file_path, priority in pending:
+            self._journal_seqs[file_path] = seq
+            self.scheduler.submit(file_path, TaskPriority(priority), key=self.aim_path)
+
+    def reconcile(self) -> ReconcileResult:
+        """
+        全量对账：以索引中记录的文件状态为基准与文件系统比较并应用差异，不依赖快照文件
+
+        启动时与周期审计时执行；对账期间发生的变化会通过事件再次处理（修改按指纹去重）。
+        新建与修改的文件作为补录任务排队后即返回，不等待入库完成
+        """
+        with self._process_lock:
+            return self._reconcile()
+
+    def _reconcile(self) -> ReconcileResult:
+        self.logger.info(f"开始对账: {self.aim_path}")
+        result = self.reconciler.reconcile(self.aim_path, progress_callback=self._log_reconcile_progress)
+        self.logger.info(f"对账完成: 扫描{result.scanned}个文件，耗时{result.seconds:.1f}s，"
+                         f"新增{len(result.created)}，修改{len(result.modified)}，"
+                         f"移动{len(result.moved)}，删除{len(result.deleted)}")
+        if result.changed:
+            self._handle_moved_files(result.moved)
+            self._handle_deleted_files(result.deleted)
+            self._schedule_files(result.created + result.modified)
+        return result
+
+    def _log_reconcile_progress(self, phase: str, done: int, total: Optional[int]):
+        if total is None:
+            if done // self.RECONCILE_PROGRESS_INTERVAL != (done - 1) // self.RECONCILE_PROGRESS_INTERVAL:
+                self.logger.info(f"对账进度[{phase}]: {done}")
+        elif done == total or done % self.RECONCILE_PROGRESS_INTERVAL == 0:
+            self.logger.info(f"对账进度[{phase}]: {done}/{total}")
 
     def on_any_event(self, event):
-        if self._should_ignore_file(event.src_path):
-            self.logger.debug(f"忽略文件: {event.src_path}")
+        if event.event_type not in self.HANDLED_EVENT_TYPES:
             return
+        if os.path.basename(event.src_path) in IgnoreRules.IGNORE_FILE_NAMES:
+            # 忽略文件变化后重新加载该目录的规则
+            self.ignore_rules.load_directory(os.path.dirname(event.src_path), force=True)
+
+        with self._event_lock:
+            if event.event_type == 'moved':
+                src_ignored = self._should_ignore_file(event.src_path, event.is_directory)
+                dest_ignored = self._should_ignore_file(event.dest_path, event.is_directory)
+                if not src_ignored and not dest_ignored:
+                    self._pending_moves.append((event.src_path, event.dest_path, event.is_directory))
+                # 原子保存等从忽略文件改名而来的情况，按目标路径的新建/删除处理
+                if not dest_ignored:
+                    self._pending_paths[event.dest_path] = event.is_directory
+                elif not src_ignored:
+                    self._pending_paths[event.src_path] = event.is_directory
+            elif self._should_ignore_file(event.src_path, event.is_directory):
+                self.logger.debug(f"忽略文件: {event.src_path}")
+                return
+            elif event.is_directory and event.event_type in ('modified', 'closed'):
+                # 目录的修改事件由其中文件的事件体现
+                return
+            else:
+                self._pending_paths[event.src_path] = event.is_directory
+            self._schedule_flush()
 
+    def _schedule_flush(self):
+        """
+        (调用方持有_event_lock) 安排处理待处理事件
+
+        每个事件重新开始防抖计时，但从第一个未处理事件起不超过max_latency_seconds，持续写入时也不会一直推迟
+        """
+        now = time.monotonic()
+        if self._first_pending_at is None:
+            self._first_pending_at = now
+        delay = min(self.debounce_seconds, max(0.0, self._first_pending_at + self.max_latency_seconds - now))
         if self.timer:
             self.timer.cancel()
+        if not self._closed:
+            self.timer = self.worker_pool.call_later(delay, self.aim_path, self.process_pending_events)
+
+    def process_pending_events(self):
+        """只重新stat事件涉及的路径及其父目录，并把差异应用到索引"""
+        with self._event_lock:
+            paths, moves = self._pending_paths, self._pending_moves
+            self._pending_paths, self._pending_moves = {}, []
+            self._first_pending_at = None
+            self.timer = None
+        if not paths and not moves:
+            return
 
-        self.timer = threading.Timer(self.debounce_seconds, self.check_snapshot)
-        self.timer.start()
+        with self._process_lock:
+            self.logger.info("开始处理文件索引...")
+            moved_dirs = self._handle_moved_dirs([(src, dest) for src, dest, is_dir in moves if is_dir])
+            moved_files = [(src, dest) for src, dest, is_dir in moves if not is_dir]
+            # 源路径不在索引中的移动（如刚创建即改名）按目标路径新建处理，目标路径已在paths中
+            current_sources = [self._translate_path(FileInfo.normalize_path(src), moved_dirs)
+                               for src, _ in moved_files]
+            indexed_sources = self.indexer.get_file_states_by_paths(current_sources)
+            self._handle_moved_files([move for move, source in zip(moved_files, current_sources)
+                                      if source in indexed_sources], moved_dirs)
 
-    def check_snapshot(self):
-        new_snapshot = DirectorySnapshot(self.aim_path)
-        diff = DirectorySnapshotDiff(self.snapshot, new_snapshot)
+            changed, deleted, backfill = self._restat_paths(paths, {dest for _, dest in moved_dirs})
+            self._handle_deleted_files(deleted)
+            self._schedule_files(changed, TaskPriority.INTERACTIVE)
+            self._schedule_files(backfill)
+            self.logger.info("文件索引处理完毕！")
 
-        changed = diff.files_created or diff.files_modified or diff.files_moved or diff.files_deleted
-        if not changed:
-            self.logger.debug("快照一致，无文件变化")
-            return
+    def _restat_paths(self, paths: Dict[str, bool],
+                      moved_dirs=frozenset()) -> Tuple[List[str], List[str], List[str]]:
+        """
+        比较路径的当前状态与索引记录
 
-        self.logger.info("开始处理文件索引...")
-        # 处理文件变化
-        self._handle_created_files(diff.files_created)
-        self._handle_modified_files(diff.files_modified)
-        self._handle_moved_files(diff.files_moved)
-        self._handle_deleted_files(diff.files_deleted)
-        self.logger.info("文件索引处理完毕！")
+        Args:
+            paths: 路径 -> 是否为目录
+            moved_dirs: 已通过目录移动更新过索引的目标目录，不再对账
 
-        self.snapshot = new_snapshot
-        snapshot_path = self.snapshot_manager.save_snapshot(self.aim_path, new_snapshot)
-        if snapshot_path:
-            self.logger.info(f"已保存快照: {snapshot_path}")
+        Returns:
+            Tuple[List[str], List[str], List[str]] - (事件涉及的新建或修改, 删除, 补录) 的文件路径，
+            补录为新出现的目录子树与父目录中未被索引的文件
+        """
+        paths = {FileInfo.normalize_path(path): is_directory for path, is_directory in paths.items()}
+        states = self.indexer.get_file_states_by_paths(list(paths))
+        changed, deleted, backfill = [], [], []
+        parents = set()
+        for path, is_directory in paths.items():
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                # 路径已不存在：删除该文件，或（目录被删除时）删除其下所有已索引的文件
+                if path in states:
+                    deleted.append(path)
+                deleted.extend(self.indexer.get_file_states(path.rstrip(os.sep) + os.sep))
+                continue
+            if stat.S_ISDIR(stat_result.st_mode):
+                # 新出现的目录（新建、复制或从监控范围外移入）：只对该子树对账
+                if path not in moved_dirs and not self._should_ignore_file(path, True):
+                    result = self.reconciler.reconcile(path)
+                    backfill.extend(result.created)
+                    backfill.extend(result.modified)
+                    deleted.extend(result.deleted)
+                continue
+            parents.add(os.path.dirname(path))
+            state = states.get(path)
+            if state is None or state[0] != stat_result.st_size or \
+                    state[1] != datetime.fromtimestamp(stat_result.st_mtime).isoformat():
+                changed.append(path)
 
-        self.timer = None
+        # 父目录中未被索引的文件（事件丢失或被合并时）一并补上
+        seen = set(changed)
+        for parent in parents:
+            if self.ignore_rules.relative(parent) is None or self._should_ignore_file(parent, True):
+                continue
+            try:
+                entries = self.ignore_rules.scandir(parent)
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.path not in seen and entry.is_file() and self.indexer.get_id_by_path(entry.path) is None:
+                    backfill.append(entry.path)
+                    seen.add(entry.path)
+        return changed, deleted, backfill
+
+    def audit(self):
+        """
+        周期性安全审计：建立目录的紧凑快照并与上次审计保存的快照比较
+
+        上次审计的对账没有差异且目录此后未变化时，索引必然与目录一致，跳过对账；
+        否则全量对账，补上事件遗漏的变化。快照在对账之前建立，对账期间的变化留给下一次审计比较
+        """
+        try:
+            snapshot = CompactSnapshot.scan(self.aim_path, listdir=self.ignore_rules.scandir)
+            with self._process_lock:
+                if self._last_audit_clean and not self._changed_since_last_audit(snapshot):
+                    self.logger.info(f"审计：目录自上次审计以来未变化，跳过对账: {self.aim_path}")
+                else:
+                    self._last_audit_clean = not self._reconcile().changed
+                snapshot_path = self.snapshot_manager.save_snapshot(self.aim_path, snapshot, force=True)
+            if snapshot_path:
+                self.logger.info(f"已保存快照: {snapshot_path}")
+        except Exception as e:
+            self.logger.error(f"Audit Failed: {self.aim_path}, {str(e)}", exc_info=True)
+        finally:
+            self._schedule_audit()
+
+    def _changed_since_last_audit(self, snapshot: CompactSnapshot) -> bool:
+        previous = self.snapshot_manager.load_latest_snapshot(self.aim_path)
+        if previous is None:
+            return True
+        with previous:
+            return (snapshot - previous).changed
+
+    def _schedule_audit(self):
+        if not self.audit_interval_seconds or self._closed:
+            return
+        self.audit_timer = self.worker_pool.call_later(self.audit_interval_seconds, self.aim_path, self.audit)
 
-    def _handle_created_files(self, created_files):
-        """处理新创建的文件"""
-        for file_path in created_files:
+    def _backfill_priority(self, file_path: str) -> TaskPriority:
+        """补录任务的优先级：较小或最近修改过的文件优先，其余大文件与陈旧文件最后处理"""
+        try:
+            stat_result = os.stat(file_path)
+        except OSError:
+            return TaskPriority.BULK
+        if stat_result.st_size <= self.SMALL_FILE_BYTES or \
+                time.time() - stat_result.st_mtime <= self.RECENT_FILE_SECONDS:
+            return TaskPriority.RECENT
+        return TaskPriority.BULK
+
+    def _schedule_files(self, file_paths, priority: Optional[TaskPriority] = None):
+        """
+        将新建或修改的文件加入入库队列
+
+        Args:
+            file_paths: 文件路径
+            priority: 优先级，None表示按补录规则根据大小与修改时间确定
+        """
+        changes = []
+        for file_path in file_paths:
             if self._should_ignore_file(file_path):
                 continue
+            file_path = FileInfo.normalize_path(file_path)
+            changes.append((file_path, priority if priority is not None else self._backfill_priority(file_path)))
+        # 先写入变化日志再排队，进程中断后重启时只需重做日志中未确认的文件
+        try:
+            self._journal_seqs.update(self.indexer.record_changes(self.aim_path, changes))
+        except Exception as e:
+            self.logger.error(f"Journal Failed: {self.aim_path}, {str(e)}", exc_info=True)
+        for file_path, file_priority in changes:
             try:
-                file_path = FileInfo.normalize_path(file_path)
-                file_info = FileInfo(path=file_path)
-                self.process_file(file_info)
-                self.logger.info(f"Created: {file_path}")
+                self.scheduler.submit(file_path, file_priority, key=self.aim_path)
             except Exception as e:
-                self.logger.error(f"Created Failed: {file_path}, {str(e)}", exc_info=True)
+                self.logger.error(f"Schedule Failed: {file_path}, {str(e)}", exc_info=True)
 
-    def _handle_modified_files(self, modified_files):
-        """处理修改的文件"""
-        for file_path in modified_files:
-            if self._should_ignore_file(file_path):
+    def _acknowledge_journal(self, file_path: str):
+        """确认变化日志中该文件尚未分发的记录（文件已删除或无需入库）"""
+        seq = self._journal_seqs.pop(file_path, None)
+        if seq is not None:
+            try:
+                self.indexer.acknowledge_changes([seq])
+            except Exception as e:
+                self.logger.error(f"Journal Failed: {file_path}, {str(e)}", exc_info=True)
+
+    def _ingest_file(self, file_path: str) -> bool:
+        """
+        提交一个新建或修改的文件，出队时才读取文件与索引的状态
+
+        Returns:
+            bool - 是否已交给流水线（结束时由_on_ingest_complete通知调度器）
+        """
+        try:
+            file_info = FileInfo(path=file_path)
+        except FileNotFoundError:
+            # 排队期间已被删除或移走，由对应的事件处理
+            self.logger.debug(f"文件已不存在: {file_path}")
+            self._acknowledge_journal(file_path)
+            return False
+        # 精确匹配路径：前缀匹配会把 a.txt.bak 之类的同前缀文件一并返回
+        indexed = self.indexer.search_by_path(file_path, recursive=False)
+        # 修改的文件在新版本提交索引后才删除旧向量，处理失败时旧版本保持可用
+        self.pipeline.submit(file_info, replaced=indexed[0] if indexed else None,
+                             journal_seq=self._journal_seqs.pop(file_path, None))
+        self.logger.info(f"{'Modified' if indexed else 'Created'}: {file_path}")
+        return True
+
+    def wait_until_idle(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待启动对账、待处理的事件以及本目录排队与处理中的文件全部完成
+
+        Returns:
+            bool - 是否在超时前完成
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def remaining() -> Optional[float]:
+            return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+        while True:
+            with self._event_lock:
+                flush = self.timer
+            if flush is not None and not flush.cancelled:
+                # 防抖计时未到期，等到期后由线程池执行
+                delay = flush.due - time.monotonic()
+                if deadline is not None and delay > remaining():
+                    return False
+                time.sleep(max(0.0, delay))
+            if not self.worker_pool.join(self.aim_path, remaining()):
+                return False
+            with self._event_lock:
+                if self.timer is None and not self._pending_paths and not self._pending_moves:
+                    break
+        return self.scheduler.join(remaining(), key=self.aim_path)
+
+    def get_indexing_stats(self) -> Dict[str, Any]:
+        """
+        入库队列的状态，用于观察补录期间编辑的新鲜度
+
+        Returns:
+            Dict[str, Any] - queues为本目录各优先级的深度与等待时间（见IndexScheduler.stats），
+            active为本目录已分发未完成的文件数，in_flight为共用流水线中（所有目录）的文件数
+        """
+        return {
+            'queues': self.scheduler.stats(key=self.aim_path),
+            'active': self.scheduler.active_count(key=self.aim_path),
+            'in_flight': self.pipeline.in_flight,
+        }
+
+    @staticmethod
+    def _translate_path(path: str, moved_dirs: List[Tuple[str, str]]) -> str:
+        """将路径按已应用的目录移动换算为当前索引中的路径"""
+        for src_dir, dest_dir in moved_dirs:
+            if path == src_dir or path.startswith(src_dir + os.sep):
+                path = dest_dir + path[len(src_dir):]
+        return path
+
+    def _handle_moved_dirs(self, moved_dirs) -> List[Tuple[str, str]]:
+        """
+        处理移动的目录：每个目录子树通过一次集合更新改写索引，而非逐个文件更新
+
+        Returns:
+            List[Tuple[str, str]] - 已应用的 (原目录, 新目录) 列表，按应用顺序排列
+        """
+        applied = []
+        # 按原路径排序，保证父目录先于其子目录处理
+        for src_path, dest_path in sorted(moved_dirs):
+            if self._should_ignore_file(src_path, True) or self._should_ignore_file(dest_path, True):
+                continue
+            src_path = FileInfo.normalize_path(src_path)
+            dest_path = FileInfo.normalize_path(dest_path)
+            # 子目录随父目录一起移动时已被覆盖
+            current_path = self._translate_path(src_path, applied)
+            if current_path == dest_path:
                 continue
             try:
-                file_path = FileInfo.normalize_path(file_path)
-                file_info = self.indexer.search_by_path(file_path)
-                if len(file_info) > 1:
-                    self.logger.error(f"文件索引异常：{file_path}, 建议重置索引！")
-                elif len(file_info) == 1:
-                    self.delete_file(file_info[0])
-                    self.process_file(file_info[0])
-                    self.logger.info(f"Modified: {file_path}")
+                count = self.indexer.move_directory(current_path, dest_path)
+                applied.append((current_path, dest_path))
+                self.logger.info(f"Moved directory: {src_path} to {dest_path} ({count} entries)")
             except Exception as e:
-                self.logger.error(f"Modified Failed: {file_path}, {str(e)}", exc_info=True)
+                self.logger.error(f"Moved Failed: {src_path} to {dest_path}, {str(e)}", exc_info=True)
+        return applied
 
-    def _handle_moved_files(self, moved_files):
-        """处理移动的文件"""
+    def _handle_moved_files(self, moved_files, moved_dirs: Optional[List[Tuple[str, str]]] = None):
+        """处理移动的文件，已随目录移动完成更新的文件会被跳过"""
+        moved_dirs = moved_dirs or []
         for src_path, dest_path in moved_files:
             if self._should_ignore_file(src_path) or self._should_ignore_file(dest_path):
                 continue
             try:
                 src_path = FileInfo.normalize_path(src_path)
                 dest_path = FileInfo.normalize_path(dest_path)
-                file_id = self.indexer.get_id_by_path(src_path)
+                current_path = self._translate_path(src_path, moved_dirs)
+                if current_path == dest_path:
+                    continue
+                file_id = self.indexer.get_id_by_path(current_path)
                 self.indexer.update_file_path(file_id, dest_path)
                 self.logger.info(f"Moved: {src_path} to {dest_path}")
             except Exception as e:
@@ -146,20 +482,18 @@ class FileScannerHandler(FileSystemEventHandler):
                 continue
             try:
                 file_path = FileInfo.normalize_path(file_path)
-                file_info = self.indexer.search_by_path(file_path)
-                if len(file_info) > 1:
-                    self.logger.error(f"文件索引异常：{file_path}，建议重置索引！")
-                elif len(file_info) == 1:
+                self.scheduler.discard(file_path)
+                self._acknowledge_journal(file_path)
+                file_info = self.indexer.search_by_path(file_path, recursive=False)
+                if file_info:
                     self.delete_file(file_info[0])
                     self.logger.info(f"Deleted: {file_path}")
             except Exception as e:
                 self.logger.error(f"Deleted Failed: {file_path}, {str(e)}", exc_info=True)
 
-    def _should_ignore_file(self, file_path: str) -> bool:
+    def _should_ignore_file(self, file_path: str, is_directory: bool = False) -> bool:
         """检查文件是否应该被忽略"""
-        import re
-        file_name = os.path.basename(file_path)
-        return any(re.match(pattern, file_name) for pattern in self.IGNORED_PATTERNS)
+        return self.ignore_rules.is_ignored(file_path, is_directory)
 
     def process_file(self, file_info: FileInfo):
         """
@@ -168,6 +502,8 @@ class FileScannerHandler(FileSystemEventHandler):
         Args:
             file_info: 文件信息对象
         """
+        if file_info.fingerprint is None and not file_info.is_directory:
+            file_info.fingerprint = FileInfo.compute_fingerprint(file_info.path)
         documents = self.parser.parse_file_with_info(file_info)
         # print("文件解析完毕，解析结果如下：")
         # for document in documents:
@@ -191,7 +527,30 @@ class FileScannerHandler(FileSystemEventHandler):
             self.logger.info(f"Deleted vectors for: {file_info.path}")
         self.indexer.delete_index(file_info.id)
 
+    def close(self, drain: bool = True):
+        """
+        停止定时任务，从共用的线程池与入库服务中注销本目录
+
+        Args:
+            drain: 是否等待本目录已排队与已提交的文件处理完毕
+        """
+        self._closed = True
+        self._dispose_error()
+        self.worker_pool.discard(self.aim_path)
+        # 等待正在执行的启动对账或事件处理结束
+        futures.wait([self.startup])
+        with self._process_lock:
+            pass
+        self.ingestion.unregister(self.aim_path, drain=drain)
+        if self._owns_ingestion:
+            self.ingestion.close(drain=drain)
+        if self._owns_worker_pool:
+            self.worker_pool.close()
+
     def _dispose_error(self):
         if self.timer:
             self.timer.cancel()
-        self.timer = None
\ No newline at end of file
+        self.timer = None
+        if self.audit_timer:
+            self.audit_timer.cancel()
+        self.audit_timer = None
\ No newline at end of file
@@ -0,0 +1,254 @@
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+class IgnoreRules:
+    """
+    gitignore风格的忽略规则，扫描、快照与事件处理共用同一份规则
+
+    支持的语法：注释与空行、`!`取反、结尾`/`仅匹配目录、含`/`的模式相对所在目录锚定、
+    `*` `?` `[...]` 通配以及 `**`。各目录下的 .gitignore 与 .ezyignore 只作用于该目录之下，
+    越深的目录优先级越高，同一文件中靠后的规则优先。每个目录的规则各自编译为一个正则，
+    加载新的忽略文件不会重新编译其他目录的规则；被忽略的目录整体剪枝
+    """
+
+    # 编译后的规则：(文件正则, 目录正则, 各分支是否取反)
+    CompiledRules = Tuple['re.Pattern', 're.Pattern', List[bool]]
+
+    IGNORE_FILE_NAMES = ('.gitignore', '.ezyignore')
+
+    # 内置规则，优先级最低，可被忽略文件中的 `!` 规则重新包含
+    DEFAULT_PATTERNS = (
+        '~$*',  # Word临时文件
+        '*.tmp',  # 临时文件
+        '*.temp',
+        '.*',  # 隐藏文件与目录（含.git）
+        '*~',  # 备份文件
+        '*.swp',  # vim临时文件
+        'node_modules/',
+        '__pycache__/',
+    )
+
+    # 不区分大小写的文件系统（Windows）上规则匹配同样不区分大小写
+    REGEX_FLAGS = re.IGNORECASE if os.name == 'nt' else 0
+
+    # 目录判定结果缓存的条目上限
+    DIR_CACHE_SIZE = 65536
+
+    def __init__(self, root: str, load_root_files: bool = True):
+        """
+        初始化忽略规则
+
+        Args:
+            root: 规则作用的根目录
+            load_root_files: 是否立即读取根目录下的忽略文件；子目录的忽略文件在遍历时按需加载
+        """
+        self.root = os.path.normpath(os.path.abspath(root))
+        # 路径比较使用系统的大小写规则：Windows下扫描与事件路径经FileInfo.normalize_path转为小写
+        self._root_key = os.path.normcase(self.root).rstrip(os.sep)
+        self._lock = threading.Lock()
+        self._default_rules = self._compile_rules([self._compile_line(line, '') for line in self.DEFAULT_PATTERNS])
+        # 规则所在目录（相对root，'/'分隔）-> 该目录忽略文件编译后的规则
+        self._rules: Dict[str, 'IgnoreRules.CompiledRules'] = {}
+        self._dir_cache: Dict[str, bool] = {}
+        if load_root_files:
+            self.load_directory(self.root)
+
+    @staticmethod
+    def _translate_glob(pattern: str) -> str:
+        """将通配模式转换为正则，`/` 不会被 `*` `?` 匹配"""
+        regex, i, n = [], 0, len(pattern)
+        while i < n:
+            char = pattern[i]
+            if char == '*':
+                if pattern.startswith('**', i):
+                    at_start = i == 0 or pattern[i - 1] == '/'
+                    if at_start and pattern.startswith('**/', i):
+                        regex.append('(?:.*/)?')
+                        i += 3
+                        continue
+                    if at_start and i + 2 == n:
+                        regex.append('.*')
+                        i += 2
+                        continue
+                regex.append('[^/]*')
+            elif char == '?':
+                regex.append('[^/]')
+            elif char == '[':
+                end = pattern.find(']', i + 2)
+                if end == -1:
+                    regex.append(re.escape(char))
+                else:
+                    content = pattern[i + 1:end]
+                    if content[0] in '!^':
+                        content = '^' + content[1:]
+                    regex.append('[' + content.replace('\\', '\\\\') + ']')
+                    i = end
+            elif char == '\\' and i + 1 < n:
+                i += 1
+                regex.append(re.escape(pattern[i]))
+            else:
+                regex.append(re.escape(char))
+            i += 1
+        return ''.join(regex)
+
+    @classmethod
+    def _compile_line(cls, line: str, base: str) -> Optional[Tuple[str, bool, bool]]:
+        """
+        将忽略文件中的一行转换为 (正则, 是否取反, 是否仅匹配目录)，注释与空行返回None
+
+        Args:
+            line: 规则文本
+            base: 忽略文件所在目录（相对root，'/'分隔，根目录为''）
+        """
+        line = line.rstrip('\n').rstrip('\r')
+        if not line.endswith('\\ '):
+            line = line.rstrip(' ')
+        if not line or line.startswith('#'):
+            return None
+        negate = line.startswith('!')
+        if negate:
+            line = line[1:]
+        elif line.startswith('\\'):
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            return None
+        # 含有（非结尾的）'/' 的模式相对忽略文件所在目录锚定，否则匹配任意层级
+        anchored = '/' in line
+        regex = cls._translate_glob(line.lstrip('/'))
+        prefix = re.escape(base + '/') if base else ''
+        if not anchored:
+            prefix += '(?:.*/)?'
+        return prefix + regex, negate, dir_only
+
+    def _compile_rules(self, rules: List[Tuple[str, bool, bool]]) -> 'IgnoreRules.CompiledRules':
+        """
+        将一个忽略文件的规则编译为文件与目录两个正则
+
+        按优先级从高到低（文件中从后往前）排列为命名分组的分支，第一个匹配的分支即该文件中生效的规则
+        """
+        negations = [negate for _, negate, _ in rules]
+
+        def build(include_dir_only: bool):
+            branches = [f'(?P<r{index}>{regex})' for index, (regex, _, dir_only) in enumerate(rules)
+                        if include_dir_only or not dir_only]
+            return re.compile('|'.join(reversed(branches)) or '(?!)', self.REGEX_FLAGS)
+
+        return build(False), build(True), negations
+
+    def load_directory(self, dir_path: str, force: bool = False) -> bool:
+        """
+        读取目录下的忽略文件并编译该目录的规则
+
+        Args:
+            dir_path: 目录路径
+            force: 已加载过时是否重新读取（忽略文件被修改时使用）
+        Returns:
+            bool - 规则是否有变化
+        """
+        base = self.relative(dir_path)
+        if base is None:
+            return False
+        with self._lock:
+            if base in self._rules and not force:
+                return False
+            rules = []
+            for file_name in self.IGNORE_FILE_NAMES:
+                try:
+                    with open(os.path.join(dir_path, file_name), encoding='utf-8', errors='replace') as f:
+                        rules.extend(self._compile_line(line, base) for line in f)
+                except OSError:
+                    continue
+            rules = [rule for rule in rules if rule]
+            if not rules and base not in self._rules:
+                return False
+            self._rules[base] = self._compile_rules(rules)
+            self._dir_cache = {}
+            return True
+
+    def relative(self, path: str) -> Optional[str]:
+        """返回相对root的'/'分隔路径，root本身为''，不在root之下返回None"""
+        path = os.path.normpath(path)
+        path_key = os.path.normcase(path)
+        if path_key.rstrip(os.sep) == self._root_key:
+            return ''
+        if not path_key.startswith(self._root_key + os.sep):
+            return None
+        relative = path[len(self._root_key) + 1:]
+        return relative.replace(os.sep, '/') if os.sep != '/' else relative
+
+    @staticmethod
+    def _match_rules(compiled: 'IgnoreRules.CompiledRules', relative: str, is_directory: bool) -> Optional[bool]:
+        """按一组规则判断，没有规则命中时返回None"""
+        file_regex, dir_regex, negations = compiled
+        matched = (dir_regex if is_directory else file_regex).fullmatch(relative)
+        if matched is None:
+            return None
+        return not negations[int(matched.lastgroup[1:])]
+
+    def match(self, relative: str, is_directory: bool) -> bool:
+        """只判断路径本身是否命中规则，不检查上级目录"""
+        # 只有上级目录中的忽略文件作用于该路径，由深到浅依次判断，第一个命中的文件决定结果
+        parts = relative.split('/')
+        for depth in range(len(parts) - 1, -1, -1):
+            compiled = self._rules.get('/'.join(parts[:depth]))
+            if compiled is not None:
+                ignored = self._match_rules(compiled, relative, is_directory)
+                if ignored is not None:
+                    return ignored
+        return bool(self._match_rules(self._default_rules, relative, is_directory))
+
+    def _dir_ignored(self, relative: str) -> bool:
+        """目录本身或其任一上级目录被忽略"""
+        ignored = self._dir_cache.get(relative)
+        if ignored is None:
+            parent = relative.rpartition('/')[0]
+            ignored = (bool(parent) and self._dir_ignored(parent)) or self.match(relative, True)
+            if len(self._dir_cache) >= self.DIR_CACHE_SIZE:
+                self._dir_cache = {}
+            self._dir_cache[relative] = ignored
+        return ignored
+
+    def is_ignored(self, path: str, is_directory: bool = False) -> bool:
+        """
+        判断路径是否被忽略，位于被忽略目录之下的路径同样视为忽略
+
+        Args:
+            path: 绝对路径
+            is_directory: 路径是否为目录
+        """
+        relative = self.relative(path)
+        if not relative:
+            return False
+        parent = relative.rpartition('/')[0]
+        if parent and self._dir_ignored(parent):
+            return True
+        return self._dir_ignored(relative) if is_directory else self.match(relative, False)
+
+    def scandir(self, dir_path: str) -> List[os.DirEntry]:
+        """
+        列出目录下未被忽略的条目，目录中的忽略文件会先被加载
+
+        调用方应保证dir_path本身未被忽略（自顶向下遍历时由上一层保证）
+        """
+        with os.scandir(dir_path) as iterator:
+            entries = list(iterator)
+        if any(entry.name in self.IGNORE_FILE_NAMES for entry in entries):
+            self.load_directory(dir_path)
+        base = self.relative(dir_path)
+        if base is None:
+            return entries
+        prefix = base + '/' if base else ''
+        unignored = []
+        for entry in entries:
+            try:
+                is_directory = entry.is_dir() and not entry.is_symlink()
+            except OSError:
+                is_directory = False
+            if not self.match(prefix + entry.name, is_directory):
+                unignored.append(entry)
+        return unignored
@@ -0,0 +1,125 @@
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from services.file_manager.file_info import FileInfo
+from services.file_manager.ignore_rules import IgnoreRules
+
+if TYPE_CHECKING:
+    from services.file_manager import FileIndexer, FileScanner
+
+
+@dataclass
+class ReconcileResult:
+    """文件系统与索引的差异"""
+    created: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    # (原路径, 新路径)
+    moved: List[Tuple[str, str]] = field(default_factory=list)
+    scanned: int = 0
+    seconds: float = 0.0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.created or self.modified or self.deleted or self.moved)
+
+
+class IndexReconciler:
+    """
+    以FileIndexer中记录的 (size, modified_at, fingerprint) 为基准，与文件系统的当前状态对账
+
+    只对文件做一次stat，不依赖快照文件；目录树遍历与指纹计算使用FileScanner共用的线程池。
+    大小或修改时间不同的文件视为修改（内容是否真的变化由修改处理流程按指纹判断），
+    新增与消失的文件中大小相同且指纹一致的配对视为移动
+    """
+
+    def __init__(self, indexer: 'FileIndexer', scanner: 'FileScanner',
+                 ignore_rules: Optional[IgnoreRules] = None, max_workers: Optional[int] = None):
+        """
+        初始化对账器
+
+        Args:
+            indexer: 文件索引
+            scanner: 文件扫描器，用于并行遍历目录树
+            ignore_rules: 忽略规则，遍历时剪枝被忽略的目录；被忽略的已索引文件不会被判定为删除
+            max_workers: 遍历时同时在途的目录数按此计算（在途上限为其两倍）
+        """
+        self.indexer = indexer
+        self.scanner = scanner
+        self.ignore_rules = ignore_rules
+        self.max_workers = max_workers or scanner.DEFAULT_SCAN_WORKERS
+
+    def reconcile(self, aim_path: str,
+                  progress_callback: Optional[Callable[[str, int, Optional[int]], None]] = None) -> ReconcileResult:
+        """
+        对账指定目录
+
+        Args:
+            aim_path: 目录路径
+            progress_callback: 进度回调 (阶段, 已完成数, 总数)，阶段为 'scan' 或 'fingerprint'，
+                               scan阶段总数未知，为None
+        Returns:
+            ReconcileResult - 需要应用到索引的差异
+        """
+        start_time = time.perf_counter()
+        aim_path = FileInfo.normalize_path(aim_path)
+        ignore_rules = self.ignore_rules or IgnoreRules(aim_path)
+        indexed = self.indexer.get_file_states(aim_path.rstrip(os.sep) + os.sep)
+        result = ReconcileResult()
+
+        # 新增的文件按大小分组，供移动检测使用
+        created_sizes: Dict[str, int] = {}
+        for batch in self.scanner.iter_scan_batches(aim_path, max_workers=self.max_workers,
+                                                    ignore_rules=ignore_rules, executor=self.scanner.scan_executor):
+            for file_info in batch:
+                state = indexed.pop(file_info.path, None)
+                if state is None:
+                    created_sizes[file_info.path] = file_info.size
+                elif state[0] != file_info.size or state[1] != file_info.modified_at.isoformat():
+                    result.modified.append(file_info.path)
+            result.scanned += len(batch)
+            if progress_callback:
+                progress_callback('scan', result.scanned, None)
+
+        # 剩余的索引条目在文件系统中已不存在
+        deleted = {path: state for path, state in indexed.items() if not ignore_rules.is_ignored(path)}
+        result.moved = self._detect_moves(created_sizes, deleted, progress_callback)
+        moved_sources = {src for src, _ in result.moved}
+        moved_targets = {dest for _, dest in result.moved}
+        result.created = sorted(path for path in created_sizes if path not in moved_targets)
+        result.deleted = sorted(path for path in deleted if path not in moved_sources)
+        result.modified.sort()
+        result.seconds = time.perf_counter() - start_time
+        return result
+
+    def _detect_moves(self, created_sizes: Dict[str, int], deleted: Dict[str, Tuple[int, str, Optional[str]]],
+                      progress_callback) -> List[Tuple[str, str]]:
+        """只对大小与某个已删除文件相同的新文件计算指纹，按 (大小, 指纹) 一一配对"""
+        sources: Dict[Tuple[int, str], List[str]] = {}
+        for path, (size, _, fingerprint) in deleted.items():
+            if fingerprint:
+                sources.setdefault((size, fingerprint), []).append(path)
+        if not sources:
+            return []
+        sizes = {size for size, _ in sources}
+        candidates = sorted(path for path, size in created_sizes.items() if size in sizes)
+
+        moved = []
+        fingerprints = self.scanner.scan_executor.map(self._safe_fingerprint, candidates)
+        for done, (path, fingerprint) in enumerate(zip(candidates, fingerprints), start=1):
+            paths = sources.get((created_sizes[path], fingerprint)) if fingerprint else None
+            if paths:
+                moved.append((paths.pop(), path))
+            if progress_callback:
+                progress_callback('fingerprint', done, len(candidates))
+        return moved
+
+    @staticmethod
+    def _safe_fingerprint(path: str) -> Optional[str]:
+        try:
+            return FileInfo.compute_fingerprint(path)
+        except OSError as e:
+            print(f"Error fingerprinting {path}: {str(e)}")
+            return None
@@ -0,0 +1,324 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, Deque, Dict, Hashable, List, Optional, Tuple
+
+
+class TaskPriority(IntEnum):
+    """索引任务的优先级，数值越小越优先"""
+    # 监控事件触发的修改（用户正在编辑的文件）
+    INTERACTIVE = 0
+    # 对账发现的最近修改或较小的文件
+    RECENT = 1
+    # 对账发现的大文件与陈旧文件的补录
+    BULK = 2
+
+
+@dataclass
+class ScheduledTask:
+    """一个待入库的路径"""
+    path: str
+    priority: TaskPriority
+    # 首次入队的时间（time.monotonic），重复提交与提升优先级时保留
+    enqueued_at: float
+    # 任务所属的分组（监控目录），同一优先级内各分组按权重轮转出队
+    key: Hashable = None
+
+
+class IndexScheduler:
+    """
+    入库任务的优先级调度器，位于FileScannerHandler与入库流水线之间
+
+    - 按优先级分类排队，高优先级非空时优先出队；同一优先级内各分组（监控目录）按权重平滑轮转，
+      同一分组内先进先出，一个繁忙的目录不会让其他目录一直等待
+    - 配额：每个分组同时处理中的任务数不超过max_active_per_key，达到配额的分组暂不出队
+    - 老化：低优先级队首等待超过aging_seconds后，每aged_share次出队中至少有一次分给等待最久的老化任务，
+      补录不会被持续的编辑饿死，编辑的等待也不会被补录拖长太多
+    - 去重：同一路径在队列中只保留一个任务，再次提交时只会提升其优先级；
+      正在处理中的路径再次提交时，待其完成（task_done）后再重新入队，避免同一文件的两个版本并发入库
+    """
+
+    # 每个分组每类保留最近多少次出队的等待时间用于统计
+    WAIT_WINDOW = 1000
+
+    def __init__(self, aging_seconds: float = 30.0, aged_share: int = 4,
+                 max_active_per_key: Optional[int] = None):
+        """
+        初始化调度器
+
+        Args:
+            aging_seconds: 任务等待超过该时间(秒)后视为老化
+            aged_share: 存在老化任务时，每aged_share次出队至少有一次分给老化任务
+            max_active_per_key: 每个分组同时处理中的任务数上限，None表示不限
+        """
+        self.aging_seconds = aging_seconds
+        self.aged_share = max(1, aged_share)
+        self.max_active_per_key = max_active_per_key
+        self._cond = threading.Condition()
+        # 优先级 -> 分组 -> 队列；分组的队列清空后即移除，内存只与排队的任务数有关
+        self._queues: Dict[TaskPriority, Dict[Hashable, Deque[ScheduledTask]]] = {
+            priority: {} for priority in TaskPriority}
+        # 路径 -> 队列中有效的任务；队列中不在此处的任务已被提升或丢弃，出队时跳过
+        self._pending: Dict[str, ScheduledTask] = {}
+        # 处理中的路径 -> 出队的任务；处理期间再次提交的任务暂存在_deferred中
+        self._active: Dict[str, ScheduledTask] = {}
+        self._deferred: Dict[str, ScheduledTask] = {}
+        self._depth: Dict[Tuple[Hashable, TaskPriority], int] = {}
+        self._active_count: Dict[Hashable, int] = {}
+        self._weights: Dict[Hashable, int] = {}
+        # 平滑加权轮转的当前权重
+        self._current_weights: Dict[Tuple[TaskPriority, Hashable], int] = {}
+        self._since_aged = 0
+        self._closed = False
+        self._waits: Dict[Tuple[Hashable, TaskPriority], Deque[float]] = {}
+        self._dispatched: Dict[Tuple[Hashable, TaskPriority], int] = {}
+        self._max_wait: Dict[Tuple[Hashable, TaskPriority], float] = {}
+
+    def set_weight(self, key: Hashable, weight: int):
+        """设置分组的权重，同一优先级内出队次数与权重成正比，默认为1"""
+        with self._cond:
+            self._weights[key] = max(1, int(weight))
+
+    def remove_key(self, key: Hashable):
+        """移除分组：丢弃其排队的任务与统计，处理中的任务不受影响"""
+        with self._cond:
+            for path in [path for path, task in self._pending.items() if task.key == key]:
+                self._remove_pending(path)
+            for path in [path for path, task in self._deferred.items() if task.key == key]:
+                del self._deferred[path]
+            self._weights.pop(key, None)
+            for priority in TaskPriority:
+                self._current_weights.pop((priority, key), None)
+                for stats in (self._waits, self._dispatched, self._max_wait):
+                    stats.pop((key, priority), None)
+            self._cond.notify_all()
+
+    def submit(self, path: str, priority: TaskPriority, key: Hashable = None) -> bool:
+        """
+        提交一个路径
+
+        Args:
+            path: 文件路径
+            priority: 优先级
+            key: 所属分组（监控目录）
+
+        Returns:
+            bool - 是否新增了任务，False表示与已有任务合并
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("IndexScheduler is closed")
+            if path in self._active:
+                deferred = self._deferred.get(path)
+                if deferred is None:
+                    self._deferred[path] = ScheduledTask(path, priority, time.monotonic(), key)
+                    return True
+                deferred.priority = min(deferred.priority, priority)
+                return False
+            task = self._pending.get(path)
+            if task is None:
+                self._enqueue(ScheduledTask(path, priority, time.monotonic(), key))
+                return True
+            if priority < task.priority:
+                # 提升优先级：旧条目留在原队列中作废，等待时间从首次入队算起
+                self._remove_pending(path)
+                self._enqueue(ScheduledTask(path, priority, task.enqueued_at, task.key))
+            return False
+
+    def _enqueue(self, task: ScheduledTask):
+        self._pending[task.path] = task
+        self._queues[task.priority].setdefault(task.key, deque()).append(task)
+        depth_key = (task.key, task.priority)
+        self._depth[depth_key] = self._depth.get(depth_key, 0) + 1
+        self._cond.notify()
+
+    def _remove_pending(self, path: str) -> Optional[ScheduledTask]:
+        """(调用方持有锁) 将排队中的任务标记为作废，条目在出队时清理"""
+        task = self._pending.pop(path, None)
+        if task is not None:
+            depth_key = (task.key, task.priority)
+            self._depth[depth_key] -= 1
+            if not self._depth[depth_key]:
+                del self._depth[depth_key]
+        return task
+
+    def discard(self, path: str):
+        """丢弃路径尚未出队的任务（如文件已被删除）"""
+        with self._cond:
+            self._remove_pending(path)
+            self._deferred.pop(path, None)
+            self._cond.notify_all()
+
+    def _head(self, priority: TaskPriority, key: Hashable) -> Optional[ScheduledTask]:
+        """(调用方持有锁) 返回分组在该类中的队首有效任务，顺带清理作废的条目"""
+        queues = self._queues[priority]
+        queue = queues.get(key)
+        while queue and self._pending.get(queue[0].path) is not queue[0]:
+            queue.popleft()
+        if queue:
+            return queue[0]
+        queues.pop(key, None)
+        return None
+
+    def _eligible_heads(self, priority: TaskPriority) -> List[ScheduledTask]:
+        """(调用方持有锁) 该类中未达到配额的各分组的队首任务"""
+        heads = []
+        for key in list(self._queues[priority]):
+            head = self._head(priority, key)
+            if head is None:
+                continue
+            if self.max_active_per_key is not None and \
+                    self._active_count.get(key, 0) >= self.max_active_per_key:
+                continue
+            heads.append(head)
+        return heads
+
+    def _pick_weighted(self, priority: TaskPriority, heads: List[ScheduledTask]) -> ScheduledTask:
+        """(调用方持有锁) 平滑加权轮转：每次给各候选分组加上权重，选当前权重最大者并减去总权重"""
+        if len(heads) == 1:
+            return heads[0]
+        total = 0
+        best, best_weight = None, None
+        for head in heads:
+            weight = self._weights.get(head.key, 1)
+            total += weight
+            current = self._current_weights.get((priority, head.key), 0) + weight
+            self._current_weights[(priority, head.key)] = current
+            if best_weight is None or current > best_weight:
+                best, best_weight = head, current
+        self._current_weights[(priority, best.key)] -= total
+        return best
+
+    def _select(self) -> Optional[ScheduledTask]:
+        """(调用方持有锁) 按优先级、分组轮转与老化规则选出下一个任务"""
+        now = time.monotonic()
+        candidates = [(priority, heads) for priority, heads in
+                      ((priority, self._eligible_heads(priority)) for priority in TaskPriority) if heads]
+        if not candidates:
+            return None
+        aged = [task for _, heads in candidates[1:] for task in heads
+                if now - task.enqueued_at >= self.aging_seconds]
+        if aged and self._since_aged >= self.aged_share - 1:
+            self._since_aged = 0
+            return min(aged, key=lambda task: task.enqueued_at)
+        if aged:
+            self._since_aged += 1
+        return self._pick_weighted(*candidates[0])
+
+    def get(self, timeout: Optional[float] = None) -> Optional[ScheduledTask]:
+        """
+        取出下一个任务并标记为处理中，处理结束后必须调用task_done
+
+        队列为空（或各分组均达到配额）时阻塞；调度器关闭且队列已空或超时返回None
+        """
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                task = self._select()
+                if task is not None:
+                    break
+                if self._closed and not self._pending:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            self._queues[task.priority][task.key].popleft()
+            self._remove_pending(task.path)
+            self._active[task.path] = task
+            self._active_count[task.key] = self._active_count.get(task.key, 0) + 1
+            stats_key = (task.key, task.priority)
+            wait = time.monotonic() - task.enqueued_at
+            self._waits.setdefault(stats_key, deque(maxlen=self.WAIT_WINDOW)).append(wait)
+            self._dispatched[stats_key] = self._dispatched.get(stats_key, 0) + 1
+            self._max_wait[stats_key] = max(self._max_wait.get(stats_key, 0.0), wait)
+            return task
+
+    def task_done(self, path: str):
+        """标记路径处理结束，处理期间再次提交的任务此时重新入队"""
+        with self._cond:
+            task = self._active.pop(path, None)
+            if task is not None:
+                self._active_count[task.key] -= 1
+                if not self._active_count[task.key]:
+                    del self._active_count[task.key]
+            deferred = self._deferred.pop(path, None)
+            if deferred is not None and not self._closed:
+                self._enqueue(deferred)
+            self._cond.notify_all()
+
+    def join(self, timeout: Optional[float] = None, key: Hashable = ...) -> bool:
+        """
+        等待队列清空且没有处理中的任务，返回是否已清空
+
+        Args:
+            timeout: 超时(秒)
+            key: 只等待该分组，默认等待所有分组
+        """
+        def idle() -> bool:
+            if key is ...:
+                return not self._pending and not self._active and not self._deferred
+            return not any(task.key == key for tasks in (self._pending, self._active, self._deferred)
+                           for task in tasks.values())
+
+        with self._cond:
+            return self._cond.wait_for(idle, timeout)
+
+    def close(self, drain: bool = True):
+        """
+        关闭调度器，不再接受新任务
+
+        Args:
+            drain: True时get继续返回剩余任务直到队列为空，False时丢弃剩余任务
+        """
+        with self._cond:
+            self._closed = True
+            if not drain:
+                self._pending.clear()
+                self._deferred.clear()
+                self._depth.clear()
+                for priority in TaskPriority:
+                    self._queues[priority].clear()
+            self._cond.notify_all()
+
+    def stats(self, key: Hashable = ...) -> Dict[str, Dict[str, Any]]:
+        """
+        各优先级的队列深度与等待时间（入队到出队，秒）
+
+        Args:
+            key: 只统计该分组，默认统计所有分组
+        Returns:
+            Dict[str, Dict[str, Any]] - 优先级名称 -> {depth, oldest_wait, dispatched, avg_wait, p95_wait, max_wait}，
+            avg_wait与p95_wait按各分组最近WAIT_WINDOW次出队计算
+        """
+        def selected(stats_key: Tuple[Hashable, TaskPriority], priority: TaskPriority) -> bool:
+            return stats_key[1] == priority and (key is ... or stats_key[0] == key)
+
+        with self._cond:
+            now = time.monotonic()
+            stats = {}
+            for priority in TaskPriority:
+                keys = list(self._queues[priority]) if key is ... else [key]
+                heads = [head for head in (self._head(priority, k) for k in keys) if head is not None]
+                waits = sorted(wait for stats_key, window in self._waits.items() if selected(stats_key, priority)
+                               for wait in window)
+                stats[priority.name.lower()] = {
+                    'depth': sum(depth for stats_key, depth in self._depth.items() if selected(stats_key, priority)),
+                    'oldest_wait': max((now - head.enqueued_at for head in heads), default=0.0),
+                    'dispatched': sum(count for stats_key, count in self._dispatched.items()
+                                      if selected(stats_key, priority)),
+                    'avg_wait': sum(waits) / len(waits) if waits else 0.0,
+                    'p95_wait': waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+                    'max_wait': max((wait for stats_key, wait in self._max_wait.items()
+                                     if selected(stats_key, priority)), default=0.0),
+                }
+            return stats
+
+    def active_count(self, key: Hashable = ...) -> int:
+        """已出队、尚未task_done的任务数"""
+        with self._cond:
+            if key is ...:
+                return len(self._active)
+            return self._active_count.get(key, 0)
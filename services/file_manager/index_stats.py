@@ -0,0 +1,172 @@
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+
+
+# 文件大小直方图的分桶上界（字节），最后一个桶为超过最大上界的文件
+SIZE_BUCKET_BOUNDS = (1024, 64 * 1024, 1024 * 1024, 16 * 1024 * 1024, 256 * 1024 * 1024)
+SIZE_BUCKET_LABELS = ('<1KB', '1KB-64KB', '64KB-1MB', '1MB-16MB', '16MB-256MB', '>=256MB')
+
+
+def _size_bucket_sql(column: str) -> str:
+    """生成将文件大小映射到桶编号的CASE表达式"""
+    cases = ' '.join(f'WHEN {column} < {bound} THEN {index}' for index, bound in enumerate(SIZE_BUCKET_BOUNDS))
+    return f'(CASE {cases} ELSE {len(SIZE_BUCKET_BOUNDS)} END)'
+
+
+@dataclass
+class IndexStats:
+    """索引统计信息"""
+    total_files: int = 0
+    total_directories: int = 0
+    total_bytes: int = 0
+    mapping_count: int = 0
+    unique_documents: int = 0
+    # file_type -> {'count': 文件数, 'bytes': 总字节数}
+    by_file_type: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    # 分桶标签 -> 文件数
+    size_histogram: Dict[str, int] = field(default_factory=dict)
+
+
+class StatsTables:
+    """由触发器增量维护的统计表，读取统计为O(1)"""
+
+    COUNTER_KEYS = ('total_files', 'total_directories', 'total_bytes', 'mapping_count', 'unique_documents')
+
+    TRIGGERS = {
+        'stats_file_insert': f'''
+            CREATE TRIGGER IF NOT EXISTS stats_file_insert AFTER INSERT ON file_index BEGIN
+                UPDATE index_stats SET value = value + 1 WHERE key = 'total_files';
+                UPDATE index_stats SET value = value + new.is_directory WHERE key = 'total_directories';
+                UPDATE index_stats SET value = value + COALESCE(new.size, 0) WHERE key = 'total_bytes';
+                INSERT INTO file_type_stats (file_type, file_count, total_bytes)
+                VALUES (new.file_type, 1, COALESCE(new.size, 0))
+                ON CONFLICT(file_type) DO UPDATE SET
+                    file_count = file_count + 1, total_bytes = total_bytes + excluded.total_bytes;
+                INSERT INTO size_histogram (bucket, file_count)
+                VALUES ({_size_bucket_sql('COALESCE(new.size, 0)')}, 1)
+                ON CONFLICT(bucket) DO UPDATE SET file_count = file_count + 1;
+            END
+        ''',
+        'stats_file_delete': f'''
+            CREATE TRIGGER IF NOT EXISTS stats_file_delete AFTER DELETE ON file_index BEGIN
+                UPDATE index_stats SET value = value - 1 WHERE key = 'total_files';
+                UPDATE index_stats SET value = value - old.is_directory WHERE key = 'total_directories';
+                UPDATE index_stats SET value = value - COALESCE(old.size, 0) WHERE key = 'total_bytes';
+                UPDATE file_type_stats SET
+                    file_count = file_count - 1, total_bytes = total_bytes - COALESCE(old.size, 0)
+                WHERE file_type = old.file_type;
+                UPDATE size_histogram SET file_count = file_count - 1
+                WHERE bucket = {_size_bucket_sql('COALESCE(old.size, 0)')};
+            END
+        ''',
+        'stats_file_update': f'''
+            CREATE TRIGGER IF NOT EXISTS stats_file_update AFTER UPDATE OF size, file_type, is_directory
+            ON file_index BEGIN
+                UPDATE index_stats SET value = value - old.is_directory + new.is_directory
+                WHERE key = 'total_directories';
+                UPDATE index_stats SET value = value - COALESCE(old.size, 0) + COALESCE(new.size, 0)
+                WHERE key = 'total_bytes';
+                UPDATE file_type_stats SET
+                    file_count = file_count - 1, total_bytes = total_bytes - COALESCE(old.size, 0)
+                WHERE file_type = old.file_type;
+                INSERT INTO file_type_stats (file_type, file_count, total_bytes)
+                VALUES (new.file_type, 1, COALESCE(new.size, 0))
+                ON CONFLICT(file_type) DO UPDATE SET
+                    file_count = file_count + 1, total_bytes = total_bytes + excluded.total_bytes;
+                UPDATE size_histogram SET file_count = file_count - 1
+                WHERE bucket = {_size_bucket_sql('COALESCE(old.size, 0)')};
+                INSERT INTO size_histogram (bucket, file_count)
+                VALUES ({_size_bucket_sql('COALESCE(new.size, 0)')}, 1)
+                ON CONFLICT(bucket) DO UPDATE SET file_count = file_count + 1;
+            END
+        ''',
+        # 唯一文档数：插入时该document_id没有其他映射说明是新文档，删除后不再存在说明文档消失，均走主键索引
+        'stats_mapping_insert': '''
+            CREATE TRIGGER IF NOT EXISTS stats_mapping_insert AFTER INSERT ON doc_file_mapping BEGIN
+                UPDATE index_stats SET value = value + 1 WHERE key = 'mapping_count';
+                UPDATE index_stats SET value = value + 1 WHERE key = 'unique_documents'
+                    AND NOT EXISTS (SELECT 1 FROM doc_file_mapping
+                                    WHERE document_id = new.document_id AND file_id != new.file_id);
+            END
+        ''',
+        'stats_mapping_delete': '''
+            CREATE TRIGGER IF NOT EXISTS stats_mapping_delete AFTER DELETE ON doc_file_mapping BEGIN
+                UPDATE index_stats SET value = value - 1 WHERE key = 'mapping_count';
+                UPDATE index_stats SET value = value - 1 WHERE key = 'unique_documents'
+                    AND NOT EXISTS (SELECT 1 FROM doc_file_mapping WHERE document_id = old.document_id);
+            END
+        ''',
+    }
+
+    @classmethod
+    def create(cls, cursor: sqlite3.Cursor):
+        """创建统计表与触发器，并根据现有数据初始化"""
+        cursor.execute('CREATE TABLE IF NOT EXISTS index_stats (key TEXT PRIMARY KEY, value INTEGER)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS file_type_stats (
+                file_type TEXT PRIMARY KEY,
+                file_count INTEGER,
+                total_bytes INTEGER
+            )
+        ''')
+        cursor.execute('CREATE TABLE IF NOT EXISTS size_histogram (bucket INTEGER PRIMARY KEY, file_count INTEGER)')
+        for create_sql in cls.TRIGGERS.values():
+            cursor.execute(create_sql)
+        cls.recompute(cursor)
+
+    @classmethod
+    def _compute(cls, cursor: sqlite3.Cursor) -> IndexStats:
+        """通过全表扫描从头计算统计信息"""
+        cursor.execute('SELECT COUNT(*), COALESCE(SUM(is_directory), 0), COALESCE(SUM(size), 0) FROM file_index')
+        total_files, total_directories, total_bytes = cursor.fetchone()
+        cursor.execute('SELECT COUNT(*), COUNT(DISTINCT document_id) FROM doc_file_mapping')
+        mapping_count, unique_documents = cursor.fetchone()
+        cursor.execute('SELECT file_type, COUNT(*), COALESCE(SUM(size), 0) FROM file_index GROUP BY file_type')
+        by_file_type = {file_type: {'count': count, 'bytes': size} for file_type, count, size in cursor.fetchall()}
+        cursor.execute(f'SELECT {_size_bucket_sql("COALESCE(size, 0)")} AS bucket, COUNT(*) '
+                       f'FROM file_index GROUP BY bucket')
+        size_histogram = {SIZE_BUCKET_LABELS[bucket]: count for bucket, count in cursor.fetchall()}
+        return IndexStats(total_files, total_directories, total_bytes, mapping_count, unique_documents,
+                          by_file_type, size_histogram)
+
+    @classmethod
+    def recompute(cls, cursor: sqlite3.Cursor) -> IndexStats:
+        """从头重新计算并覆盖统计表"""
+        stats = cls._compute(cursor)
+        cursor.execute('DELETE FROM index_stats')
+        cursor.executemany('INSERT INTO index_stats (key, value) VALUES (?, ?)',
+                           [(key, getattr(stats, key)) for key in cls.COUNTER_KEYS])
+        cursor.execute('DELETE FROM file_type_stats')
+        cursor.executemany('INSERT INTO file_type_stats (file_type, file_count, total_bytes) VALUES (?, ?, ?)',
+                           [(file_type, item['count'], item['bytes']) for file_type, item in stats.by_file_type.items()])
+        cursor.execute('DELETE FROM size_histogram')
+        cursor.executemany('INSERT INTO size_histogram (bucket, file_count) VALUES (?, ?)',
+                           [(SIZE_BUCKET_LABELS.index(label), count) for label, count in stats.size_histogram.items()])
+        return stats
+
+    @classmethod
+    def read(cls, cursor: sqlite3.Cursor) -> IndexStats:
+        """读取增量维护的统计信息，不扫描数据表"""
+        cursor.execute('SELECT key, value FROM index_stats')
+        counters = dict(cursor.fetchall())
+        cursor.execute('SELECT file_type, file_count, total_bytes FROM file_type_stats WHERE file_count > 0')
+        by_file_type = {file_type: {'count': count, 'bytes': size} for file_type, count, size in cursor.fetchall()}
+        cursor.execute('SELECT bucket, file_count FROM size_histogram WHERE file_count > 0 ORDER BY bucket')
+        size_histogram = {SIZE_BUCKET_LABELS[bucket]: count for bucket, count in cursor.fetchall()}
+        return IndexStats(*(counters.get(key, 0) for key in cls.COUNTER_KEYS),
+                          by_file_type=by_file_type, size_histogram=size_histogram)
+
+    @classmethod
+    def check(cls, cursor: sqlite3.Cursor) -> Dict[str, Tuple]:
+        """
+        比较增量统计与重新计算的结果
+
+        Returns:
+            Dict[str, Tuple] - 不一致的字段及其 (增量值, 实际值)，为空表示一致
+        """
+        stored = cls.read(cursor)
+        actual = cls._compute(cursor)
+        return {name: (getattr(stored, name), getattr(actual, name))
+                for name in IndexStats.__dataclass_fields__
+                if getattr(stored, name) != getattr(actual, name)}
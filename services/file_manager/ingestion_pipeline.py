@@ -0,0 +1,351 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple, TYPE_CHECKING
+from uuid import uuid4
+
+from services.file_manager.file_info import FileInfo
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+    from services.file_manager import FileIndexer, FileParser, VectorStore
+
+
+class IngestionCancelled(Exception):
+    """流水线被取消，任务未完成"""
+
+
+@dataclass
+class IngestJob:
+    """一个文件的入库任务"""
+    file_info: FileInfo
+    # 索引中该文件的旧版本，新版本提交索引后删除其向量
+    replaced: Optional[FileInfo] = None
+    # 内容指纹与旧版本一致，只刷新文件属性
+    unchanged: bool = False
+    # 变化日志中的序号，提交索引时在同一事务中确认
+    journal_seq: Optional[int] = None
+    document_ids: List[str] = field(default_factory=list)
+    upserted_ids: List[str] = field(default_factory=list)
+    pending_chunks: int = 0
+    error: Optional[BaseException] = None
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+
+# 各级队列的结束标记
+_STOP = object()
+
+
+class IngestionPipeline:
+    """
+    分阶段并发的文件入库流水线：解析 -> 分块攒批 -> 向量化 -> 向量写入 -> 索引提交
+
+    每个阶段有独立的线程池，阶段之间用有界队列连接：下游变慢时上游阻塞，内存占用有上界。
+    不同文件的分块合并为一批向量化，减少embedding请求次数；索引提交由单个线程合并为一次事务。
+    一个文件的所有分块写入向量库后才提交索引，失败或取消的文件会清理已写入的向量
+    """
+
+    def __init__(self, indexer: 'FileIndexer', parser: 'FileParser', vector_store: 'VectorStore',
+                 parse_workers: int = 4, embed_workers: int = 4, upsert_workers: int = 2,
+                 embed_batch_size: int = 64, batch_delay: float = 0.05, queue_size: int = 64,
+                 commit_batch_size: int = 256,
+                 on_complete: Optional[Callable[[IngestJob], None]] = None):
+        """
+        初始化并启动流水线
+
+        Args:
+            indexer: 文件索引
+            parser: 文件解析器
+            vector_store: 向量存储
+            parse_workers: 解析线程数
+            embed_workers: 向量化（embedding请求）线程数
+            upsert_workers: 向量写入线程数
+            embed_batch_size: 每次embedding请求的分块数
+            batch_delay: 攒批的最长等待时间(秒)，不足一批时到时即发送
+            queue_size: 各阶段之间队列的容量
+            commit_batch_size: 每次索引提交合并的文件数上限
+            on_complete: 每个任务结束（成功、失败或取消）后的回调
+        """
+        self.logger = logging.getLogger(__name__)
+        self.indexer = indexer
+        self.parser = parser
+        self.vector_store = vector_store
+        self.embed_batch_size = embed_batch_size
+        self.batch_delay = batch_delay
+        self.commit_batch_size = commit_batch_size
+        self.on_complete = on_complete
+
+        self._parse_queue: queue.Queue = queue.Queue(queue_size)
+        self._chunk_queue: queue.Queue = queue.Queue(queue_size)
+        self._embed_queue: queue.Queue = queue.Queue(queue_size)
+        self._upsert_queue: queue.Queue = queue.Queue(queue_size)
+        self._commit_queue: queue.Queue = queue.Queue(queue_size)
+
+        self._cancelled = threading.Event()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._unfinished = 0
+        self._all_done = threading.Condition(self._lock)
+
+        self._stages: List[Tuple[queue.Queue, List[threading.Thread]]] = [
+            (self._parse_queue, self._start_workers('parse', self._parse_worker, parse_workers)),
+            (self._chunk_queue, self._start_workers('batch', self._batch_worker, 1)),
+            (self._embed_queue, self._start_workers('embed', self._embed_worker, embed_workers)),
+            (self._upsert_queue, self._start_workers('upsert', self._upsert_worker, upsert_workers)),
+            (self._commit_queue, self._start_workers('commit', self._commit_worker, 1)),
+        ]
+
+    @staticmethod
+    def _start_workers(name: str, target: Callable, count: int) -> List[threading.Thread]:
+        threads = []
+        for index in range(count):
+            thread = threading.Thread(target=target, name=f'ingest-{name}-{index}', daemon=True)
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    def submit(self, file_info: FileInfo, replaced: Optional[FileInfo] = None,
+               journal_seq: Optional[int] = None) -> IngestJob:
+        """
+        提交一个文件，解析队列已满时阻塞
+
+        Args:
+            file_info: 文件信息
+            replaced: 索引中该文件的旧版本；内容指纹一致时不重新解析与向量化，否则新版本入库后删除旧向量
+            journal_seq: 变化日志中的序号；成功时与索引一起提交确认，处理失败时单独确认，取消或索引写入失败时保留以便重启后重做
+        """
+        job = IngestJob(file_info, replaced, journal_seq=journal_seq)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("IngestionPipeline is closed")
+            self._unfinished += 1
+        self._parse_queue.put(job)
+        return job
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """等待所有已提交的任务结束，返回是否全部结束"""
+        with self._all_done:
+            return self._all_done.wait_for(lambda: self._unfinished == 0, timeout)
+
+    @property
+    def in_flight(self) -> int:
+        """已提交、尚未结束的任务数"""
+        with self._lock:
+            return self._unfinished
+
+    def cancel(self):
+        """取消：尚未完成的任务不再继续处理，已写入的向量会被清理"""
+        self._cancelled.set()
+
+    def close(self, drain: bool = True):
+        """
+        关闭流水线
+
+        Args:
+            drain: True时处理完所有已提交的任务再退出，False时取消未完成的任务
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if not drain:
+            self.cancel()
+        # 按阶段顺序逐级发送结束标记，保证上游的产出都已交给下游
+        for stage_queue, threads in self._stages:
+            for _ in threads:
+                stage_queue.put(_STOP)
+            for thread in threads:
+                thread.join()
+
+    def _parse_worker(self):
+        while True:
+            job = self._parse_queue.get()
+            if job is _STOP:
+                return
+            if self._cancelled.is_set():
+                self._fail(job, IngestionCancelled())
+                continue
+            try:
+                if job.file_info.fingerprint is None:
+                    job.file_info.fingerprint = FileInfo.compute_fingerprint(job.file_info.path)
+                if job.replaced is not None and job.file_info.fingerprint == \
+                        self.indexer.get_fingerprints([job.replaced.id]).get(job.replaced.id):
+                    # 内容未变化（touch、git checkout、备份恢复等），不重新解析与向量化
+                    job.unchanged = True
+                    self._commit_queue.put(job)
+                    continue
+                documents = self.parser.parse_file_with_info(job.file_info)
+            except Exception as e:
+                self._fail(job, e)
+                continue
+            job.document_ids = [str(uuid4()) for _ in documents]
+            job.pending_chunks = len(documents)
+            if documents:
+                self._chunk_queue.put((job, documents))
+            else:
+                self._commit_queue.put(job)
+
+    def _batch_worker(self):
+        """把多个文件的分块合并为固定大小的批次，不足一批时最多等待batch_delay"""
+        batch: List[Tuple[IngestJob, 'Document', str]] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._chunk_queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                if batch:
+                    self._embed_queue.put(batch)
+                return
+            if item is not None:
+                job, documents = item
+                for document, document_id in zip(documents, job.document_ids):
+                    batch.append((job, document, document_id))
+                    if len(batch) >= self.embed_batch_size:
+                        self._embed_queue.put(batch)
+                        batch = []
+                if batch and deadline is None:
+                    deadline = time.monotonic() + self.batch_delay
+            if batch and (item is None or time.monotonic() >= deadline):
+                self._embed_queue.put(batch)
+                batch = []
+            if not batch:
+                deadline = None
+
+    def _embed_worker(self):
+        while True:
+            batch = self._embed_queue.get()
+            if batch is _STOP:
+                return
+            try:
+                if self._cancelled.is_set():
+                    raise IngestionCancelled()
+                vectors = self.vector_store.embed_documents([document for _, document, _ in batch])
+            except Exception as e:
+                self._chunks_finished(batch, e)
+                continue
+            self._upsert_queue.put((batch, vectors))
+
+    def _upsert_worker(self):
+        while True:
+            item = self._upsert_queue.get()
+            if item is _STOP:
+                return
+            batch, vectors = item
+            try:
+                if self._cancelled.is_set():
+                    raise IngestionCancelled()
+                self.vector_store.upsert_embedded_documents([document for _, document, _ in batch], vectors,
+                                                            [document_id for _, _, document_id in batch])
+            except Exception as e:
+                self._chunks_finished(batch, e)
+                continue
+            self._chunks_finished(batch)
+
+    def _chunks_finished(self, batch: List[Tuple[IngestJob, 'Document', str]], error: Optional[Exception] = None):
+        """记录一批分块的结果，文件的所有分块都结束后交给索引提交阶段"""
+        completed = []
+        with self._lock:
+            for job, _, document_id in batch:
+                if error is None:
+                    job.upserted_ids.append(document_id)
+                elif job.error is None:
+                    job.error = error
+                job.pending_chunks -= 1
+                if job.pending_chunks == 0:
+                    completed.append(job)
+        for job in completed:
+            self._commit_queue.put(job)
+
+    def _commit_worker(self):
+        while True:
+            jobs = [self._commit_queue.get()]
+            # 合并已就绪的任务，一次事务提交
+            while jobs[-1] is not _STOP and len(jobs) < self.commit_batch_size:
+                try:
+                    jobs.append(self._commit_queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = jobs[-1] is _STOP
+            if stop:
+                jobs.pop()
+            self._commit(jobs)
+            if stop:
+                return
+
+    def _commit(self, jobs: List[IngestJob]):
+        if self._cancelled.is_set():
+            for job in jobs:
+                job.error = job.error or IngestionCancelled()
+        for job in jobs:
+            # 处理期间文件已被删除或移走，不再写入索引（删除事件已在此之前处理）
+            if job.error is None and not os.path.exists(job.file_info.path):
+                job.error = FileNotFoundError(f"文件不存在: {job.file_info.path}")
+        succeeded = [job for job in jobs if job.error is None]
+        refreshed = [job for job in succeeded if job.unchanged]
+        for job in refreshed:
+            job.file_info.metadata = job.replaced.metadata
+            job.file_info.document_ids = job.replaced.document_ids
+        ingested = [job for job in succeeded if not job.unchanged]
+        for job in ingested:
+            job.file_info.document_ids = job.document_ids
+        try:
+            # 向量已全部写入；索引与变化日志的确认在同一事务中提交，日志检查点不会越过未提交的文件
+            with self.indexer.transaction():
+                if refreshed:
+                    self.indexer.update_indexes([job.file_info for job in refreshed])
+                if ingested:
+                    self.indexer.create_indexes([job.file_info for job in ingested])
+                self.indexer.acknowledge_changes([job.journal_seq for job in succeeded
+                                                  if job.journal_seq is not None])
+        except Exception as e:
+            for job in succeeded:
+                job.error = e
+            ingested = []
+
+        replaced_ids = [document_id for job in ingested if job.replaced is not None
+                        for document_id in job.replaced.document_ids]
+        orphan_ids = [document_id for job in jobs if job.error is not None for document_id in job.upserted_ids]
+        for document_ids in (replaced_ids, orphan_ids):
+            if document_ids:
+                try:
+                    self.vector_store.delete_documents(document_ids)
+                except Exception as e:
+                    self.logger.error(f"Failed to delete vectors: {str(e)}", exc_info=True)
+        for job in jobs:
+            self._finish(job)
+
+    def _fail(self, job: IngestJob, error: BaseException):
+        job.error = error
+        self._finish(job)
+
+    def _finish(self, job: IngestJob):
+        if job.error is not None and job.journal_seq is not None and \
+                not isinstance(job.error, (IngestionCancelled, sqlite3.Error)):
+            # 解析失败、文件已删除等不在重启后重做（由之后的事件或审计重新发现）；取消与索引写入失败的记录保留
+            try:
+                self.indexer.acknowledge_changes([job.journal_seq])
+            except Exception as e:
+                self.logger.error(f"Failed to acknowledge journal entry: {str(e)}", exc_info=True)
+        if job.error is None and job.unchanged:
+            self.logger.info(f"Unchanged content, skipped re-embedding: {job.file_info.path}")
+        elif job.error is None:
+            self.logger.info(f"Added vectors for: {job.file_info.path}")
+        elif not isinstance(job.error, IngestionCancelled):
+            self.logger.error(f"Ingest Failed: {job.file_info.path}, {str(job.error)}")
+        job.done.set()
+        if self.on_complete:
+            try:
+                self.on_complete(job)
+            except Exception as e:
+                self.logger.error(f"on_complete callback failed: {str(e)}", exc_info=True)
+        with self._all_done:
+            self._unfinished -= 1
+            if self._unfinished == 0:
+                self._all_done.notify_all()
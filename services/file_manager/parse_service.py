@@ -0,0 +1,173 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
+from langchain_core.documents import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+
+def load_documents(file_path: str) -> List[Document]:
+    """按扩展名选择加载器读取文件内容"""
+    path_suffix = Path(file_path).suffix
+    if path_suffix.endswith(".pdf"):
+        loader = PyPDFLoader(file_path)  # 存在跨页信息丢失的问题，考虑自定义pdf加载器。
+    elif path_suffix.endswith(".docx"):
+        loader = Docx2txtLoader(file_path)
+    else:
+        loader = TextLoader(file_path, autodetect_encoding=True)
+    return loader.load()
+
+
+def create_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        add_start_index=True
+    )
+
+
+# 工作进程内按分块参数缓存的分割器，进程被回收后随之释放
+_worker_splitters: Dict[Tuple[int, int], RecursiveCharacterTextSplitter] = {}
+
+
+def split_file(file_path: str, chunk_size: int, chunk_overlap: int) -> List[Document]:
+    """(在工作进程中执行) 加载文件并分割成documents"""
+    splitter = _worker_splitters.get((chunk_size, chunk_overlap))
+    if splitter is None:
+        splitter = _worker_splitters[(chunk_size, chunk_overlap)] = create_splitter(chunk_size, chunk_overlap)
+    return splitter.split_documents(load_documents(file_path))
+
+
+class ParseTimeoutError(TimeoutError):
+    """解析超时，执行该任务的工作进程已被终止"""
+
+
+class ProcessParseService:
+    """
+    在进程池中解析CPU密集格式（pdf、docx）的文件
+
+    加载与分块是纯Python计算，在线程中执行时受GIL限制，多个解析线程也只能用满一个核；
+    放到子进程后解析吞吐随进程数增长。每个工作进程执行max_tasks_per_child个任务后被替换，
+    解析库的内存泄漏与碎片不会持续累积。
+    正在执行的任务无法取消，任务超时时终止整个进程池并重建；同时被中断的其他任务自动重新提交
+    """
+
+    PROCESS_SUFFIXES = ('.pdf', '.docx')
+    DEFAULT_WORKERS = os.cpu_count() or 1
+    # 单个文件的解析时间上限(秒)，含工作进程被回收后重新启动的时间
+    DEFAULT_TASK_TIMEOUT = 120.0
+    DEFAULT_MAX_TASKS_PER_CHILD = 100
+    # 进程池被其他任务的超时或崩溃中断时，一个任务最多提交的次数
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, chunk_size: int, chunk_overlap: int, max_workers: Optional[int] = None,
+                 task_timeout: Optional[float] = None, max_tasks_per_child: Optional[int] = None):
+        """
+        初始化解析服务，进程池在第一次解析时创建
+
+        Args:
+            chunk_size: 分块大小
+            chunk_overlap: 分块重叠长度
+            max_workers: 工作进程数，默认CPU核数
+            task_timeout: 单个文件的解析时间上限(秒)，默认DEFAULT_TASK_TIMEOUT
+            max_tasks_per_child: 每个工作进程执行多少个任务后被替换，默认DEFAULT_MAX_TASKS_PER_CHILD
+        """
+        self.logger = logging.getLogger(__name__)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.max_workers = max_workers or self.DEFAULT_WORKERS
+        self.task_timeout = task_timeout or self.DEFAULT_TASK_TIMEOUT
+        self.max_tasks_per_child = max_tasks_per_child or self.DEFAULT_MAX_TASKS_PER_CHILD
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # 进程池每重建一次加一，避免多个线程因同一次中断重复重建
+        self._generation = 0
+        self._lock = threading.Lock()
+        # 同时提交的任务数不超过进程数，任务提交后立即开始执行，超时不包含排队时间
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+
+    @classmethod
+    def handles(cls, file_path: str) -> bool:
+        """文件是否应在进程池中解析"""
+        return Path(file_path).suffix.endswith(cls.PROCESS_SUFFIXES)
+
+    @staticmethod
+    def _get_context():
+        # 回收工作进程不能使用fork；forkserver预先导入本模块，替换的进程无需重新导入解析库
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload([__name__])
+            return context
+        return multiprocessing.get_context('spawn')
+
+    def _submit(self, file_path: str) -> Tuple[Future, int]:
+        """提交任务，返回Future与进程池的代数；与重建互斥，不会提交到已关闭的进程池"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self._get_context(),
+                                                     max_tasks_per_child=self.max_tasks_per_child)
+            fn, args = self._task(file_path)
+            future = self._executor.submit(fn, *args)
+            return future, self._generation
+
+    def _task(self, file_path: str) -> Tuple[Callable, tuple]:
+        """在工作进程中执行的函数及其参数"""
+        return split_file, (file_path, self.chunk_size, self.chunk_overlap)
+
+    def _restart(self, generation: int):
+        """终止指定代的进程池（包括卡住的工作进程），下一次解析时重建"""
+        with self._lock:
+            if generation != self._generation or self._executor is None:
+                return
+            executor, self._executor = self._executor, None
+            self._generation += 1
+        self._kill(executor)
+
+    @staticmethod
+    def _kill(executor: ProcessPoolExecutor):
+        # 正在执行的任务无法取消，只能终止进程；ProcessPoolExecutor没有公开的进程列表
+        processes = list((getattr(executor, '_processes', None) or {}).values())
+        for process in processes:
+            if process.is_alive():
+                process.kill()
+        # 排队中的任务随进程池中断失败（BrokenProcessPool），由各自的调用方重新提交
+        executor.shutdown(wait=False)
+        for process in processes:
+            process.join()
+
+    def parse(self, file_path: str) -> List[Document]:
+        """
+        在工作进程中加载文件并分割成documents，阻塞直到完成
+
+        Raises:
+            ParseTimeoutError: 超过task_timeout仍未完成
+            BrokenProcessPool: 工作进程多次异常退出（如解析库崩溃）
+        """
+        with self._slots:
+            for attempt in range(1, self.MAX_ATTEMPTS + 1):
+                future, generation = self._submit(file_path)
+                try:
+                    return future.result(timeout=self.task_timeout)
+                except FuturesTimeoutError:
+                    self._restart(generation)
+                    raise ParseTimeoutError(f"Parse timed out after {self.task_timeout}s: {file_path}")
+                except BrokenProcessPool:
+                    # 其他任务超时或工作进程崩溃使进程池中断，本任务重新提交到新的进程池
+                    self._restart(generation)
+                    if attempt == self.MAX_ATTEMPTS:
+                        raise
+                    self.logger.warning(f"Parse Interrupted, retrying: {file_path}")
+
+    def close(self):
+        """关闭进程池，之后的解析会重新创建"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._generation += 1
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,253 @@
+import bisect
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple, Iterable
+
+
+class PathCache:
+    """
+    进程内的路径→文件ID缓存，由FileIndexer在每次写入提交后同步更新
+
+    两种模式：
+        - 完整模式（max_entries为None）：启动时载入全部路径，缓存即权威数据，
+          未命中即表示路径不在索引中，并支持按前缀枚举子树；
+          条目数超过complete_limit后转为以complete_limit为上限的LRU模式
+        - LRU模式（max_entries为正数）：只保留最近使用的路径，内存有上界，
+          未命中时需回源数据库，不支持子树枚举
+
+    回源读取的结果通过fill写入，读取期间有写入提交（generation变化）时丢弃，避免覆盖较新的删除或移动
+    """
+
+    # 完整模式的默认条目上限，约对应数百MB内存
+    DEFAULT_COMPLETE_LIMIT = 500000
+
+    # 批量写入或删除的路径数不超过该值时逐条二分插入/删除，否则与有序表整体合并
+    SORTED_BATCH_THRESHOLD = 128
+
+    def __init__(self, max_entries: Optional[int] = None, complete_limit: Optional[int] = DEFAULT_COMPLETE_LIMIT):
+        """
+        初始化路径缓存
+
+        Args:
+            max_entries: 最大缓存条目数，None表示完整模式
+            complete_limit: 完整模式的条目上限，超过后转为LRU模式；None表示不限
+        """
+        if max_entries is not None and max_entries <= 0:
+            raise ValueError("max_entries must be positive or None")
+        if complete_limit is not None and complete_limit <= 0:
+            raise ValueError("complete_limit must be positive or None")
+        self.max_entries = max_entries
+        self.complete_limit = complete_limit
+        self._full_mode = max_entries is None
+        self._ids: 'OrderedDict[str, str]' = OrderedDict()
+        # 有序路径表，仅完整模式使用；第一次子树查询时建立，之后随写入增量维护
+        self._sorted_paths: Optional[List[str]] = None
+        self._lock = threading.RLock()
+        self.complete = False
+        self.hits = 0
+        self.misses = 0
+        # 每次写入同步加一，fill据此判断回源读取期间缓存是否被修改
+        self.generation = 0
+
+    @property
+    def bounded(self) -> bool:
+        return self.max_entries is not None
+
+    def _degrade_if_full(self):
+        """(调用方持有锁) 完整模式超过条目上限时转为LRU模式，丢弃最早写入的条目"""
+        if self.bounded or self.complete_limit is None or len(self._ids) <= self.complete_limit:
+            return
+        self.max_entries = self.complete_limit
+        self.complete = False
+        self._sorted_paths = None
+        while len(self._ids) > self.max_entries:
+            self._ids.popitem(last=False)
+
+    def load(self, entries: Iterable[Tuple[str, str]]):
+        """以 (path, id) 全量载入，完整模式下载入后缓存成为权威数据（超过条目上限时除外）"""
+        with self._lock:
+            self.generation += 1
+            self._ids.clear()
+            self._sorted_paths = None
+            self.complete = not self.bounded
+            for path, file_id in entries:
+                self._ids[path] = file_id
+                if self.bounded:
+                    if len(self._ids) > self.max_entries:
+                        self._ids.popitem(last=False)
+                else:
+                    self._degrade_if_full()
+
+    def lookup(self, path: str) -> Tuple[bool, Optional[str]]:
+        """
+        查询路径对应的文件ID
+
+        Returns:
+            Tuple[bool, Optional[str]] - (结果是否可信, 文件ID)；
+            命中或完整模式下的未命中均可信，LRU模式下未命中需回源数据库
+        """
+        with self._lock:
+            file_id = self._ids.get(path)
+            if file_id is not None:
+                self.hits += 1
+                if self.bounded:
+                    self._ids.move_to_end(path)
+                return True, file_id
+            self.misses += 1
+            return self.complete, None
+
+    def _put(self, path: str, file_id: str):
+        """(调用方持有锁) 写入一条路径"""
+        if path not in self._ids and self._sorted_paths is not None:
+            bisect.insort(self._sorted_paths, path)
+        self._ids[path] = file_id
+        if self.bounded:
+            self._ids.move_to_end(path)
+            if len(self._ids) > self.max_entries:
+                self._ids.popitem(last=False)
+        else:
+            self._degrade_if_full()
+
+    def put(self, path: str, file_id: str):
+        with self._lock:
+            self.generation += 1
+            self._put(path, file_id)
+
+    def fill(self, path: str, file_id: str, generation: int) -> bool:
+        """
+        写入回源数据库读到的路径；读取前取得的generation已过期（期间有写入提交）时放弃
+
+        Returns:
+            bool - 是否已写入
+        """
+        with self._lock:
+            if generation != self.generation:
+                return False
+            self._put(path, file_id)
+            return True
+
+    def put_many(self, entries: Iterable[Tuple[str, str]]):
+        with self._lock:
+            self.generation += 1
+            if self._sorted_paths is None:
+                for path, file_id in entries:
+                    self._put(path, file_id)
+                return
+            added = []
+            for path, file_id in entries:
+                if path not in self._ids:
+                    added.append(path)
+                self._ids[path] = file_id
+            self._insert_sorted(added)
+            self._degrade_if_full()
+
+    def _insert_sorted(self, paths: List[str]):
+        """(调用方持有锁) 将新路径并入有序表"""
+        if len(paths) <= self.SORTED_BATCH_THRESHOLD:
+            for path in paths:
+                bisect.insort(self._sorted_paths, path)
+            return
+        # 二分定位每个新路径的插入点，按段拼接：比较次数为k·log N，其余为切片复制
+        sorted_paths = self._sorted_paths
+        pieces, start = [], 0
+        for path in sorted(paths):
+            index = bisect.bisect_left(sorted_paths, path, start)
+            pieces.append(sorted_paths[start:index])
+            pieces.append((path,))
+            start = index
+        pieces.append(sorted_paths[start:])
+        self._sorted_paths = list(itertools.chain.from_iterable(pieces))
+
+    def _remove_sorted(self, paths: List[str]):
+        """(调用方持有锁) 从有序表中移除路径"""
+        if len(paths) <= self.SORTED_BATCH_THRESHOLD:
+            for path in paths:
+                del self._sorted_paths[bisect.bisect_left(self._sorted_paths, path)]
+            return
+        sorted_paths = self._sorted_paths
+        pieces, start = [], 0
+        for path in sorted(paths):
+            index = bisect.bisect_left(sorted_paths, path, start)
+            pieces.append(sorted_paths[start:index])
+            start = index + 1
+        pieces.append(sorted_paths[start:])
+        self._sorted_paths = list(itertools.chain.from_iterable(pieces))
+
+    def remove(self, path: str):
+        with self._lock:
+            self.generation += 1
+            if self._ids.pop(path, None) is not None and self._sorted_paths is not None:
+                index = bisect.bisect_left(self._sorted_paths, path)
+                del self._sorted_paths[index]
+
+    def remove_many(self, paths: Iterable[str]):
+        with self._lock:
+            self.generation += 1
+            removed = [path for path in paths if self._ids.pop(path, None) is not None]
+            if removed and self._sorted_paths is not None:
+                self._remove_sorted(removed)
+
+    def _paths_with_prefix(self, prefix: str) -> List[str]:
+        if self.bounded:
+            return [path for path in self._ids if path.startswith(prefix)]
+        if self._sorted_paths is None:
+            self._sorted_paths = sorted(self._ids)
+        sorted_paths = self._sorted_paths
+        index = bisect.bisect_left(sorted_paths, prefix)
+        paths = []
+        while index < len(sorted_paths) and sorted_paths[index].startswith(prefix):
+            paths.append(sorted_paths[index])
+            index += 1
+        return paths
+
+    def subtree(self, prefix: str) -> Optional[List[Tuple[str, str]]]:
+        """
+        按路径前缀枚举 (path, id)，顺序按路径排序
+
+        Returns:
+            Optional[List[Tuple[str, str]]] - LRU模式下数据不完整，返回None
+        """
+        with self._lock:
+            if not self.complete:
+                return None
+            return [(path, self._ids[path]) for path in self._paths_with_prefix(prefix)]
+
+    def move_prefix(self, src_dir: str, dest_dir: str, sep: str, id_for_path: Callable[[str], str]) -> int:
+        """将src_dir及其后代的条目改写到dest_dir下"""
+        with self._lock:
+            self.generation += 1
+            src_prefix = src_dir.rstrip(sep) + sep
+            moved = [path for path in self._paths_with_prefix(src_dir)
+                     if path == src_dir or path.startswith(src_prefix)]
+            new_paths = []
+            for old_path in moved:
+                new_path = dest_dir + old_path[len(src_dir):]
+                del self._ids[old_path]
+                if new_path not in self._ids:
+                    new_paths.append(new_path)
+                self._ids[new_path] = id_for_path(new_path)
+            if self._sorted_paths is not None:
+                self._remove_sorted(moved)
+                self._insert_sorted(new_paths)
+            return len(moved)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._ids.clear()
+            self._sorted_paths = None
+            # 因条目过多转为LRU的完整缓存，清空后恢复完整模式
+            if self._full_mode:
+                self.max_entries = None
+            self.complete = not self.bounded
+
+    def stats(self) -> Dict[str, int]:
+        """获取命中统计"""
+        with self._lock:
+            return {
+                'entries': len(self._ids),
+                'hits': self.hits,
+                'misses': self.misses,
+                'complete': self.complete,
+            }
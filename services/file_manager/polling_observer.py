@@ -0,0 +1,322 @@
+import heapq
+import itertools
+import logging
+import os
+import stat
+import threading
+import time
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from watchdog.events import (DirCreatedEvent, DirDeletedEvent, DirMovedEvent, FileCreatedEvent, FileDeletedEvent,
+                             FileModifiedEvent, FileMovedEvent)
+
+
+class _DirState:
+    """一个目录上次轮询时的状态：目录mtime、子目录名、文件名及其inode（用于识别移动）"""
+    __slots__ = ('mtime_ns', 'ino', 'subdirs', 'files', 'file_inodes')
+
+    def __init__(self, mtime_ns: int, ino: int, subdirs: Tuple[str, ...], files: Tuple[str, ...],
+                 file_inodes: array):
+        self.mtime_ns = mtime_ns
+        self.ino = ino
+        self.subdirs = subdirs
+        self.files = files
+        self.file_inodes = file_inodes
+
+
+class PollingWatch:
+    """AdaptivePollingObserver.schedule返回的监控句柄，保存该目录树的轮询状态"""
+
+    def __init__(self, handler, path: str, listdir: Callable[[str], Iterable[os.DirEntry]],
+                 min_interval: float, max_interval: float):
+        self.handler = handler
+        self.path = os.path.normpath(os.path.abspath(path))
+        self.is_recursive = True
+        self.listdir = listdir
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.dirs: Dict[str, _DirState] = {}
+        # 最近有变化的目录 -> (最后变化时间, 文件名 -> (size, mtime_ns))，这些目录中的文件每次轮询都会stat
+        self.hot: Dict[str, Tuple[float, Dict[str, Tuple[int, int]]]] = {}
+        self.last_poll_seconds = 0.0
+        self.cancelled = False
+
+
+class AdaptivePollingObserver:
+    """
+    基于目录mtime的自适应轮询观察者，用于inotify不可靠的挂载（bind mount、FUSE、SMB等网络共享）
+
+    watchdog的PollingObserver每次轮询都对整棵树重新建立快照。这里只记录每个目录的mtime与子项名称，
+    每次轮询对每个目录做一次stat，只重新列出mtime变化的目录：新建、删除、改名都会改变所在目录的mtime。
+    同一次轮询中inode相同的删除与新建配对为移动事件。
+
+    原地写入不改变目录mtime：最近有变化的目录（热目录）中的文件每次轮询都会stat以发现修改，
+    其余目录中的原地修改由处理器的周期审计补上。
+
+    轮询间隔自适应：发现变化后回到min_interval，无变化时按backoff倍数增长到max_interval；
+    间隔同时不小于上次轮询耗时的DUTY_FACTOR倍，繁忙时轮询占用的CPU也有上限。
+    所有监控目录由同一个线程轮询，接口与watchdog的Observer一致（schedule/unschedule/start/stop/join）
+    """
+
+    # 热目录在最后一次变化后保持的时间(秒)
+    HOT_SECONDS = 300.0
+    # 轮询间隔不小于上次轮询耗时的倍数，即轮询占用单核CPU不超过 1/(DUTY_FACTOR+1)
+    DUTY_FACTOR = 9
+
+    def __init__(self, min_interval: float = 1.0, max_interval: float = 60.0, backoff: float = 2.0):
+        """
+        初始化观察者
+
+        Args:
+            min_interval: 有变化时的轮询间隔(秒)
+            max_interval: 空闲时轮询间隔的上限(秒)
+            backoff: 每次无变化的轮询后间隔的增长倍数
+        """
+        self.logger = logging.getLogger(__name__)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self._watches: List[PollingWatch] = []
+        self._queue: List[Tuple[float, int, PollingWatch]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, event_handler, path: str, recursive: bool = True,
+                 listdir: Optional[Callable[[str], Iterable[os.DirEntry]]] = None) -> PollingWatch:
+        """
+        开始监控目录树（总是递归），建立初始状态后返回
+
+        Args:
+            event_handler: 事件处理器，事件通过其dispatch方法传递
+            path: 目录路径
+            recursive: 与watchdog接口保持一致，总是递归监控
+            listdir: 列出目录条目的函数（如IgnoreRules.scandir，被忽略的目录不会进入），默认os.scandir
+        """
+        watch = PollingWatch(event_handler, path, listdir or self._scandir, self.min_interval, self.max_interval)
+        start_time = time.perf_counter()
+        self._scan_tree(watch, watch.path)
+        watch.last_poll_seconds = time.perf_counter() - start_time
+        self.logger.info(f"轮询监控: {watch.path}，{len(watch.dirs)}个目录，"
+                         f"初始扫描耗时{watch.last_poll_seconds:.2f}s")
+        with self._cond:
+            self._watches.append(watch)
+            self._push(watch)
+        return watch
+
+    def unschedule(self, watch: PollingWatch):
+        """停止监控目录树"""
+        with self._cond:
+            watch.cancelled = True
+            if watch in self._watches:
+                self._watches.remove(watch)
+            self._cond.notify()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='polling-observer', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stopped
+
+    def _push(self, watch: PollingWatch):
+        """(调用方持有锁) 按当前间隔安排下一次轮询"""
+        delay = max(watch.interval, watch.last_poll_seconds * self.DUTY_FACTOR)
+        heapq.heappush(self._queue, (time.monotonic() + delay, next(self._seq), watch))
+        self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped and (not self._queue or self._queue[0][0] > time.monotonic()):
+                    self._cond.wait(self._queue[0][0] - time.monotonic() if self._queue else None)
+                if self._stopped:
+                    return
+                _, _, watch = heapq.heappop(self._queue)
+                if watch.cancelled:
+                    continue
+            try:
+                changed = self.poll(watch)
+            except Exception as e:
+                self.logger.error(f"Poll Failed: {watch.path}, {str(e)}", exc_info=True)
+                changed = False
+            watch.interval = watch.min_interval if changed else \
+                min(watch.interval * self.backoff, watch.max_interval)
+            with self._cond:
+                if not watch.cancelled:
+                    self._push(watch)
+
+    @staticmethod
+    def _scandir(dir_path: str) -> List[os.DirEntry]:
+        with os.scandir(dir_path) as iterator:
+            return list(iterator)
+
+    @staticmethod
+    def _list(watch: PollingWatch, dir_path: str) -> Tuple[Dict[str, int], Dict[str, os.DirEntry]]:
+        """
+        列出目录，返回 (子目录名 -> inode, 文件名 -> 条目)；指向目录的符号链接视为文件，不进入
+
+        inode来自目录项本身，不需要逐个文件stat
+        """
+        subdirs, files = {}, {}
+        for entry in watch.listdir(dir_path):
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs[entry.name] = entry.inode()
+                else:
+                    files[entry.name] = entry
+            except OSError:
+                continue
+        return subdirs, files
+
+    @staticmethod
+    def _record(watch: PollingWatch, dir_path: str, dir_stat: os.stat_result,
+                subdirs: Dict[str, int], files: Dict[str, os.DirEntry]):
+        names = tuple(files)
+        watch.dirs[dir_path] = _DirState(dir_stat.st_mtime_ns, dir_stat.st_ino, tuple(subdirs), names,
+                                         array('Q', (files[name].inode() for name in names)))
+
+    def _scan_tree(self, watch: PollingWatch, root: str):
+        """记录目录树的状态"""
+        pending = [root]
+        while pending:
+            dir_path = pending.pop()
+            try:
+                # 先stat再列出，列出期间的变化会使下次轮询时mtime不一致而重新列出
+                dir_stat = os.stat(dir_path)
+                subdirs, files = self._list(watch, dir_path)
+            except OSError:
+                continue
+            self._record(watch, dir_path, dir_stat, subdirs, files)
+            pending.extend(os.path.join(dir_path, name) for name in subdirs)
+
+    def _forget_tree(self, watch: PollingWatch, root: str):
+        """移除目录树的状态"""
+        pending = [root]
+        while pending:
+            dir_path = pending.pop()
+            state = watch.dirs.pop(dir_path, None)
+            watch.hot.pop(dir_path, None)
+            if state is not None:
+                pending.extend(os.path.join(dir_path, name) for name in state.subdirs)
+
+    def poll(self, watch: PollingWatch) -> bool:
+        """
+        轮询一次：stat所有目录，重新列出mtime变化的目录并派发事件
+
+        Returns:
+            bool - 是否发现变化
+        """
+        start_time = time.perf_counter()
+        now = time.monotonic()
+        # (路径, inode, 是否为目录)
+        created: List[Tuple[str, int, bool]] = []
+        deleted: List[Tuple[str, int, bool]] = []
+        modified: List[str] = []
+
+        for dir_path in list(watch.dirs):
+            state = watch.dirs.get(dir_path)
+            if state is None:
+                # 本次轮询中随上级目录一起被移除
+                continue
+            try:
+                dir_stat = os.stat(dir_path)
+            except OSError:
+                # 已被删除或移走，由上级目录的变化处理
+                continue
+            if dir_stat.st_mtime_ns == state.mtime_ns:
+                if dir_path in watch.hot:
+                    modified.extend(self._check_hot(watch, dir_path, now))
+                continue
+
+            try:
+                subdirs, files = self._list(watch, dir_path)
+            except OSError:
+                continue
+            old_files = dict(zip(state.files, state.file_inodes))
+            for name in state.subdirs:
+                if name not in subdirs:
+                    path = os.path.join(dir_path, name)
+                    old = watch.dirs.get(path)
+                    deleted.append((path, old.ino if old else 0, True))
+                    self._forget_tree(watch, path)
+            for name, ino in old_files.items():
+                if name not in files:
+                    deleted.append((os.path.join(dir_path, name), ino, False))
+            for name, ino in subdirs.items():
+                if name not in state.subdirs:
+                    path = os.path.join(dir_path, name)
+                    created.append((path, ino, True))
+                    self._scan_tree(watch, path)
+            hot_stats = watch.hot[dir_path][1] if dir_path in watch.hot else {}
+            file_stats = {}
+            for name, entry in files.items():
+                if old_files.get(name) != entry.inode():
+                    # 新文件，或被同名的另一个文件替换（原子保存）
+                    created.append((entry.path, entry.inode(), False))
+                try:
+                    file_stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                file_stats[name] = (file_stat.st_size, file_stat.st_mtime_ns)
+                if name in hot_stats and old_files.get(name) == entry.inode() and \
+                        hot_stats[name] != file_stats[name]:
+                    modified.append(entry.path)
+            self._record(watch, dir_path, dir_stat, subdirs, files)
+            watch.hot[dir_path] = (now, file_stats)
+
+        events = self._pair_moves(created, deleted)
+        events.extend(FileModifiedEvent(path) for path in modified)
+        for event in events:
+            watch.handler.dispatch(event)
+        watch.last_poll_seconds = time.perf_counter() - start_time
+        return bool(events)
+
+    def _check_hot(self, watch: PollingWatch, dir_path: str, now: float) -> List[str]:
+        """stat热目录中的文件，返回被原地修改的文件；长时间无变化的目录不再是热目录"""
+        last_change, file_stats = watch.hot[dir_path]
+        modified = []
+        for name, previous in file_stats.items():
+            path = os.path.join(dir_path, name)
+            try:
+                file_stat = os.stat(path, follow_symlinks=False)
+            except OSError:
+                continue
+            current = (file_stat.st_size, file_stat.st_mtime_ns)
+            if current != previous and stat.S_ISREG(file_stat.st_mode):
+                file_stats[name] = current
+                modified.append(path)
+        if modified:
+            watch.hot[dir_path] = (now, file_stats)
+        elif now - last_change > self.HOT_SECONDS:
+            del watch.hot[dir_path]
+        return modified
+
+    @staticmethod
+    def _pair_moves(created: List[Tuple[str, int, bool]], deleted: List[Tuple[str, int, bool]]) -> list:
+        """inode相同的删除与新建配对为移动，其余分别为删除与新建事件"""
+        sources = {(ino, is_dir): path for path, ino, is_dir in deleted if ino}
+        events, moved_sources = [], set()
+        for path, ino, is_dir in created:
+            src_path = sources.pop((ino, is_dir), None) if ino else None
+            if src_path is not None:
+                moved_sources.add(src_path)
+                events.append(DirMovedEvent(src_path, path) if is_dir else FileMovedEvent(src_path, path))
+            else:
+                events.append(DirCreatedEvent(path) if is_dir else FileCreatedEvent(path))
+        events[:0] = [DirDeletedEvent(path) if is_dir else FileDeletedEvent(path)
+                      for path, _, is_dir in deleted if path not in moved_sources]
+        return events
@@ -83,6 +83,29 @@ class VectorStore:
         self.vector_store.add_documents(documents=documents)
         return document_ids
 
+    def embed_documents(self, documents: List[Document]) -> List[List[float]]:
+        """批量计算文档向量（一次embedding请求）"""
+        return self.embeddings.embed_documents([document.page_content for document in documents])
+
+    def upsert_embedded_documents(self, documents: List[Document], vectors: List[List[float]],
+                                  document_ids: List[str]) -> List[str]:
+        """写入已计算好向量的文档，payload格式与QdrantVectorStore一致"""
+        if not (len(documents) == len(vectors) == len(document_ids)):
+            raise ValueError("The length of 'documents', 'vectors' and 'document_ids' must be the same.")
+        vector_name = self.vector_store.vector_name
+        points = [
+            models.PointStruct(
+                id=document_id,
+                vector={vector_name: vector} if vector_name else vector,
+                payload={
+                    self.vector_store.content_payload_key: document.page_content,
+                    self.vector_store.metadata_payload_key: document.metadata,
+                })
+            for document, vector, document_id in zip(documents, vectors, document_ids)
+        ]
+        self.client.upsert(collection_name=self.collection_name, points=points)
+        return document_ids
+
     def update_documents(self, documents: List[Document], document_ids: List[str]):
         """更新向量"""
         if len(documents) != len(document_ids):
@@ -0,0 +1,248 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Hashable, List, Optional, Tuple, TYPE_CHECKING
+
+from services.file_manager.index_scheduler import IndexScheduler
+from services.file_manager.ingestion_pipeline import IngestJob, IngestionPipeline
+
+if TYPE_CHECKING:
+    from services.file_manager import FileIndexer, FileParser, VectorStore
+
+
+class ScheduledCall:
+    """SharedWorkerPool.call_later返回的句柄"""
+
+    def __init__(self, due: float, key: Hashable, fn: Callable, args: tuple):
+        self.due = due
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """取消尚未到期的调用"""
+        self.cancelled = True
+
+
+class SharedWorkerPool:
+    """
+    所有监控目录共用的工作线程池，线程数固定，与目录数量无关
+
+    同一分组（监控目录）的任务按提交顺序串行执行；有任务的分组按轮转顺序获得线程，
+    一个繁忙的目录每次只占用一个线程，其他目录的任务不会一直排在它后面。
+    延迟调用（防抖、周期审计）由一个计时线程统一管理，到期后作为该分组的任务提交
+    """
+
+    # 事件处理与对账以IO和数据库等待为主，可超过CPU核数
+    DEFAULT_WORKERS = min(8, (os.cpu_count() or 1) * 4)
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        初始化线程池
+
+        Args:
+            max_workers: 工作线程数，默认DEFAULT_WORKERS
+        """
+        self.logger = logging.getLogger(__name__)
+        self.max_workers = max_workers or self.DEFAULT_WORKERS
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='root-worker')
+        self._lock = threading.Lock()
+        # 分组 -> 待执行的 (函数, 参数, Future)；队列清空后移除
+        self._queues: Dict[Hashable, Deque[Tuple[Callable, tuple, Future]]] = {}
+        # 有待执行任务且当前没有任务在执行的分组，按轮转顺序排列
+        self._ready: Deque[Hashable] = deque()
+        self._running = set()
+        self._timers: List[Tuple[float, int, ScheduledCall]] = []
+        self._timer_seq = itertools.count()
+        self._timer_cond = threading.Condition(self._lock)
+        self._idle_cond = threading.Condition(self._lock)
+        self._closed = False
+        self._timer_thread = threading.Thread(target=self._timer_loop, name='root-timer', daemon=True)
+        self._timer_thread.start()
+
+    def submit(self, key: Hashable, fn: Callable, *args) -> Future:
+        """提交一个任务，与同一分组的其他任务串行执行"""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("SharedWorkerPool is closed")
+            self._queues.setdefault(key, deque()).append((fn, args, future))
+            if key not in self._running and key not in self._ready:
+                self._ready.append(key)
+            self._dispatch()
+        return future
+
+    def _dispatch(self):
+        """(调用方持有锁) 把轮到的分组的下一个任务交给线程，同时执行的任务数不超过线程数"""
+        while self._ready and len(self._running) < self.max_workers:
+            key = self._ready.popleft()
+            fn, args, future = self._queues[key].popleft()
+            if not self._queues[key]:
+                del self._queues[key]
+            self._running.add(key)
+            self._executor.submit(self._run, key, fn, args, future)
+
+    def _run(self, key: Hashable, fn: Callable, args: tuple, future: Future):
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                self.logger.error(f"Task Failed: {key}, {str(e)}", exc_info=True)
+                future.set_exception(e)
+        with self._lock:
+            self._running.discard(key)
+            # 该分组还有任务时排到轮转队尾
+            if key in self._queues:
+                self._ready.append(key)
+            self._dispatch()
+            self._idle_cond.notify_all()
+
+    def join(self, key: Hashable, timeout: Optional[float] = None) -> bool:
+        """等待分组没有排队与正在执行的任务（不含未到期的延迟调用），返回是否在超时前完成"""
+        with self._idle_cond:
+            return self._idle_cond.wait_for(lambda: key not in self._queues and key not in self._running, timeout)
+
+    def call_later(self, delay: float, key: Hashable, fn: Callable, *args) -> ScheduledCall:
+        """delay秒后把任务提交到分组，返回可取消的句柄"""
+        call = ScheduledCall(time.monotonic() + delay, key, fn, args)
+        with self._timer_cond:
+            heapq.heappush(self._timers, (call.due, next(self._timer_seq), call))
+            self._timer_cond.notify()
+        return call
+
+    def _timer_loop(self):
+        with self._timer_cond:
+            while not self._closed:
+                now = time.monotonic()
+                while self._timers and (self._timers[0][2].cancelled or self._timers[0][0] <= now):
+                    _, _, call = heapq.heappop(self._timers)
+                    if not call.cancelled:
+                        self._queues.setdefault(call.key, deque()).append((call.fn, call.args, Future()))
+                        if call.key not in self._running and call.key not in self._ready:
+                            self._ready.append(call.key)
+                self._dispatch()
+                timeout = self._timers[0][0] - now if self._timers else None
+                self._timer_cond.wait(timeout)
+
+    def discard(self, key: Hashable):
+        """丢弃分组尚未开始的任务与未到期的延迟调用，正在执行的任务不受影响"""
+        with self._lock:
+            for _, _, future in self._queues.pop(key, ()):
+                future.cancel()
+            if key in self._ready:
+                self._ready.remove(key)
+            for _, _, call in self._timers:
+                if call.key == key:
+                    call.cancel()
+            self._idle_cond.notify_all()
+
+    def close(self, wait: bool = True):
+        """停止计时线程并关闭线程池，未开始的任务被丢弃"""
+        with self._timer_cond:
+            self._closed = True
+            for queue in self._queues.values():
+                for _, _, future in queue:
+                    future.cancel()
+            self._queues.clear()
+            self._ready.clear()
+            self._timer_cond.notify()
+        self._executor.shutdown(wait=wait)
+
+
+class IngestionService:
+    """
+    多个监控目录共用的入库调度器、流水线与分发线程
+
+    各目录的新建与修改文件以目录为分组进入同一个IndexScheduler，同一优先级内按权重轮转，
+    每个目录同时在流水线中的文件数受配额限制；分发线程出队后回调该目录注册的入库函数
+    """
+
+    # 入库流水线的队列容量，保持较小使排队主要发生在调度器中，新的编辑不会排在大量补录之后
+    PIPELINE_QUEUE_SIZE = 8
+    # 每个目录同时在流水线中的文件数上限
+    MAX_ACTIVE_PER_ROOT = 64
+    MIN_PARSE_WORKERS = 4
+
+    def __init__(self, indexer: 'FileIndexer', parser: 'FileParser', vector_store: 'VectorStore',
+                 max_active_per_root: Optional[int] = None):
+        """
+        初始化并启动分发线程
+
+        Args:
+            indexer: 文件索引
+            parser: 文件解析器
+            vector_store: 向量存储
+            max_active_per_root: 每个目录同时在流水线中的文件数上限，默认MAX_ACTIVE_PER_ROOT
+        """
+        self.logger = logging.getLogger(__name__)
+        self.scheduler = IndexScheduler(max_active_per_key=max_active_per_root or self.MAX_ACTIVE_PER_ROOT)
+        # 解析线程数不少于解析进程数，pdf、docx的解析能用满所有工作进程
+        self.pipeline = IngestionPipeline(indexer, parser, vector_store, queue_size=self.PIPELINE_QUEUE_SIZE,
+                                          parse_workers=max(self.MIN_PARSE_WORKERS, parser.parse_service.max_workers),
+                                          on_complete=self._on_complete)
+        # 目录 -> 入库函数，参数为文件路径，返回是否已交给流水线
+        self._ingest_functions: Dict[Hashable, Callable[[str], bool]] = {}
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name='ingest-dispatch', daemon=True)
+        self._dispatcher.start()
+
+    def register(self, root: Hashable, ingest: Callable[[str], bool], weight: int = 1):
+        """
+        注册一个监控目录
+
+        Args:
+            root: 目录（调度分组）
+            ingest: 入库函数，参数为文件路径，返回是否已交给流水线（结束时自动通知调度器）
+            weight: 同一优先级内的出队权重
+        """
+        self._ingest_functions[root] = ingest
+        self.scheduler.set_weight(root, weight)
+
+    def unregister(self, root: Hashable, drain: bool = True):
+        """
+        注销监控目录
+
+        Args:
+            drain: True时等待该目录排队与处理中的文件入库完毕，False时丢弃排队的文件
+        """
+        if drain:
+            self.scheduler.join(key=root)
+        self.scheduler.remove_key(root)
+        self._ingest_functions.pop(root, None)
+
+    def _dispatch_loop(self):
+        """按调度器给出的顺序把文件交给入库流水线，流水线队列已满时阻塞"""
+        while True:
+            task = self.scheduler.get()
+            if task is None:
+                return
+            ingest = self._ingest_functions.get(task.key)
+            try:
+                submitted = ingest is not None and ingest(task.path)
+            except Exception as e:
+                self.logger.error(f"Ingest Failed: {task.path}, {str(e)}", exc_info=True)
+                submitted = False
+            if not submitted:
+                self.scheduler.task_done(task.path)
+
+    def _on_complete(self, job: IngestJob):
+        self.scheduler.task_done(job.file_info.path)
+
+    def close(self, drain: bool = True):
+        """
+        关闭调度器与流水线
+
+        Args:
+            drain: 是否等待已排队与已提交的文件处理完毕
+        """
+        self.scheduler.close(drain=drain)
+        if not drain:
+            # 分发线程可能阻塞在已满的流水线队列上，先取消使其尽快返回
+            self.pipeline.cancel()
+        self._dispatcher.join()
+        self.pipeline.close(drain=drain)
@@ -0,0 +1,37 @@
+import asyncio
+import inspect
+
+from services.file_manager.async_file_indexer import AsyncFileIndexer
+from services.file_manager.file_indexer import FileIndexer
+
+
+def _dispatched_methods():
+    return (AsyncFileIndexer.READ_METHODS | AsyncFileIndexer.WRITE_METHODS |
+            AsyncFileIndexer.EXCLUSIVE_WRITE_METHODS | AsyncFileIndexer.STATIC_METHODS |
+            AsyncFileIndexer.WRITER_THREAD_METHODS)
+
+
+def test_facade_covers_file_indexer_public_methods():
+    """FileIndexer新增的公开方法必须归入某个分发集合，或由AsyncFileIndexer自行实现"""
+    public = {name for name, member in inspect.getmembers(FileIndexer, callable) if not name.startswith('_')}
+    own = {name for name in vars(AsyncFileIndexer) if not name.startswith('_')}
+    assert public - own - _dispatched_methods() == set()
+
+
+def test_dispatched_methods_exist_on_file_indexer():
+    assert _dispatched_methods() - set(dir(FileIndexer)) == set()
+
+
+def test_change_journal_through_facade(tmp_path):
+    root = str(tmp_path / 'root')
+
+    async def run():
+        indexer = AsyncFileIndexer(FileIndexer(str(tmp_path / 'index.db')))
+        seqs = await indexer.record_changes(root, [('a.txt', 1), ('b.txt', 2)])
+        assert [path for _, path, _ in await indexer.get_pending_changes(root)] == ['a.txt', 'b.txt']
+        await indexer.transaction(lambda sync_indexer: sync_indexer.acknowledge_changes([seqs['a.txt']]))
+        assert await indexer.get_change_checkpoint(root) == seqs['a.txt']
+        assert indexer.decode_cursor(indexer.encode_cursor('path', 'x'), 'path') == 'x'
+        await indexer.close(close_indexer=True)
+
+    asyncio.run(run())
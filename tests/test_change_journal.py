@@ -0,0 +1,60 @@
+import pytest
+
+from services.file_manager.file_indexer import FileIndexer
+from services.file_manager.index_scheduler import TaskPriority
+
+
+@pytest.fixture
+def indexer(tmp_path):
+    indexer = FileIndexer(str(tmp_path / 'index.db'))
+    yield indexer
+    indexer.close()
+
+
+def test_pending_changes_survive_reopen(tmp_path):
+    db_path = str(tmp_path / 'index.db')
+    indexer = FileIndexer(db_path)
+    seqs = indexer.record_changes('/root', [('/root/a', TaskPriority.BULK), ('/root/b', TaskPriority.RECENT)])
+    indexer.record_changes('/other', [('/other/c', TaskPriority.BULK)])
+    indexer.close()
+
+    indexer = FileIndexer(db_path)
+    try:
+        assert indexer.get_pending_changes('/root') == [
+            (seqs['/root/a'], '/root/a', TaskPriority.BULK),
+            (seqs['/root/b'], '/root/b', TaskPriority.RECENT),
+        ]
+    finally:
+        indexer.close()
+
+
+def test_acknowledge_advances_checkpoint(indexer):
+    assert indexer.get_change_checkpoint('/root') == 0
+    seqs = indexer.record_changes('/root', [('/root/a', TaskPriority.BULK), ('/root/b', TaskPriority.BULK)])
+    assert indexer.get_change_checkpoint('/root') == seqs['/root/a'] - 1
+
+    # 乱序确认：较早的记录未确认前检查点不前进
+    indexer.acknowledge_changes([seqs['/root/b']])
+    assert indexer.get_change_checkpoint('/root') == seqs['/root/a'] - 1
+    indexer.acknowledge_changes([seqs['/root/a']])
+    assert indexer.get_pending_changes('/root') == []
+    assert indexer.get_change_checkpoint('/root') == seqs['/root/b']
+
+
+def test_rerecorded_path_gets_new_seq_and_keeps_higher_priority(indexer):
+    first = indexer.record_changes('/root', [('/root/a', TaskPriority.INTERACTIVE)])['/root/a']
+    second = indexer.record_changes('/root', [('/root/a', TaskPriority.BULK)])['/root/a']
+    assert second > first
+    assert indexer.get_pending_changes('/root') == [(second, '/root/a', TaskPriority.INTERACTIVE)]
+
+    # 旧任务的确认不会删除入库期间产生的新记录
+    indexer.acknowledge_changes([first])
+    assert indexer.get_pending_changes('/root') == [(second, '/root/a', TaskPriority.INTERACTIVE)]
+    indexer.acknowledge_changes([second])
+    assert indexer.get_pending_changes('/root') == []
+
+
+def test_reset_clears_journal(indexer):
+    indexer.record_changes('/root', [('/root/a', TaskPriority.BULK)])
+    indexer.reset()
+    assert indexer.get_pending_changes('/root') == []
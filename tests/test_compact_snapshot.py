@@ -0,0 +1,122 @@
+import os
+import stat
+
+import pytest
+
+from utils.CompactSnapshot import CompactSnapshot
+
+DIR = stat.S_IFDIR | 0o755
+FILE = stat.S_IFREG | 0o644
+
+
+def _entries(**changes):
+    """/r 下两个目录与三个文件；changes按路径覆盖 (inode, 大小, 修改时间, st_mode)，inode为0表示去掉该路径"""
+    entries = {
+        '/r': (1, 0, 100, DIR),
+        '/r/a.txt': (2, 10, 100, FILE),
+        '/r/b.txt': (3, 20, 100, FILE),
+        '/r/sub': (4, 0, 100, DIR),
+        '/r/sub/c.txt': (5, 30, 100, FILE),
+    }
+    entries.update(changes)
+    return [(path, ino, 1, size, mtime, mode) for path, (ino, size, mtime, mode) in entries.items() if ino]
+
+
+def test_from_entries_sorts_and_keeps_last_entry_per_path():
+    snapshot = CompactSnapshot.from_entries([
+        ('/r/b', 2, 1, 5, 100, FILE),
+        ('/r/a', 1, 1, 5, 100, FILE),
+        ('/r/b', 3, 1, 7, 200, FILE),
+    ])
+    assert list(snapshot) == ['/r/a', '/r/b']
+    assert '/r/b' in snapshot and '/r/c' not in snapshot
+    assert snapshot.inode('/r/b') == (3, 1)
+    assert snapshot.size('/r/b') == 7
+    assert snapshot.mtime('/r/b') == 200 / 1e9
+    assert not snapshot.isdir('/r/a')
+
+
+def test_write_and_open_round_trip(tmp_path):
+    snapshot = CompactSnapshot.from_entries(_entries())
+    file_path = str(tmp_path / 'test.snap')
+    snapshot.write(file_path)
+    assert os.path.getsize(file_path) == snapshot.nbytes
+    with CompactSnapshot.open(file_path) as opened:
+        assert [opened.entry(index) for index in range(len(opened))] == \
+            [snapshot.entry(index) for index in range(len(snapshot))]
+        assert not opened.diff(snapshot).changed
+
+
+def test_open_rejects_truncated_file(tmp_path):
+    file_path = str(tmp_path / 'test.snap')
+    CompactSnapshot.from_entries(_entries()).write(file_path)
+    with open(file_path, 'r+b') as f:
+        f.truncate(os.path.getsize(file_path) - 1)
+    with pytest.raises(ValueError):
+        CompactSnapshot.open(file_path)
+
+
+def test_diff_created_deleted_modified():
+    ref = CompactSnapshot.from_entries(_entries())
+    snapshot = CompactSnapshot.from_entries(_entries(**{
+        '/r/a.txt': (2, 11, 200, FILE),
+        '/r/b.txt': (0, 0, 0, 0),
+        '/r/new.txt': (9, 1, 100, FILE),
+    }))
+    diff = snapshot.diff(ref)
+    assert diff.files_created == ['/r/new.txt']
+    assert diff.files_deleted == ['/r/b.txt']
+    assert diff.files_modified == ['/r/a.txt']
+    assert not diff.files_moved and not diff.dirs_created and not diff.dirs_deleted
+
+
+def test_diff_pairs_moves_by_inode():
+    ref = CompactSnapshot.from_entries(_entries())
+    snapshot = CompactSnapshot.from_entries(_entries(**{
+        '/r/a.txt': (0, 0, 0, 0),
+        '/r/renamed.txt': (2, 10, 100, FILE),
+        '/r/sub': (0, 0, 0, 0),
+        '/r/sub/c.txt': (0, 0, 0, 0),
+        '/r/moved': (4, 0, 100, DIR),
+        '/r/moved/c.txt': (5, 30, 100, FILE),
+    }))
+    diff = snapshot.diff(ref)
+    assert sorted(diff.files_moved) == [('/r/a.txt', '/r/renamed.txt'), ('/r/sub/c.txt', '/r/moved/c.txt')]
+    assert diff.dirs_moved == [('/r/sub', '/r/moved')]
+    assert not diff.files_created and not diff.files_deleted and not diff.files_modified
+
+
+def test_diff_replaced_path_is_deleted_and_created():
+    ref = CompactSnapshot.from_entries(_entries())
+    snapshot = CompactSnapshot.from_entries(_entries(**{'/r/a.txt': (7, 10, 100, FILE)}))
+    diff = snapshot.diff(ref)
+    assert diff.files_created == ['/r/a.txt']
+    assert diff.files_deleted == ['/r/a.txt']
+
+
+def test_diff_finds_changes_inside_skipped_blocks():
+    count = CompactSnapshot.DIFF_BLOCK_SIZE * 3
+    base = [(f'/r/{index:06d}', index + 10, 1, 1, 100, FILE) for index in range(count)]
+    changed = list(base)
+    changed[count // 2] = changed[count // 2][:4] + (200, FILE)
+    del changed[count - 5]
+    ref = CompactSnapshot.from_entries(base)
+    diff = CompactSnapshot.from_entries(changed).diff(ref)
+    assert diff.files_modified == [base[count // 2][0]]
+    assert diff.files_deleted == [base[count - 5][0]]
+    assert not diff.files_created
+
+
+def test_scan_uses_listdir_and_records_root(tmp_path):
+    (tmp_path / 'keep').mkdir()
+    (tmp_path / 'keep' / 'a.txt').write_text('a')
+    (tmp_path / 'skip').mkdir()
+    (tmp_path / 'skip' / 'b.txt').write_text('b')
+
+    def listdir(path):
+        return [entry for entry in os.scandir(path) if entry.name != 'skip']
+
+    snapshot = CompactSnapshot.scan(str(tmp_path), listdir=listdir)
+    assert set(snapshot) == {str(tmp_path), str(tmp_path / 'keep'), str(tmp_path / 'keep' / 'a.txt')}
+    assert snapshot.isdir(str(tmp_path / 'keep'))
+    assert snapshot.size(str(tmp_path / 'keep' / 'a.txt')) == 1
@@ -0,0 +1,24 @@
+import gc
+import threading
+
+from services.file_manager.connection_pool import ConnectionPool
+
+
+def _read_once(pool: ConnectionPool):
+    with pool.read() as conn:
+        conn.execute('SELECT 1').fetchone()
+
+
+def test_reader_closed_when_thread_exits(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'))
+    for _ in range(20):
+        thread = threading.Thread(target=_read_once, args=(pool,))
+        thread.start()
+        thread.join()
+    gc.collect()
+    assert len(pool._readers) == 0
+
+    _read_once(pool)
+    assert len(pool._readers) == 1
+    pool.close()
+    assert len(pool._readers) == 0
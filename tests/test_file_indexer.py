@@ -0,0 +1,62 @@
+import json
+import os
+import sqlite3
+from datetime import datetime
+from typing import List
+
+import pytest
+
+from services.file_manager.file_indexer import FileIndexer
+from services.file_manager.file_info import FileInfo, FileType
+
+
+def _file_info(path: str, document_ids: List[str]) -> FileInfo:
+    now = datetime.now()
+    return FileInfo(path=path, id=FileInfo.generate_id(path), name=os.path.basename(path),
+                    file_type=FileType.TEXT, size=0, created_at=now, modified_at=now,
+                    metadata={}, document_ids=document_ids, _skip_existence_check=True)
+
+
+@pytest.fixture
+def indexer(tmp_path):
+    indexer = FileIndexer(str(tmp_path / 'index.db'))
+    yield indexer
+    indexer.close()
+
+
+def test_modified_file_with_no_chunks_drops_document_mapping(indexer):
+    path = os.path.join(os.sep, 'root', 'a.txt')
+    indexer.create_indexes([_file_info(path, ['doc1', 'doc2'])])
+    file_id = indexer.get_id_by_path(path)
+    assert set(indexer.get_document_ids_by_file_id(file_id)) == {'doc1', 'doc2'}
+
+    # 修改后的文件解析为空，ID不变
+    indexer.create_indexes([_file_info(path, [])])
+    assert indexer.get_document_ids_by_file_id(file_id) == []
+    assert indexer.get_file_ids_by_document_ids(['doc1', 'doc2']) == []
+    assert indexer.search_by_document_ids(['doc1']) == []
+
+
+def test_upgrade_records_documents_of_removed_duplicate_paths(tmp_path):
+    db_file = str(tmp_path / 'legacy.db')
+    # 迁移机制引入之前的数据库：path没有唯一约束，存在重复路径
+    conn = sqlite3.connect(db_file)
+    FileIndexer._migrate_create_tables(conn.cursor())
+    path = os.path.join(os.sep, 'root', 'a.txt')
+    for file_id, document_ids in (('old', ['doc_old']), ('new', ['doc_new'])):
+        conn.execute('INSERT INTO file_index (id, path, document_ids) VALUES (?, ?, ?)',
+                     (file_id, path, json.dumps(document_ids)))
+        conn.executemany('INSERT INTO doc_file_mapping (document_id, file_id) VALUES (?, ?)',
+                         [(document_id, file_id) for document_id in document_ids])
+    conn.commit()
+    conn.close()
+
+    indexer = FileIndexer(db_file)
+    try:
+        assert indexer.get_id_by_path(path) == 'new'
+        assert indexer.get_orphaned_document_ids() == ['doc_old']
+        assert indexer.get_file_ids_by_document_ids(['doc_old']) == []
+        indexer.clear_orphaned_documents(['doc_old'])
+        assert indexer.get_orphaned_document_ids() == []
+    finally:
+        indexer.close()
@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+
+import pytest
+from watchdog.events import FileDeletedEvent
+
+from services.file_manager.file_indexer import FileIndexer
+from services.file_manager.file_scanner import FileScanner
+from services.file_manager.file_scanner_handler import FileScannerHandler
+from utils.SnapshotManager import SnapshotManager
+
+
+class _Document:
+    def __init__(self, content: str):
+        self.page_content = content
+        self.metadata = {}
+
+
+class _Parser:
+    class parse_service:
+        max_workers = 1
+
+    def __init__(self):
+        self.parsed = []
+
+    def parse_file_with_info(self, file_info):
+        self.parsed.append(file_info.path)
+        with open(file_info.path) as f:
+            return [_Document(f.read())]
+
+
+class _VectorStore:
+    def __init__(self):
+        self.ids = set()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, documents):
+        return [[0.0] for _ in documents]
+
+    def upsert_embedded_documents(self, documents, vectors, ids):
+        with self._lock:
+            self.ids.update(ids)
+
+    def delete_documents(self, ids):
+        with self._lock:
+            self.ids.difference_update(ids)
+
+
+@pytest.fixture
+def handler(tmp_path):
+    root = tmp_path / 'root'
+    root.mkdir()
+    (root / 'a.txt').write_text('a')
+    (root / 'a.txt.bak').write_text('backup')
+    indexer = FileIndexer(str(tmp_path / 'index.db'))
+    scanner = FileScanner()
+    scanner.snapshot_manager = SnapshotManager(str(tmp_path / 'snapshots'))
+    handler = FileScannerHandler(indexer, _Parser(), _VectorStore(), str(root), scanner=scanner,
+                                 audit_interval_seconds=None)
+    assert handler.wait_until_idle(10)
+    yield handler
+    handler.close()
+    indexer.close()
+
+
+def test_modified_file_with_same_prefix_sibling_is_reingested(handler):
+    path = os.path.join(handler.aim_path, 'a.txt')
+    old_document_ids = handler.indexer.search_by_path(path, recursive=False)[0].document_ids
+    with open(path, 'w') as f:
+        f.write('a changed')
+    os.utime(path, (time.time() + 10, time.time() + 10))
+
+    handler.parser.parsed.clear()
+    handler.reconcile()
+    assert handler.wait_until_idle(10)
+    assert handler.parser.parsed == [path]
+    new_document_ids = handler.indexer.search_by_path(path, recursive=False)[0].document_ids
+    assert new_document_ids and not set(old_document_ids) & handler.vector_store.ids
+
+
+def test_deleted_file_with_same_prefix_sibling_is_removed(handler):
+    path = os.path.join(handler.aim_path, 'a.txt')
+    os.remove(path)
+    handler.dispatch(FileDeletedEvent(path))
+    assert handler.wait_until_idle(10)
+    assert handler.indexer.search_by_path(path, recursive=False) == []
+    assert len(handler.indexer.search_by_path(path + '.bak', recursive=False)) == 1
+
+
+def test_audit_skips_reconcile_while_directory_unchanged(handler, monkeypatch):
+    reconciles = []
+    reconcile = handler.reconciler.reconcile
+    monkeypatch.setattr(handler.reconciler, 'reconcile',
+                        lambda *args, **kwargs: reconciles.append(args) or reconcile(*args, **kwargs))
+
+    # 第一次审计没有可比较的快照，全量对账并保存基准快照
+    handler.audit()
+    assert len(reconciles) == 1
+    handler.audit()
+    assert len(reconciles) == 1
+    assert handler.snapshot_manager._get_snapshot_files(handler.aim_path)
+
+    # 事件遗漏的修改由快照差异发现，触发对账并重新入库
+    path = os.path.join(handler.aim_path, 'a.txt')
+    with open(path, 'w') as f:
+        f.write('changed without an event')
+    os.utime(path, (time.time() + 10, time.time() + 10))
+    handler.parser.parsed.clear()
+    handler.audit()
+    assert len(reconciles) == 2
+    assert handler.wait_until_idle(10)
+    assert handler.parser.parsed == [path]
@@ -0,0 +1,104 @@
+import os
+
+import pytest
+
+from services.file_manager.ignore_rules import IgnoreRules
+
+
+def _write(path, text=''):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+@pytest.fixture
+def root(tmp_path):
+    return str(tmp_path / 'root')
+
+
+def _rules(root, gitignore: str) -> IgnoreRules:
+    _write(os.path.join(root, '.gitignore'), gitignore)
+    return IgnoreRules(root)
+
+
+def test_default_patterns(root):
+    rules = _rules(root, '')
+    assert rules.is_ignored(os.path.join(root, 'a.tmp'))
+    assert rules.is_ignored(os.path.join(root, '.git'), is_directory=True)
+    assert rules.is_ignored(os.path.join(root, 'node_modules', 'x', 'y.js'))
+    assert not rules.is_ignored(os.path.join(root, 'a.txt'))
+
+
+def test_negation_later_rule_wins(root):
+    rules = _rules(root, '*.log\n!keep.log\n')
+    assert rules.is_ignored(os.path.join(root, 'sub', 'a.log'))
+    assert not rules.is_ignored(os.path.join(root, 'sub', 'keep.log'))
+    # 重新包含内置规则忽略的文件
+    rules = _rules(root, '!.env\n')
+    assert not rules.is_ignored(os.path.join(root, '.env'))
+
+
+def test_cannot_reinclude_file_under_ignored_directory(root):
+    rules = _rules(root, 'build/\n!build/keep.txt\n')
+    assert rules.is_ignored(os.path.join(root, 'build', 'keep.txt'))
+
+
+def test_directory_only_rule(root):
+    rules = _rules(root, 'cache/\n')
+    assert rules.is_ignored(os.path.join(root, 'a', 'cache'), is_directory=True)
+    assert rules.is_ignored(os.path.join(root, 'a', 'cache', 'f.txt'))
+    assert not rules.is_ignored(os.path.join(root, 'a', 'cache'), is_directory=False)
+
+
+def test_anchoring(root):
+    rules = _rules(root, '/top.txt\ndocs/*.md\nany.txt\n')
+    assert rules.is_ignored(os.path.join(root, 'top.txt'))
+    assert not rules.is_ignored(os.path.join(root, 'sub', 'top.txt'))
+    assert rules.is_ignored(os.path.join(root, 'docs', 'a.md'))
+    assert not rules.is_ignored(os.path.join(root, 'sub', 'docs', 'a.md'))
+    assert not rules.is_ignored(os.path.join(root, 'docs', 'deep', 'a.md'))
+    assert rules.is_ignored(os.path.join(root, 'sub', 'deep', 'any.txt'))
+
+
+def test_double_star(root):
+    rules = _rules(root, '**/logs/*.txt\ndata/**\n')
+    assert rules.is_ignored(os.path.join(root, 'logs', 'a.txt'))
+    assert rules.is_ignored(os.path.join(root, 'x', 'y', 'logs', 'a.txt'))
+    assert rules.is_ignored(os.path.join(root, 'data', 'x', 'y.bin'))
+    assert not rules.is_ignored(os.path.join(root, 'x', 'data', 'y.bin'))
+
+
+def test_nested_ignore_file_scoped_and_higher_priority(root):
+    _write(os.path.join(root, 'sub', '.gitignore'), '!important.log\nlocal.txt\n')
+    rules = _rules(root, '*.log\n')
+    rules.load_directory(os.path.join(root, 'sub'))
+    assert not rules.is_ignored(os.path.join(root, 'sub', 'important.log'))
+    assert rules.is_ignored(os.path.join(root, 'other', 'important.log'))
+    assert rules.is_ignored(os.path.join(root, 'sub', 'deep', 'local.txt'))
+    assert not rules.is_ignored(os.path.join(root, 'local.txt'))
+
+
+def test_loading_a_directory_keeps_other_compiled_rules(root):
+    _write(os.path.join(root, 'a', '.gitignore'), 'x\n')
+    rules = _rules(root, '*.log\n')
+    root_rules = rules._rules['']
+    rules.load_directory(os.path.join(root, 'a'))
+    assert rules._rules[''] is root_rules
+
+
+def test_scandir_prunes_ignored_entries_and_loads_nested_files(root):
+    _write(os.path.join(root, 'keep.txt'))
+    _write(os.path.join(root, 'skip.log'))
+    _write(os.path.join(root, 'build', 'out.bin'))
+    _write(os.path.join(root, 'sub', '.gitignore'), 'secret.txt\n')
+    _write(os.path.join(root, 'sub', 'secret.txt'))
+    _write(os.path.join(root, 'sub', 'open.txt'))
+    rules = _rules(root, '*.log\nbuild/\n')
+    assert sorted(entry.name for entry in rules.scandir(root)) == ['keep.txt', 'sub']
+    assert [entry.name for entry in rules.scandir(os.path.join(root, 'sub'))] == ['open.txt']
+
+
+def test_paths_outside_root_are_not_ignored(root):
+    rules = _rules(root, '*\n')
+    assert rules.relative(root + '-other') is None
+    assert not rules.is_ignored(os.path.join(root + '-other', 'a.txt'))
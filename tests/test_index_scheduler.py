@@ -0,0 +1,113 @@
+from collections import Counter
+
+from services.file_manager.index_scheduler import IndexScheduler, TaskPriority
+
+
+def _drain(scheduler: IndexScheduler):
+    paths = []
+    while True:
+        task = scheduler.get(timeout=0)
+        if task is None:
+            return paths
+        paths.append(task.path)
+        scheduler.task_done(task.path)
+
+
+def test_higher_priority_first_fifo_within_priority():
+    scheduler = IndexScheduler()
+    scheduler.submit('bulk1', TaskPriority.BULK)
+    scheduler.submit('recent', TaskPriority.RECENT)
+    scheduler.submit('edit1', TaskPriority.INTERACTIVE)
+    scheduler.submit('edit2', TaskPriority.INTERACTIVE)
+    assert _drain(scheduler) == ['edit1', 'edit2', 'recent', 'bulk1']
+
+
+def test_resubmitting_queued_path_dedups_and_promotes():
+    scheduler = IndexScheduler()
+    assert scheduler.submit('a', TaskPriority.BULK)
+    scheduler.submit('b', TaskPriority.RECENT)
+    assert not scheduler.submit('a', TaskPriority.BULK)
+    assert not scheduler.submit('a', TaskPriority.INTERACTIVE)
+    assert scheduler.stats()['bulk']['depth'] == 0
+    task = scheduler.get(timeout=0)
+    assert (task.path, task.priority) == ('a', TaskPriority.INTERACTIVE)
+    scheduler.task_done('a')
+    assert _drain(scheduler) == ['b']
+
+
+def test_path_resubmitted_while_active_waits_for_task_done():
+    scheduler = IndexScheduler()
+    scheduler.submit('a', TaskPriority.RECENT)
+    assert scheduler.get(timeout=0).path == 'a'
+    assert scheduler.submit('a', TaskPriority.BULK)
+    assert not scheduler.submit('a', TaskPriority.INTERACTIVE)
+    assert scheduler.get(timeout=0) is None
+    scheduler.task_done('a')
+    task = scheduler.get(timeout=0)
+    assert (task.path, task.priority) == ('a', TaskPriority.INTERACTIVE)
+
+
+def test_weighted_round_robin_between_keys():
+    scheduler = IndexScheduler()
+    scheduler.set_weight('heavy', 2)
+    for index in range(30):
+        scheduler.submit(f'heavy{index}', TaskPriority.BULK, key='heavy')
+        scheduler.submit(f'light{index}', TaskPriority.BULK, key='light')
+    first = _drain(scheduler)[:30]
+    counts = Counter(path.rstrip('0123456789') for path in first)
+    assert counts == {'heavy': 20, 'light': 10}
+
+
+def test_aged_low_priority_task_gets_a_share():
+    scheduler = IndexScheduler(aging_seconds=0, aged_share=2)
+    for index in range(4):
+        scheduler.submit(f'edit{index}', TaskPriority.INTERACTIVE)
+    scheduler.submit('bulk', TaskPriority.BULK)
+    order = _drain(scheduler)
+    # 没有老化时补录排在所有编辑之后，老化后每两次出队至少有一次分给它
+    assert order.index('bulk') == 1
+
+
+def test_no_aging_before_threshold():
+    scheduler = IndexScheduler(aging_seconds=3600, aged_share=1)
+    scheduler.submit('bulk', TaskPriority.BULK)
+    for index in range(3):
+        scheduler.submit(f'edit{index}', TaskPriority.INTERACTIVE)
+    assert _drain(scheduler)[-1] == 'bulk'
+
+
+def test_active_quota_per_key():
+    scheduler = IndexScheduler(max_active_per_key=1)
+    scheduler.submit('a1', TaskPriority.RECENT, key='a')
+    scheduler.submit('a2', TaskPriority.RECENT, key='a')
+    scheduler.submit('b1', TaskPriority.BULK, key='b')
+    assert scheduler.get(timeout=0).path == 'a1'
+    # a达到配额，低优先级的b先出队
+    assert scheduler.get(timeout=0).path == 'b1'
+    assert scheduler.get(timeout=0) is None
+    scheduler.task_done('a1')
+    assert scheduler.get(timeout=0).path == 'a2'
+
+
+def test_discard_remove_key_and_close():
+    scheduler = IndexScheduler()
+    scheduler.submit('a', TaskPriority.BULK, key='x')
+    scheduler.submit('b', TaskPriority.BULK, key='y')
+    scheduler.submit('c', TaskPriority.BULK, key='y')
+    scheduler.discard('a')
+    scheduler.remove_key('y')
+    assert scheduler.get(timeout=0) is None
+    assert scheduler.join(timeout=0)
+
+    scheduler.submit('d', TaskPriority.BULK)
+    scheduler.close(drain=False)
+    assert scheduler.get(timeout=0) is None
+
+
+def test_close_with_drain_returns_remaining_tasks():
+    scheduler = IndexScheduler()
+    scheduler.submit('a', TaskPriority.BULK)
+    scheduler.close()
+    assert scheduler.get().path == 'a'
+    scheduler.task_done('a')
+    assert scheduler.get() is None
@@ -0,0 +1,77 @@
+import os
+import time
+
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+
+from services.file_manager.parse_service import ParseTimeoutError, ProcessParseService
+
+
+class _ScriptedParseService(ProcessParseService):
+    """按提交顺序依次在工作进程中执行给定的任务，用于模拟卡住、崩溃的解析"""
+
+    def __init__(self, tasks, **kwargs):
+        super().__init__(chunk_size=100, chunk_overlap=0, **kwargs)
+        self.tasks = list(tasks)
+        self.submitted = 0
+
+    def _task(self, file_path):
+        task = self.tasks[min(self.submitted, len(self.tasks) - 1)]
+        self.submitted += 1
+        return task
+
+
+def test_parse_runs_in_worker_process(tmp_path):
+    path = tmp_path / 'a.txt'
+    path.write_text('hello world')
+    service = ProcessParseService(chunk_size=100, chunk_overlap=0, max_workers=1)
+    try:
+        documents = service.parse(str(path))
+        assert [document.page_content for document in documents] == ['hello world']
+    finally:
+        service.close()
+
+
+def test_timeout_kills_worker_and_restarts_pool():
+    service = _ScriptedParseService([(time.sleep, (30,)), (os.getpid, ())], max_workers=1, task_timeout=1)
+    try:
+        start = time.monotonic()
+        with pytest.raises(ParseTimeoutError):
+            service.parse('stuck.pdf')
+        assert time.monotonic() - start < 10
+        hung_generation = service._generation
+        # 下一次解析在重建的进程池中正常执行
+        assert service.parse('next.pdf') != os.getpid()
+        assert service._generation == hung_generation
+    finally:
+        service.close()
+
+
+def test_broken_pool_is_rebuilt_and_task_retried():
+    service = _ScriptedParseService([(os._exit, (1,)), (os.getpid, ())], max_workers=1)
+    try:
+        assert service.parse('crash.pdf') != os.getpid()
+        assert service.submitted == 2
+        assert service._generation == 1
+    finally:
+        service.close()
+
+
+def test_repeated_crashes_raise_after_max_attempts():
+    service = _ScriptedParseService([(os._exit, (1,))], max_workers=1)
+    try:
+        with pytest.raises(BrokenProcessPool):
+            service.parse('crash.pdf')
+        assert service.submitted == ProcessParseService.MAX_ATTEMPTS
+    finally:
+        service.close()
+
+
+def test_workers_recycled_after_max_tasks_per_child():
+    service = _ScriptedParseService([(os.getpid, ())], max_workers=1, max_tasks_per_child=2)
+    try:
+        pids = [service.parse(f'{index}.pdf') for index in range(6)]
+        assert len(set(pids)) == 3
+        assert pids[0] == pids[1] and pids[2] == pids[3] and pids[4] == pids[5]
+    finally:
+        service.close()
@@ -0,0 +1,50 @@
+import os
+
+from services.file_manager.path_cache import PathCache
+
+
+def test_fill_is_dropped_after_a_concurrent_write():
+    cache = PathCache(max_entries=10)
+    generation = cache.generation
+    # 回源读取期间，删除提交并同步了缓存
+    cache.remove('/root/a.txt')
+    assert not cache.fill('/root/a.txt', 'stale', generation)
+    assert cache.lookup('/root/a.txt') == (False, None)
+
+    generation = cache.generation
+    assert cache.fill('/root/a.txt', 'id', generation)
+    assert cache.lookup('/root/a.txt') == (True, 'id')
+
+
+def test_complete_mode_degrades_to_lru_above_limit():
+    cache = PathCache(complete_limit=3)
+    cache.load([(f'/root/{index}', str(index)) for index in range(2)])
+    assert cache.complete and cache.subtree('/root/') is not None
+    cache.put_many([(f'/root/{index}', str(index)) for index in range(2, 5)])
+    assert not cache.complete and cache.bounded
+    assert cache.stats()['entries'] == 3
+    assert cache.subtree('/root/') is None
+    # LRU模式下未命中不可信
+    assert cache.lookup('/root/0') == (False, None)
+
+    cache.clear()
+    assert cache.complete and not cache.bounded
+
+
+def test_load_above_limit_keeps_latest_entries():
+    cache = PathCache(complete_limit=2)
+    cache.load([(os.path.join('/root', str(index)), str(index)) for index in range(5)])
+    assert not cache.complete
+    assert cache.lookup(os.path.join('/root', '4')) == (True, '4')
+    assert cache.lookup(os.path.join('/root', '0')) == (False, None)
+
+
+def test_sorted_subtree_follows_batch_writes():
+    cache = PathCache()
+    cache.load([('/root/a/1', '1'), ('/root/b/1', '2')])
+    assert [path for path, _ in cache.subtree('/root/')] == ['/root/a/1', '/root/b/1']
+    added = [(f'/root/a/x{index:03d}', str(index)) for index in range(PathCache.SORTED_BATCH_THRESHOLD + 1)]
+    cache.put_many(added)
+    cache.remove_many(path for path, _ in added[::2])
+    expected = sorted(['/root/a/1', '/root/b/1'] + [path for path, _ in added[1::2]])
+    assert [path for path, _ in cache.subtree('/root/')] == expected
@@ -0,0 +1,111 @@
+import os
+from datetime import datetime
+from typing import List
+
+import pytest
+
+from services.file_manager.file_indexer import FileIndexer
+from services.file_manager.file_info import FileInfo, FileType
+
+
+def _file_info(index: int) -> FileInfo:
+    path = os.path.join(os.sep, 'root', f'dir{index % 10}', f'file{index}.txt')
+    now = datetime.now()
+    return FileInfo(path=path, id=FileInfo.generate_id(path), name=os.path.basename(path),
+                    file_type=FileType.TEXT, size=index, created_at=now, modified_at=now,
+                    metadata={'author': f'author{index % 7}'}, document_ids=[f'doc{index}'],
+                    _skip_existence_check=True)
+
+
+@pytest.fixture
+def indexer(tmp_path):
+    indexer = FileIndexer(str(tmp_path / 'index.db'))
+    indexer.create_indexes([_file_info(index) for index in range(200)])
+    yield indexer
+    indexer.close()
+
+
+def test_hot_queries_use_indexes(indexer):
+    """热点查询不能退化为全表扫描"""
+    assert indexer.verify_query_plans() == {}
+
+
+def test_hot_queries_use_indexes_after_upgrade(tmp_path):
+    """关闭后重新打开（迁移已全部应用）时执行计划不变"""
+    FileIndexer(str(tmp_path / 'index.db')).close()
+    indexer = FileIndexer(str(tmp_path / 'index.db'))
+    try:
+        assert indexer.verify_query_plans() == {}
+    finally:
+        indexer.close()
+
+
+def test_verify_query_plans_reports_full_scans(indexer):
+    with indexer.transaction() as conn:
+        conn.execute('DROP INDEX idx_file_type')
+    assert set(indexer.verify_query_plans()) == {'search_by_type'}
+
+
+def _traced_statements(indexer: FileIndexer, call) -> List[str]:
+    """执行call期间读连接上执行的SQL（参数已展开）"""
+    statements = []
+    with indexer._pool.read() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            call()
+        finally:
+            conn.set_trace_callback(None)
+    return [statement for statement in statements if statement.lstrip().upper().startswith('SELECT')]
+
+
+@pytest.mark.parametrize('call', [
+    lambda indexer: indexer.get_id_by_path(_file_info(3).path),
+    lambda indexer: indexer.search_by_path(os.path.join(os.sep, 'root', 'dir3')),
+    lambda indexer: indexer.search_by_path(_file_info(3).path, recursive=False),
+    lambda indexer: indexer.search_by_filename('file3.txt', exact_match=True),
+    lambda indexer: indexer.search_by_type(FileType.TEXT.value),
+    lambda indexer: indexer.search_by_date_range(datetime(2000, 1, 1), datetime(2001, 1, 1)),
+    lambda indexer: indexer.search_by_size_range(10, 20),
+    lambda indexer: indexer.get_document_ids_by_file_id(_file_info(3).id),
+    lambda indexer: indexer.get_file_ids_by_document_ids(['doc3']),
+])
+def test_search_methods_do_not_scan(tmp_path, call):
+    """按方法实际执行的SQL检查执行计划，查询语句改动后退化为全表扫描时失败"""
+    # 禁用路径缓存，使路径查询落到数据库
+    indexer = FileIndexer(str(tmp_path / 'index.db'), path_cache_size=0)
+    try:
+        indexer.create_indexes([_file_info(index) for index in range(200)])
+        statements = _traced_statements(indexer, lambda: call(indexer))
+        assert statements
+        for statement in statements:
+            plan = indexer.explain_query_plan(statement)
+            assert not any(detail.startswith('SCAN') and 'USING' not in detail for detail in plan), \
+                (statement, plan)
+    finally:
+        indexer.close()
+
+
+def test_promoted_metadata_key_uses_index(indexer):
+    indexer.promote_metadata_key('author')
+    plan = indexer.explain_query_plan(f"SELECT * FROM file_index WHERE {indexer._metadata_clause('author')}",
+                                      ('author1',))
+    assert any('USING INDEX' in detail for detail in plan), plan
+
+
+def test_promoted_metadata_keys_differing_by_case(indexer):
+    lower = indexer.promote_metadata_key('author')
+    upper = indexer.promote_metadata_key('Author')
+    assert lower.lower() != upper.lower()
+    file_info = _file_info(500)
+    file_info.metadata = {'author': 'a', 'Author': 'b'}
+    indexer.create_indexes([file_info])
+    assert [f.path for f in indexer.search_by_metadata({'Author': 'b'})] == [file_info.path]
+    assert [f.path for f in indexer.search_by_metadata({'author': 'b'})] == []
+
+
+def test_promote_metadata_key_rejects_column_collision(indexer, monkeypatch):
+    indexer.promote_metadata_key('author')
+    monkeypatch.setattr(FileIndexer, '_metadata_column_name', staticmethod(lambda key: 'Name'))
+    with pytest.raises(ValueError):
+        indexer.promote_metadata_key('title')
+    assert 'title' not in indexer.get_promoted_metadata_keys()
@@ -0,0 +1,148 @@
+import os
+import stat
+from datetime import datetime, timedelta
+
+import pytest
+
+import utils.SnapshotManager as snapshot_manager_module
+from utils.CompactSnapshot import CompactSnapshot, SnapshotDelta
+from utils.SnapshotManager import SnapshotManager
+
+FILE = stat.S_IFREG | 0o644
+ROOT = '/r'
+
+
+def _snapshot(files):
+    """files: 路径 -> (inode, 大小, 修改时间)"""
+    return CompactSnapshot.from_entries(
+        (path, ino, 1, size, mtime, FILE) for path, (ino, size, mtime) in files.items())
+
+
+def _files(count=200):
+    return {f'{ROOT}/{index:04d}.txt': (index + 10, 1, 100) for index in range(count)}
+
+
+def _entries(snapshot):
+    return [snapshot.entry(index) for index in range(len(snapshot))]
+
+
+class _Clock(datetime):
+    """每次调用now前进一秒，避免同一秒内的保存互相取代"""
+    current = datetime(2024, 1, 1)
+
+    @classmethod
+    def now(cls, tz=None):
+        cls.current += timedelta(seconds=1)
+        return cls.current
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_manager_module, 'datetime', _Clock)
+    return SnapshotManager(str(tmp_path / 'snapshots'))
+
+
+def _extensions(manager):
+    return [os.path.splitext(path)[1] for path in manager._get_snapshot_files(ROOT)]
+
+
+def test_delta_apply_reproduces_snapshot(tmp_path):
+    files = _files(10)
+    ref = _snapshot(files)
+    files.pop(f'{ROOT}/0003.txt')
+    files[f'{ROOT}/0005.txt'] = (15, 2, 200)
+    files[f'{ROOT}/new.txt'] = (99, 1, 100)
+    snapshot = _snapshot(files)
+
+    delta = SnapshotDelta.between(snapshot, ref)
+    assert len(delta.upserts) == 2 and len(delta.removed) == 2
+    assert _entries(ref.apply(delta)) == _entries(snapshot)
+
+    file_path = str(tmp_path / 'test.delta')
+    delta.write(file_path)
+    assert os.path.getsize(file_path) == delta.nbytes
+    with SnapshotDelta.open(file_path) as opened:
+        assert _entries(ref.apply(opened)) == _entries(snapshot)
+        changes = opened.changes()
+        assert changes.files_created == [f'{ROOT}/new.txt']
+        assert changes.files_deleted == [f'{ROOT}/0003.txt']
+        assert changes.files_modified == [f'{ROOT}/0005.txt']
+
+
+def test_merged_delta_equals_applying_in_sequence():
+    files = _files(10)
+    first = _snapshot(files)
+    files[f'{ROOT}/tmp.txt'] = (50, 1, 100)
+    files[f'{ROOT}/0001.txt'] = (11, 2, 200)
+    files.pop(f'{ROOT}/0002.txt')
+    second = _snapshot(files)
+    # 第一次新增的文件又被删除、修改过的文件再次修改、删除的路径重新出现
+    files.pop(f'{ROOT}/tmp.txt')
+    files[f'{ROOT}/0001.txt'] = (11, 3, 300)
+    files[f'{ROOT}/0002.txt'] = (60, 1, 100)
+    third = _snapshot(files)
+
+    merged = SnapshotDelta.between(second, first).merge(SnapshotDelta.between(third, second))
+    assert _entries(first.apply(merged)) == _entries(third)
+    assert f'{ROOT}/tmp.txt' not in merged.upserts and f'{ROOT}/tmp.txt' not in merged.removed
+    assert _entries(first.apply(SnapshotDelta.empty())) == _entries(first)
+
+
+def test_save_writes_base_then_deltas(manager):
+    files = _files()
+    snapshots = []
+    for step in range(3):
+        files[f'{ROOT}/{step:04d}.txt'] = (step + 10, 2, 200 + step)
+        snapshots.append(_snapshot(files))
+        assert manager.save_snapshot(ROOT, snapshots[-1], force=True)
+    assert _extensions(manager) == ['.snap', '.delta', '.delta']
+
+    # 新的管理器没有缓存，从基准快照与增量链重建
+    reopened = SnapshotManager(manager.base_snapshot_dir)
+    with reopened.load_latest_snapshot(ROOT) as latest:
+        assert _entries(latest) == _entries(snapshots[-1])
+    timestamp = os.path.splitext(os.path.basename(manager._get_snapshot_files(ROOT)[1]))[0][len('snapshot_'):]
+    with reopened.get_snapshot(ROOT, timestamp) as middle:
+        assert _entries(middle) == _entries(snapshots[1])
+
+
+def test_chain_length_limit_starts_new_base(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_manager_module, 'datetime', _Clock)
+    manager = SnapshotManager(str(tmp_path / 'snapshots'), max_chain_length=2)
+    files = _files()
+    for step in range(5):
+        files[f'{ROOT}/{step:04d}.txt'] = (step + 10, 2, 200 + step)
+        manager.save_snapshot(ROOT, _snapshot(files), force=True)
+    assert _extensions(manager) == ['.snap', '.delta', '.delta', '.snap', '.delta']
+    with manager.load_latest_snapshot(ROOT) as latest:
+        assert _entries(latest) == _entries(_snapshot(files))
+
+
+def test_large_change_is_saved_as_full_snapshot(manager):
+    files = _files()
+    manager.save_snapshot(ROOT, _snapshot(files), force=True)
+    changed = {path: (ino, 5, 500) for path, (ino, _, _) in files.items()}
+    manager.save_snapshot(ROOT, _snapshot(changed), force=True)
+    assert _extensions(manager) == ['.snap', '.snap']
+
+
+def test_cleanup_keeps_base_of_retained_delta(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_manager_module, 'datetime', _Clock)
+    manager = SnapshotManager(str(tmp_path / 'snapshots'), max_snapshots=2)
+    files = _files()
+    for step in range(4):
+        files[f'{ROOT}/{step:04d}.txt'] = (step + 10, 2, 200 + step)
+        manager.save_snapshot(ROOT, _snapshot(files), force=True)
+    assert _extensions(manager) == ['.snap', '.delta', '.delta', '.delta']
+    with manager.load_latest_snapshot(ROOT) as latest:
+        assert _entries(latest) == _entries(_snapshot(files))
+
+
+def test_save_interval_and_reset(manager):
+    manager.save_interval = timedelta(hours=1)
+    assert manager.save_snapshot(ROOT, _snapshot(_files()))
+    assert manager.save_snapshot(ROOT, _snapshot(_files(5))) is None
+    manager.reset()
+    assert manager.load_latest_snapshot(ROOT) is None
+    assert manager.save_snapshot(ROOT, _snapshot(_files(5)))
+    assert _extensions(manager) == ['.snap']
@@ -0,0 +1,592 @@
+import mmap
+import operator
+import os
+import stat
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from itertools import repeat
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+# 文件头：魔数、格式版本、保留字段、条目数、路径区字节数
+_HEADER = struct.Struct('<8sIIQQ')
+# 按列存储的定长字段：(名称, array类型码, 每项字节数)
+_COLUMNS = (('ino', 'Q', 8), ('dev', 'Q', 8), ('size', 'q', 8), ('mtime_ns', 'q', 8), ('mode', 'I', 4))
+# 一个条目：路径、inode、设备号、大小、修改时间(ns)、st_mode
+SnapshotEntry = Tuple[str, int, int, int, int, int]
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _padding(size: int) -> bytes:
+    return bytes(_align(size) - size)
+
+
+def _write_atomic(file_path: str, chunks: Iterable):
+    """写入文件（先写临时文件再替换，写入中断不会留下不完整的文件）"""
+    temp_path = file_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, file_path)
+
+
+@dataclass
+class SnapshotDiff:
+    """两个快照之间的差异，字段名与watchdog的DirectorySnapshotDiff一致"""
+    files_created: List[str] = field(default_factory=list)
+    files_deleted: List[str] = field(default_factory=list)
+    files_modified: List[str] = field(default_factory=list)
+    files_moved: List[Tuple[str, str]] = field(default_factory=list)
+    dirs_created: List[str] = field(default_factory=list)
+    dirs_deleted: List[str] = field(default_factory=list)
+    dirs_modified: List[str] = field(default_factory=list)
+    dirs_moved: List[Tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return any(getattr(self, name) for name in self.__dataclass_fields__)
+
+
+class _PathTable:
+    """按下标访问已排序路径（字节形式）的只读序列，供二分查找使用"""
+
+    def __init__(self, blob: memoryview, offsets: memoryview):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> bytes:
+        # 每个路径以\0结尾，结尾符不属于路径
+        return bytes(self._blob[self._offsets[index]:self._offsets[index + 1] - 1])
+
+
+class _SnapshotBuilder:
+    """按路径顺序追加单个条目，或整段复制已有快照中连续的条目，生成快照文件内容"""
+
+    def __init__(self):
+        self._offsets = array('Q', [0])
+        # 各列的字节片段，build时一次拼接
+        self._column_data = {name: [] for name, _, _ in _COLUMNS}
+        # 逐条追加的条目先放在数组中，整段复制前再转为字节
+        self._pending = [array(typecode) for _, typecode, _ in _COLUMNS]
+        self._blob: List[bytes] = []
+        self._blob_size = 0
+        self._count = 0
+
+    def add(self, path: bytes, values: Tuple[int, ...]):
+        """追加一个条目，path为编码后的路径，values为各列的值"""
+        for column, value in zip(self._pending, values):
+            column.append(value)
+        self._blob.append(path + b'\0')
+        self._blob_size += len(path) + 1
+        self._offsets.append(self._blob_size)
+        self._count += 1
+
+    def copy(self, source: 'CompactSnapshot', start: int, end: int):
+        """整段复制source中[start, end)的条目，列数据与路径按字节复制，只需平移路径偏移"""
+        if start >= end:
+            return
+        self._flush()
+        for name, _, width in _COLUMNS:
+            self._column_data[name].append(bytes(source._column_bytes[name][start * width:end * width]))
+        first, last = source._offsets[start], source._offsets[end]
+        self._blob.append(bytes(source._blob[first:last]))
+        shift = self._blob_size - first
+        if shift:
+            self._offsets.extend(map(operator.add, source._offsets[start + 1:end + 1], repeat(shift)))
+        else:
+            self._offsets.extend(source._offsets[start + 1:end + 1])
+        self._blob_size += last - first
+        self._count += end - start
+
+    def _flush(self):
+        for (name, _, _), column in zip(_COLUMNS, self._pending):
+            if column:
+                if sys.byteorder != 'little':
+                    column.byteswap()
+                self._column_data[name].append(column.tobytes())
+                del column[:]
+
+    def build(self) -> bytes:
+        self._flush()
+        offsets = self._offsets
+        if sys.byteorder != 'little':
+            offsets = array('Q', offsets)
+            offsets.byteswap()
+        header = _HEADER.pack(CompactSnapshot.MAGIC, CompactSnapshot.FORMAT_VERSION, 0, self._count, self._blob_size)
+        parts = [header, _padding(len(header)), offsets.tobytes()]
+        size = _align(len(header)) + len(offsets) * 8
+        for name, _, width in _COLUMNS:
+            parts.append(_padding(size))
+            parts.extend(self._column_data[name])
+            size = _align(size) + self._count * width
+        parts.append(_padding(size))
+        parts.extend(self._blob)
+        return b''.join(parts)
+
+
+class CompactSnapshot:
+    """
+    紧凑的二进制目录快照，替代pickle保存的DirectorySnapshot
+
+    文件布局（小端）：文件头 | 路径偏移(count+1项) | inode | 设备号 | 大小 | 修改时间(ns) | st_mode | 路径区。
+    路径按编码后的字节排序，各以\\0结尾；定长字段按列连续存放并按8字节对齐。
+    打开文件时通过mmap按需读取，不需要把整个快照载入内存；两个快照的差异按路径顺序归并比较，
+    完全相同的连续区段按块整体比较后跳过
+    """
+
+    MAGIC = b'FMSNAP\r\n'
+    FORMAT_VERSION = 1
+    # 归并比较时整体比较的区段条目数
+    DIFF_BLOCK_SIZE = 1024
+
+    def __init__(self, buffer, mapped: Optional[mmap.mmap] = None):
+        """
+        从快照的二进制内容构造，一般通过scan、from_entries或open创建
+
+        Args:
+            buffer: 快照文件的完整内容（bytes、bytearray或mmap）
+            mapped: buffer为mmap时传入，close时关闭
+        """
+        # 先校验文件头与长度，再建立各区段的视图
+        if len(buffer) < _HEADER.size:
+            raise ValueError("快照文件不完整")
+        magic, version, _, count, blob_size = _HEADER.unpack_from(buffer)
+        if magic != self.MAGIC:
+            raise ValueError("不是快照文件")
+        if version != self.FORMAT_VERSION:
+            raise ValueError(f"不支持的快照格式版本: {version}")
+        sections = [(_align(_HEADER.size), (count + 1) * 8)]
+        for _, _, width in _COLUMNS:
+            sections.append((_align(sum(sections[-1])), count * width))
+        sections.append((_align(sum(sections[-1])), blob_size))
+        if sum(sections[-1]) != len(buffer):
+            raise ValueError("快照文件长度与文件头不一致")
+
+        self._mapped = mapped
+        self._view = memoryview(buffer)
+        views = [self._view[start:start + length] for start, length in sections]
+        self._offsets_bytes = views[0]
+        self._column_bytes = {name: view for (name, _, _), view in zip(_COLUMNS, views[1:-1])}
+        self._blob = views[-1]
+        self._count = count
+        self._offsets = self._cast(self._offsets_bytes, 'Q')
+        self._columns = {name: self._cast(self._column_bytes[name], typecode) for name, typecode, _ in _COLUMNS}
+        self._paths = _PathTable(self._blob, self._offsets)
+
+    @staticmethod
+    def _cast(view: memoryview, typecode: str):
+        if sys.byteorder == 'little':
+            return view.cast(typecode)
+        # 大端平台上无法直接映射，复制并转换字节序
+        values = array(typecode, view.tobytes())
+        values.byteswap()
+        return values
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[SnapshotEntry]) -> 'CompactSnapshot':
+        """由 (路径, inode, 设备号, 大小, 修改时间ns, st_mode) 条目构造内存中的快照，同一路径只保留最后一条"""
+        encoded = {os.fsencode(entry[0]): entry[1:] for entry in entries}
+        builder = _SnapshotBuilder()
+        for path in sorted(encoded):
+            if b'\0' in path:
+                raise ValueError("路径中不能包含\\0")
+            builder.add(path, encoded[path])
+        return cls(builder.build())
+
+    @classmethod
+    def from_directory_snapshot(cls, snapshot) -> 'CompactSnapshot':
+        """由watchdog的DirectorySnapshot转换（用于迁移旧的pickle快照）"""
+        def entries():
+            for path in snapshot.paths:
+                st = snapshot.stat_info(path)
+                yield path, st.st_ino, st.st_dev, st.st_size, st.st_mtime_ns, st.st_mode
+        return cls.from_entries(entries())
+
+    @classmethod
+    def scan(cls, root: str, listdir: Optional[Callable[[str], Iterable[os.DirEntry]]] = None) -> 'CompactSnapshot':
+        """
+        遍历目录建立快照，包含根目录本身与其下所有文件和目录
+
+        Args:
+            root: 根目录
+            listdir: 列目录函数，默认os.scandir；传入忽略规则的scandir时被忽略的目录不会进入
+        """
+        listdir = listdir or os.scandir
+
+        def entries():
+            st = os.stat(root)
+            yield root, st.st_ino, st.st_dev, st.st_size, st.st_mtime_ns, st.st_mode
+            stack = [root]
+            while stack:
+                dir_path = stack.pop()
+                try:
+                    children = list(listdir(dir_path))
+                except (FileNotFoundError, NotADirectoryError, PermissionError):
+                    # 遍历期间被删除或替换为文件的目录按空目录处理
+                    continue
+                for entry in children:
+                    path = os.path.join(dir_path, entry.name)
+                    try:
+                        st = entry.stat()
+                        if entry.is_dir() and not entry.is_symlink():
+                            stack.append(path)
+                    except OSError:
+                        continue
+                    yield path, st.st_ino, st.st_dev, st.st_size, st.st_mtime_ns, st.st_mode
+        return cls.from_entries(entries())
+
+    @classmethod
+    def open(cls, file_path: str) -> 'CompactSnapshot':
+        """以mmap方式打开快照文件，用完后应调用close"""
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError("快照文件为空")
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return cls(mapped, mapped)
+        except Exception:
+            mapped.close()
+            raise
+
+    def write(self, file_path: str):
+        """写入快照文件（先写临时文件再替换，写入中断不会留下不完整的快照）"""
+        _write_atomic(file_path, [self._view])
+
+    @property
+    def nbytes(self) -> int:
+        """快照文件的字节数"""
+        return len(self._view)
+
+    @property
+    def closed(self) -> bool:
+        return self._view is None
+
+    def close(self):
+        """释放缓冲区（mmap方式打开时关闭映射），之后不能再访问该快照"""
+        if self._view is None:
+            return
+        for view in (self._offsets, *self._columns.values(), self._offsets_bytes, *self._column_bytes.values(),
+                     self._blob, self._view):
+            if isinstance(view, memoryview):
+                view.release()
+        self._view = None
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+
+    def __enter__(self) -> 'CompactSnapshot':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _index(self, path: str) -> int:
+        encoded = os.fsencode(path)
+        index = bisect_left(self._paths, encoded)
+        if index == self._count or self._paths[index] != encoded:
+            raise KeyError(path)
+        return index
+
+    def __contains__(self, path: str) -> bool:
+        try:
+            self._index(path)
+            return True
+        except KeyError:
+            return False
+
+    def __iter__(self) -> Iterator[str]:
+        """按排序顺序逐个返回路径"""
+        for index in range(self._count):
+            yield os.fsdecode(self._paths[index])
+
+    @property
+    def paths(self) -> set:
+        """所有路径的集合（与DirectorySnapshot.paths一致，会把全部路径载入内存）"""
+        return set(self)
+
+    def entry(self, index: int) -> SnapshotEntry:
+        """第index个条目 (路径, inode, 设备号, 大小, 修改时间ns, st_mode)"""
+        return (os.fsdecode(self._paths[index]),) + self._values(index)
+
+    def _values(self, index: int) -> Tuple[int, ...]:
+        return tuple(self._columns[name][index] for name, _, _ in _COLUMNS)
+
+    def _find(self, path: bytes) -> Tuple[int, bool]:
+        """编码后的路径在路径表中的插入位置，以及该位置是否就是这个路径"""
+        index = bisect_left(self._paths, path)
+        return index, index < self._count and self._paths[index] == path
+
+    def subset(self, indices: Iterable[int]) -> 'CompactSnapshot':
+        """由指定下标（升序）的条目构造新的快照"""
+        builder = _SnapshotBuilder()
+        for index in indices:
+            builder.add(self._paths[index], self._values(index))
+        return CompactSnapshot(builder.build())
+
+    def apply(self, delta: 'SnapshotDelta') -> 'CompactSnapshot':
+        """
+        在本快照上应用增量，返回新的快照（内存中）
+
+        去掉delta.removed中的路径并按顺序插入delta.upserts的条目；其余条目整段按字节复制
+        """
+        skipped = set()
+        for index in range(len(delta.removed)):
+            position, found = self._find(delta.removed._paths[index])
+            if found:
+                skipped.add(position)
+        inserts = []
+        for index in range(len(delta.upserts)):
+            position, found = self._find(delta.upserts._paths[index])
+            if found:
+                skipped.add(position)
+            inserts.append((position, index))
+        # 在每个插入位置与被去掉的条目处切分，切分点之间的条目整段复制
+        stops = sorted(skipped.union(position for position, _ in inserts))
+        builder = _SnapshotBuilder()
+        start = 0
+        next_insert = 0
+        for stop in stops:
+            builder.copy(self, start, stop)
+            while next_insert < len(inserts) and inserts[next_insert][0] == stop:
+                index = inserts[next_insert][1]
+                builder.add(delta.upserts._paths[index], delta.upserts._values(index))
+                next_insert += 1
+            start = stop + 1 if stop in skipped else stop
+        builder.copy(self, start, self._count)
+        return CompactSnapshot(builder.build())
+
+    def inode(self, path: str) -> Tuple[int, int]:
+        """路径的 (inode, 设备号)"""
+        index = self._index(path)
+        return self._columns['ino'][index], self._columns['dev'][index]
+
+    def isdir(self, path: str) -> bool:
+        return stat.S_ISDIR(self._columns['mode'][self._index(path)])
+
+    def mtime(self, path: str) -> float:
+        return self._columns['mtime_ns'][self._index(path)] / 1e9
+
+    def size(self, path: str) -> int:
+        return self._columns['size'][self._index(path)]
+
+    def _block_equal(self, ref: 'CompactSnapshot', i: int, j: int, count: int) -> bool:
+        """本快照从i起与ref从j起的count个条目是否完全相同（复制为bytes后整体比较，比逐项比较memoryview快得多）"""
+        for name, _, width in _COLUMNS:
+            if bytes(self._column_bytes[name][i * width:(i + count) * width]) != \
+                    bytes(ref._column_bytes[name][j * width:(j + count) * width]):
+                return False
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + count]]) == \
+            bytes(ref._blob[ref._offsets[j]:ref._offsets[j + count]])
+
+    def _merge(self, ref: 'CompactSnapshot') -> Tuple[List[int], List[int], List[Tuple[int, int]]]:
+        """
+        按路径顺序归并比较本快照与ref
+
+        Returns:
+            (只在本快照中的下标, 只在ref中的下标, 路径相同但字段不同的 (本快照下标, ref下标))
+        """
+        created: List[int] = []
+        deleted: List[int] = []
+        changed: List[Tuple[int, int]] = []
+        i, j = 0, 0
+        count, ref_count = self._count, ref._count
+        while i < count and j < ref_count:
+            step = min(self.DIFF_BLOCK_SIZE, count - i, ref_count - j)
+            if step > 1 and self._block_equal(ref, i, j, step):
+                i += step
+                j += step
+                continue
+            # 区段中有差异，逐条归并同样多的步数后再尝试整体比较
+            for _ in range(step):
+                if i == count or j == ref_count:
+                    break
+                path, ref_path = self._paths[i], ref._paths[j]
+                if path == ref_path:
+                    if self._values(i) != ref._values(j):
+                        changed.append((i, j))
+                    i += 1
+                    j += 1
+                elif path < ref_path:
+                    created.append(i)
+                    i += 1
+                else:
+                    deleted.append(j)
+                    j += 1
+        created.extend(range(i, count))
+        deleted.extend(range(j, ref_count))
+        return created, deleted, changed
+
+    def diff(self, ref: 'CompactSnapshot') -> SnapshotDiff:
+        """
+        计算从ref到本快照的变化
+
+        两个快照都按路径排序，归并遍历一次即可得到新增、删除与可能修改的路径；
+        同一路径的inode变化视为删除后新建，新增与删除的条目再按inode配对为移动
+        """
+        created, deleted, changed = self._merge(ref)
+        columns, ref_columns = self._columns, ref._columns
+        modified = []
+        for i, j in changed:
+            if columns['ino'][i] != ref_columns['ino'][j] or columns['dev'][i] != ref_columns['dev'][j]:
+                created.append(i)
+                deleted.append(j)
+            elif columns['mtime_ns'][i] != ref_columns['mtime_ns'][j] or columns['size'][i] != ref_columns['size'][j]:
+                modified.append(i)
+        created.sort()
+        deleted.sort()
+
+        result = SnapshotDiff()
+        deleted_by_inode = {(ref_columns['ino'][index], ref_columns['dev'][index]): index for index in deleted}
+        moved_from = set()
+        for index in created:
+            path = os.fsdecode(self._paths[index])
+            is_dir = stat.S_ISDIR(columns['mode'][index])
+            ref_index = deleted_by_inode.get((columns['ino'][index], columns['dev'][index]))
+            if ref_index is not None and ref_index not in moved_from and \
+                    stat.S_ISDIR(ref_columns['mode'][ref_index]) == is_dir:
+                moved_from.add(ref_index)
+                move = (os.fsdecode(ref._paths[ref_index]), path)
+                (result.dirs_moved if is_dir else result.files_moved).append(move)
+                if columns['mtime_ns'][index] != ref_columns['mtime_ns'][ref_index] or \
+                        columns['size'][index] != ref_columns['size'][ref_index]:
+                    (result.dirs_modified if is_dir else result.files_modified).append(path)
+            else:
+                (result.dirs_created if is_dir else result.files_created).append(path)
+        for index in deleted:
+            if index not in moved_from:
+                path = os.fsdecode(ref._paths[index])
+                (result.dirs_deleted if stat.S_ISDIR(ref_columns['mode'][index]) else result.files_deleted).append(path)
+        for index in modified:
+            path = os.fsdecode(self._paths[index])
+            (result.dirs_modified if stat.S_ISDIR(columns['mode'][index]) else result.files_modified).append(path)
+        return result
+
+    def __sub__(self, ref: 'CompactSnapshot') -> SnapshotDiff:
+        return self.diff(ref)
+
+
+class SnapshotDelta:
+    """
+    相邻两个快照之间的增量：upserts为新增或字段变化后的条目，removed为被删除或被替换的旧条目
+
+    旧快照去掉removed中的路径、再按顺序插入upserts即得到新快照。两部分都是CompactSnapshot，
+    文件布局为：文件头 | upserts | removed（各按8字节对齐）。大小与变化量成正比，与目录规模无关
+    """
+
+    MAGIC = b'FMDELTA\n'
+    FORMAT_VERSION = 1
+    # 文件头：魔数、格式版本、保留字段、upserts字节数、removed字节数
+    _HEADER = struct.Struct('<8sIIQQ')
+
+    def __init__(self, upserts: CompactSnapshot, removed: CompactSnapshot, mapped: Optional[mmap.mmap] = None):
+        self.upserts = upserts
+        self.removed = removed
+        self._mapped = mapped
+
+    @classmethod
+    def between(cls, snapshot: CompactSnapshot, ref: CompactSnapshot) -> 'SnapshotDelta':
+        """计算从ref到snapshot的增量"""
+        created, deleted, changed = snapshot._merge(ref)
+        upserts = sorted(created + [i for i, _ in changed])
+        removed = sorted(deleted + [j for _, j in changed])
+        return cls(snapshot.subset(upserts), ref.subset(removed))
+
+    @classmethod
+    def empty(cls) -> 'SnapshotDelta':
+        """没有变化的增量"""
+        return cls(CompactSnapshot.from_entries([]), CompactSnapshot.from_entries([]))
+
+    @classmethod
+    def open(cls, file_path: str) -> 'SnapshotDelta':
+        """以mmap方式打开增量文件，用完后应调用close"""
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < cls._HEADER.size:
+                raise ValueError("增量文件不完整")
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        parts = []
+        try:
+            magic, version, _, upserts_size, removed_size = cls._HEADER.unpack_from(view)
+            if magic != cls.MAGIC:
+                raise ValueError("不是增量文件")
+            if version != cls.FORMAT_VERSION:
+                raise ValueError(f"不支持的增量格式版本: {version}")
+            upserts_start = _align(cls._HEADER.size)
+            removed_start = _align(upserts_start + upserts_size)
+            if removed_start + removed_size != len(view):
+                raise ValueError("增量文件长度与文件头不一致")
+            for start, size in ((upserts_start, upserts_size), (removed_start, removed_size)):
+                part = view[start:start + size]
+                try:
+                    parts.append(CompactSnapshot(part))
+                finally:
+                    part.release()
+        except Exception:
+            for part in parts:
+                part.close()
+            view.release()
+            mapped.close()
+            raise
+        view.release()
+        return cls(parts[0], parts[1], mapped)
+
+    def write(self, file_path: str):
+        """写入增量文件（先写临时文件再替换）"""
+        header = self._HEADER.pack(self.MAGIC, self.FORMAT_VERSION, 0, self.upserts.nbytes, self.removed.nbytes)
+        _write_atomic(file_path, [header, _padding(len(header)), self.upserts._view,
+                                  _padding(self.upserts.nbytes), self.removed._view])
+
+    @property
+    def nbytes(self) -> int:
+        """增量文件的字节数"""
+        return _align(self._HEADER.size) + _align(self.upserts.nbytes) + self.removed.nbytes
+
+    def __len__(self) -> int:
+        return len(self.upserts) + len(self.removed)
+
+    def merge(self, later: 'SnapshotDelta') -> 'SnapshotDelta':
+        """
+        与紧随其后的增量合并为一个增量（内存中），应用结果与依次应用两者相同
+
+        合并只涉及变化的条目，连续多个增量先合并再应用，基准快照只需整体复制一次
+        """
+        later_removed = {path for path in later.removed}
+        upserts = [entry for entry in map(self.upserts.entry, range(len(self.upserts)))
+                   if entry[0] not in later_removed]
+        upserts.extend(map(later.upserts.entry, range(len(later.upserts))))
+        # 先新增后又删除的条目不在基准快照中；removed中保留基准快照里的旧条目
+        upserted = {path for path in self.upserts}
+        removed = [entry for entry in map(later.removed.entry, range(len(later.removed))) if entry[0] not in upserted]
+        removed.extend(map(self.removed.entry, range(len(self.removed))))
+        return SnapshotDelta(CompactSnapshot.from_entries(upserts), CompactSnapshot.from_entries(removed))
+
+    def changes(self) -> SnapshotDiff:
+        """增量对应的新增、删除、修改与移动"""
+        return self.upserts.diff(self.removed)
+
+    def close(self):
+        """释放缓冲区（mmap方式打开时关闭映射）"""
+        self.upserts.close()
+        self.removed.close()
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+
+    def __enter__(self) -> 'SnapshotDelta':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -3,14 +3,39 @@ import os
 import pickle
 import shutil
 from datetime import datetime, timedelta
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Tuple, Union
 from watchdog.utils.dirsnapshot import DirectorySnapshot
 
+from utils.CompactSnapshot import CompactSnapshot, SnapshotDelta
+
+
+class _LegacySnapshotUnpickler(pickle.Unpickler):
+    """只允许还原DirectorySnapshot及其stat信息的反序列化器，用于读取旧版pickle快照"""
+
+    ALLOWED_GLOBALS = {
+        ('watchdog.utils.dirsnapshot', 'DirectorySnapshot'),
+        ('os', 'stat_result'), ('posix', 'stat_result'), ('nt', 'stat_result'),
+        ('os', 'stat'), ('posix', 'stat'), ('nt', 'stat'),
+        ('os', 'scandir'), ('posix', 'scandir'), ('nt', 'scandir'),
+    }
+
+    def find_class(self, module, name):
+        if (module, name) not in self.ALLOWED_GLOBALS:
+            raise pickle.UnpicklingError(f"快照中包含不允许的对象: {module}.{name}")
+        return super().find_class(module, name)
+
 
 class SnapshotManager:
+    # 快照文件扩展名：.snap为完整的基准快照，.delta为相对上一个快照的增量；.pkl为旧版pickle格式，仅在加载时读取并迁移
+    SNAPSHOT_EXTENSION = '.snap'
+    DELTA_EXTENSION = '.delta'
+    LEGACY_EXTENSION = '.pkl'
+
     def __init__(self, base_snapshot_dir: str = ".snapshots",
                  save_interval: timedelta = timedelta(minutes=15),
-                 max_snapshots: int = 24):
+                 max_snapshots: int = 24,
+                 compact_ratio: float = 0.5,
+                 max_chain_length: int = 24):
         """
         初始化快照管理器
 
@@ -18,10 +43,14 @@ class SnapshotManager:
             base_snapshot_dir: 快照文件存储目录
             save_interval: 保存快照的时间间隔
             max_snapshots: 最大保存的快照数量
+            compact_ratio: 基准快照之后的增量累计大小超过基准快照的该比例时，改为保存新的基准快照
+            max_chain_length: 一个基准快照之后最多的增量数，限制重建某一时刻的快照需要应用的增量数
         """
         self.base_snapshot_dir = base_snapshot_dir
         self.save_interval = save_interval
         self.max_snapshots = max_snapshots
+        self.compact_ratio = compact_ratio
+        self.max_chain_length = max_chain_length
 
         # 创建快照存储目录
         if not os.path.exists(base_snapshot_dir):
@@ -29,12 +58,15 @@ class SnapshotManager:
 
         # 为每个路径记录最后保存时间
         self.last_save_times: Dict[str, datetime] = {}
+        # 每个路径最后保存的快照文件与其内容，用于计算下一个增量，不必从磁盘重建
+        self._latest: Dict[str, Tuple[str, CompactSnapshot]] = {}
 
     def reset(self):
         """
         重置快照管理器
         """
         self.last_save_times.clear()
+        self._latest.clear()
 
         if not os.path.exists(self.base_snapshot_dir):
             os.makedirs(self.base_snapshot_dir)
@@ -104,16 +136,20 @@ class SnapshotManager:
         if timestamp is None:
             timestamp = datetime.now()
         snapshot_dir = self._get_path_snapshot_dir(aim_path)
-        filename = f"snapshot_{timestamp.strftime('%Y%m%d_%H%M%S')}.pkl"
+        filename = f"snapshot_{timestamp.strftime('%Y%m%d_%H%M%S')}{self.SNAPSHOT_EXTENSION}"
         return os.path.join(snapshot_dir, filename)
 
-    def save_snapshot(self, aim_path: str, snapshot: DirectorySnapshot, force: bool = False) -> Optional[str]:
+    def save_snapshot(self, aim_path: str, snapshot: Union[CompactSnapshot, DirectorySnapshot],
+                      force: bool = False) -> Optional[str]:
         """
         保存目录快照
 
+        已有基准快照时只保存相对上一个快照的增量（.delta），写入量与变化量成正比；
+        增量链累计大小或长度超过阈值时改为保存完整的基准快照（.snap），之前的链不再被之后的快照依赖
+
         Args:
             aim_path: 监控的目录路径
-            snapshot: 要保存的DirectorySnapshot对象
+            snapshot: 要保存的快照，DirectorySnapshot会先转换为CompactSnapshot
             force: 是否强制保存，忽略时间间隔
 
         Returns:
@@ -130,8 +166,19 @@ class SnapshotManager:
         # 保存快照
         snapshot_path = self.get_snapshot_path(aim_path, current_time)
         try:
-            with open(snapshot_path, 'wb') as f:
-                pickle.dump(snapshot, f)
+            if isinstance(snapshot, DirectorySnapshot):
+                snapshot = CompactSnapshot.from_directory_snapshot(snapshot)
+            try:
+                delta = self._make_delta(aim_path, snapshot, snapshot_path)
+            except (OSError, ValueError, pickle.UnpicklingError) as e:
+                print(f"Warning: Failed to build snapshot delta for {aim_path}, saving a full snapshot: {str(e)}")
+                delta = None
+            if delta is None:
+                snapshot.write(snapshot_path)
+            else:
+                snapshot_path = snapshot_path[:-len(self.SNAPSHOT_EXTENSION)] + self.DELTA_EXTENSION
+                delta.write(snapshot_path)
+            self._latest[aim_path] = (snapshot_path, snapshot)
 
             self.last_save_times[aim_path] = current_time
             self.cleanup_old_snapshots(aim_path)
@@ -140,28 +187,107 @@ class SnapshotManager:
             print(f"Error saving snapshot for {aim_path}: {str(e)}")
             return None
 
-    def load_latest_snapshot(self, aim_path: str) -> Optional[DirectorySnapshot]:
+    def _make_delta(self, aim_path: str, snapshot: CompactSnapshot, snapshot_path: str) -> Optional[SnapshotDelta]:
+        """
+        计算相对上一个快照的增量
+
+        Returns:
+            Optional[SnapshotDelta]: 增量；没有可依赖的基准快照或需要压缩增量链时返回None，此时应保存完整快照
+        """
+        snapshot_files = self._get_snapshot_files(aim_path)
+        if snapshot_files and self._get_snapshot_stem(snapshot_files[-1]) == self._get_snapshot_stem(snapshot_path):
+            # 同一秒内重复保存：新快照取代上一个文件（之后没有依赖它的增量）
+            os.remove(snapshot_files.pop())
+            self._latest.pop(aim_path, None)
+
+        base_index = self._get_base_index(snapshot_files, len(snapshot_files) - 1)
+        if base_index is None or len(snapshot_files) - base_index > self.max_chain_length:
+            return None
+        base_size = os.path.getsize(snapshot_files[base_index])
+        chain_size = sum(os.path.getsize(file_path) for file_path in snapshot_files[base_index + 1:])
+
+        latest_path, previous = self._latest.get(aim_path, (None, None))
+        cached = latest_path == snapshot_files[-1] and not previous.closed
+        if not cached:
+            previous = self._reconstruct(snapshot_files, len(snapshot_files) - 1)
+        try:
+            delta = SnapshotDelta.between(snapshot, previous)
+        finally:
+            if not cached:
+                previous.close()
+        if chain_size + delta.nbytes > self.compact_ratio * base_size:
+            return None
+        return delta
+
+    def _get_base_index(self, snapshot_files: List[str], index: int) -> Optional[int]:
+        """第index个快照所依赖的基准快照（它本身或之前最近的完整快照）的下标，不存在时返回None"""
+        while index >= 0 and snapshot_files[index].endswith(self.DELTA_EXTENSION):
+            index -= 1
+        return index if index >= 0 else None
+
+    def _reconstruct(self, snapshot_files: List[str], index: int) -> CompactSnapshot:
+        """
+        重建第index个快照：打开它所依赖的基准快照，把之后的增量合并为一个后应用
+
+        Returns:
+            CompactSnapshot: 重建的快照，用完后应调用close
+        """
+        base_index = self._get_base_index(snapshot_files, index)
+        if base_index is None:
+            raise ValueError(f"增量快照缺少基准快照: {snapshot_files[index]}")
+        delta_paths = snapshot_files[base_index + 1:index + 1]
+        delta = SnapshotDelta.empty()
+        for delta_path in delta_paths:
+            with SnapshotDelta.open(delta_path) as later:
+                delta = delta.merge(later)
+        snapshot = self._load_snapshot_file(snapshot_files[base_index])
+        if not delta_paths:
+            return snapshot
+        with snapshot:
+            return snapshot.apply(delta)
+
+    def load_latest_snapshot(self, aim_path: str) -> Optional[CompactSnapshot]:
         """
-        加载最新的快照
+        加载最新的快照（基准快照与之后的增量合成）
 
         Args:
             aim_path: 监控的目录路径
 
         Returns:
-            Optional[DirectorySnapshot]: 最新的快照对象，如果没有则返回None
+            Optional[CompactSnapshot]: 最新的快照对象（用完后应调用close），如果没有则返回None
         """
         snapshot_files = self._get_snapshot_files(aim_path)
         if not snapshot_files:
             return None
 
-        latest_snapshot_path = snapshot_files[-1]
         try:
-            with open(latest_snapshot_path, 'rb') as f:
-                return pickle.load(f)
+            return self._reconstruct(snapshot_files, len(snapshot_files) - 1)
         except Exception as e:
             print(f"Error loading snapshot for {aim_path}: {str(e)}")
             return None
 
+    def _load_snapshot_file(self, snapshot_path: str) -> CompactSnapshot:
+        """
+        打开快照文件；旧版pickle快照转换为新格式写入同名.snap文件后删除原文件
+
+        Args:
+            snapshot_path: 快照文件路径
+        """
+        if not snapshot_path.endswith(self.LEGACY_EXTENSION):
+            return CompactSnapshot.open(snapshot_path)
+
+        with open(snapshot_path, 'rb') as f:
+            legacy_snapshot = _LegacySnapshotUnpickler(f).load()
+        if not isinstance(legacy_snapshot, DirectorySnapshot):
+            raise pickle.UnpicklingError(f"不是目录快照: {type(legacy_snapshot).__name__}")
+        migrated_path = snapshot_path[:-len(self.LEGACY_EXTENSION)] + self.SNAPSHOT_EXTENSION
+        CompactSnapshot.from_directory_snapshot(legacy_snapshot).write(migrated_path)
+        try:
+            os.remove(snapshot_path)
+        except OSError as e:
+            print(f"Warning: Failed to delete migrated snapshot {snapshot_path}: {str(e)}")
+        return CompactSnapshot.open(migrated_path)
+
     def cleanup_old_snapshots(self, aim_path: str):
         """
         清理特定路径的旧快照文件
@@ -171,14 +297,16 @@ class SnapshotManager:
         """
         snapshot_files = self._get_snapshot_files(aim_path)
         if len(snapshot_files) > self.max_snapshots:
-            files_to_delete = snapshot_files[:-self.max_snapshots]
+            # 保留的最早一个快照是增量时，它依赖的基准快照与之间的增量也要保留
+            keep_from = self._get_base_index(snapshot_files, len(snapshot_files) - self.max_snapshots) or 0
+            files_to_delete = snapshot_files[:keep_from]
             for file_path in files_to_delete:
                 try:
                     os.remove(file_path)
                 except OSError as e:
                     print(f"Warning: Failed to delete old snapshot {file_path}: {str(e)}")
 
-    def get_snapshot(self, aim_path: str, timestamp_str: str) -> Optional[DirectorySnapshot]:
+    def get_snapshot(self, aim_path: str, timestamp_str: str) -> Optional[CompactSnapshot]:
         """
         获取指定时间戳的快照
 
@@ -187,18 +315,17 @@ class SnapshotManager:
             timestamp_str: 快照时间戳字符串，格式为'YYYYMMDD_HHMMSS'
 
         Returns:
-            Optional[DirectorySnapshot]: 找到的快照对象，如果不存在返回None
+            Optional[CompactSnapshot]: 找到的快照对象（用完后应调用close），如果不存在返回None
         """
-        snapshot_dir = self._get_path_snapshot_dir(aim_path)
-        snapshot_path = os.path.join(snapshot_dir, f"snapshot_{timestamp_str}.pkl")
-        if not os.path.exists(snapshot_path):
+        snapshot_files = self._get_snapshot_files(aim_path)
+        index = self._find_snapshot_index(snapshot_files, timestamp_str)
+        if index is None:
             print(f"Snapshot not found for {aim_path}: {timestamp_str}")
             return None
 
         try:
-            with open(snapshot_path, 'rb') as f:
-                return pickle.load(f)
-        except (pickle.UnpicklingError, EOFError, AttributeError) as e:
+            return self._reconstruct(snapshot_files, index)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ValueError, OSError) as e:
             print(f"Error loading snapshot {timestamp_str} for {aim_path}: {e}")
             return None
 
@@ -213,16 +340,27 @@ class SnapshotManager:
         Returns:
             bool: 是否成功删除
         """
-        snapshot_dir = self._get_path_snapshot_dir(aim_path)
-        snapshot_path = os.path.join(snapshot_dir, f"snapshot_{timestamp_str}.pkl")
-        if not os.path.exists(snapshot_path):
+        snapshot_files = self._get_snapshot_files(aim_path)
+        index = self._find_snapshot_index(snapshot_files, timestamp_str)
+        if index is None:
             print(f"Snapshot not found for {aim_path}: {timestamp_str}")
             return False
 
         try:
-            os.remove(snapshot_path)
+            if index + 1 < len(snapshot_files) and snapshot_files[index + 1].endswith(self.DELTA_EXTENSION):
+                # 之后的增量依赖这个快照，先把紧随其后的快照重建为基准快照
+                following_path = snapshot_files[index + 1]
+                with self._reconstruct(snapshot_files, index + 1) as following:
+                    following.write(following_path[:-len(self.DELTA_EXTENSION)] + self.SNAPSHOT_EXTENSION)
+                os.remove(following_path)
+            # 旧版快照在重建时已迁移为.snap，按时间戳删除
+            stem_path = os.path.splitext(snapshot_files[index])[0]
+            for extension in (self.SNAPSHOT_EXTENSION, self.DELTA_EXTENSION, self.LEGACY_EXTENSION):
+                if os.path.exists(stem_path + extension):
+                    os.remove(stem_path + extension)
+            self._latest.pop(aim_path, None)
             return True
-        except OSError as e:
+        except (OSError, ValueError, pickle.UnpicklingError) as e:
             print(f"Error deleting snapshot {timestamp_str} for {aim_path}: {e}")
             return False
 
@@ -260,14 +398,15 @@ class SnapshotManager:
                 filename = os.path.basename(filepath)
                 try:
                     timestamp = datetime.strptime(
-                        filename[9:-4],
+                        os.path.splitext(filename)[0][9:],
                         '%Y%m%d_%H%M%S'
                     )
                     file_size = os.path.getsize(filepath)
                     snapshot_info.append({
                         'timestamp': timestamp,
                         'file_size': file_size,
-                        'path': filepath
+                        'path': filepath,
+                        'is_delta': filepath.endswith(self.DELTA_EXTENSION)
                     })
                 except (ValueError, OSError) as e:
                     print(f"Error getting info for snapshot {filename}: {e}")
@@ -292,5 +431,25 @@ class SnapshotManager:
         """
         snapshot_dir = self._get_path_snapshot_dir(aim_path)
         files = [os.path.join(snapshot_dir, f) for f in os.listdir(snapshot_dir)
-                 if f.startswith('snapshot_') and f.endswith('.pkl')]
-        return sorted(files)
+                 if f.startswith('snapshot_') and
+                 f.endswith((self.SNAPSHOT_EXTENSION, self.DELTA_EXTENSION, self.LEGACY_EXTENSION))]
+        # 按时间戳排序（与扩展名无关）
+        return sorted(files, key=self._get_snapshot_stem)
+
+    @staticmethod
+    def _get_snapshot_stem(file_path: str) -> str:
+        """快照文件名去掉扩展名的部分（snapshot_时间戳）"""
+        return os.path.splitext(os.path.basename(file_path))[0]
+
+    def _find_snapshot_index(self, snapshot_files: List[str], timestamp_str: str) -> Optional[int]:
+        """
+        查找指定时间戳的快照在有序文件列表中的下标
+
+        Returns:
+            Optional[int]: 下标，不存在时返回None
+        """
+        stem = f"snapshot_{timestamp_str}"
+        for index, file_path in enumerate(snapshot_files):
+            if self._get_snapshot_stem(file_path) == stem:
+                return index
+        return None